@@ -0,0 +1,77 @@
+-- Scheduled Query: dim_standard_cost
+-- Display name: EC Analytics: dim_standard_cost + dim_standard_cost_daily
+-- Schedule: every day 16:30 (= 毎日 01:30 JST。fact_daily_asin・fact_monthly_settlement_sku より前)
+-- Disabled: true（scripts/pipeline_dag.py が依存関係の順に実行する。Schedule は DAG を止めたときの控え）
+-- Destination dataset: analytics
+-- 書き込み先: main-project-477501.analytics.dim_standard_cost / dim_standard_cost_daily
+--   （スクリプト内の DDL で書き込むので、Destination table・Write disposition は指定しない）
+-- 登録・更新: python scripts/scheduled_query_deploy.py --apply
+--
+-- 標準原価の SCD2 ディメンション（nocodb.standard_cost_history を1回だけ解釈する）
+--   dim_standard_cost        1行 = 1商品の1適用期間。valid_from / valid_to は DATE（両端含む）
+--                            products_id・asin・sku（product_master 経由）のどれでも引ける
+--                            valid_to = effective_end_date と「次の適用開始日の前日」の早いほう
+--                            （終了日のない旧行と新行が重なっても1日に1行になる）。最新行は 9999-12-31
+--                            recorded_to = NocoDB に登録された effective_end_date そのまま（なし = 9999-12-31）
+--                            重なりを切り詰める前の行もすべて残す（valid_to < valid_from の行は日次展開されない）
+--   dim_standard_cost_daily  1行 = 1商品 × 1日（cost_date）。期間を日に展開した等値結合用の索引
+--                            （最新行は翌年末まで展開する。毎日作り直すので期限は常に先に伸びる）
+-- 原価を使う集計は文字列日付のパースや LEAD() の期間計算・BETWEEN の範囲結合をせず、
+--   JOIN dim_standard_cost_daily c ON c.asin = t.child_asin AND c.cost_date = t.report_date
+-- のように日付の等値で結合する（月次なら月初日、期末在庫なら 12/31 の原価）。
+-- 例外: 棚卸仕訳（accounting.inventory_journal_view）は会計の結果を変えないよう、従来どおり
+--   「valid_from <= 月初日 AND recorded_to >= 月末日」（月全体をカバーする登録行の合計）で dim_standard_cost を引く。
+--   VIEW はこのテーブルの鮮度に依存するので、journal_entries_mat.refresh() と freee_sync.py は
+--   標準原価（standard_cost_history・product_master）より古ければ先にこのファイルを実行して作り直す。
+
+CREATE OR REPLACE TABLE `main-project-477501.analytics.dim_standard_cost`
+CLUSTER BY products_id, asin, sku
+AS
+WITH
+history AS (
+  SELECT
+    products_id,
+    standard_cost,
+    SAFE.PARSE_DATE('%Y-%m-%d', effective_start_date) AS valid_from,
+    SAFE.PARSE_DATE('%Y-%m-%d', effective_end_date) AS end_date
+  FROM `main-project-477501.nocodb.standard_cost_history`
+  WHERE standard_cost IS NOT NULL AND products_id IS NOT NULL
+    -- 終了日が入っているのに日付として読めない行は、どの日にも有効でない扱い（従来の棚卸仕訳と同じ）
+    AND (effective_end_date IS NULL OR SAFE.PARSE_DATE('%Y-%m-%d', effective_end_date) IS NOT NULL)
+),
+ranged AS (
+  SELECT
+    products_id, standard_cost, valid_from,
+    LEAST(
+      COALESCE(end_date, DATE '9999-12-31'),
+      COALESCE(DATE_SUB(LEAD(valid_from) OVER (PARTITION BY products_id ORDER BY valid_from), INTERVAL 1 DAY),
+               DATE '9999-12-31')
+    ) AS valid_to,
+    COALESCE(end_date, DATE '9999-12-31') AS recorded_to
+  FROM history
+  WHERE valid_from IS NOT NULL
+)
+SELECT
+  r.products_id,
+  pm.asin,
+  pm.amazon_sku AS sku,
+  r.standard_cost,
+  r.valid_from,
+  r.valid_to,
+  r.recorded_to
+FROM ranged r
+LEFT JOIN `main-project-477501.nocodb.product_master` pm ON pm.nocodb_id = r.products_id
+WHERE r.valid_from <= r.recorded_to;
+
+CREATE OR REPLACE TABLE `main-project-477501.analytics.dim_standard_cost_daily`
+CLUSTER BY asin, sku, products_id
+AS
+SELECT
+  cost_date,
+  products_id, asin, sku, standard_cost
+FROM `main-project-477501.analytics.dim_standard_cost`,
+  UNNEST(GENERATE_DATE_ARRAY(
+    valid_from,
+    LEAST(valid_to, LAST_DAY(DATE_ADD(CURRENT_DATE('Asia/Tokyo'), INTERVAL 1 YEAR), YEAR))
+  )) AS cost_date
+WHERE valid_from <= valid_to;
@@ -1,18 +1,37 @@
 -- Scheduled Query: fact_daily_asin
--- Schedule: 毎日 02:00 JST (17:00 UTC前日)
--- Destination: main-project-477501.analytics.fact_daily_asin
--- Write preference: WRITE_TRUNCATE (全置換)
+-- Display name: EC Analytics: fact_daily_asin + fact_daily_parent_asin
+-- Schedule: every day 17:00 (= 毎日 02:00 JST)
+-- Disabled: true（scripts/pipeline_dag.py が依存関係の順に実行する。Schedule は DAG を止めたときの控え）
+-- Destination dataset: analytics
+-- 書き込み先: main-project-477501.analytics.fact_daily_asin / fact_daily_parent_asin
+--   （スクリプト内の MERGE / DDL で書き込むので、Destination table・Write disposition は指定しない）
 --
--- 登録コマンド:
--- bq mk --transfer_config \
---   --project_id=main-project-477501 \
---   --data_source=scheduled_query \
---   --target_dataset=analytics \
---   --display_name="fact_daily_asin - Daily ASIN Fact Table" \
---   --schedule="every day 17:00" \
---   --params='{"query":"<このファイルの内容>","destination_table_name_template":"fact_daily_asin","write_disposition":"WRITE_TRUNCATE"}'
+-- 差分更新: 直近 lookback_days 日の report_date パーティションだけを再計算し、MERGE で差し替える
+--   - それより前の日付は確定済み（SP-API トラフィックの遅延反映・広告の7日アトリビューションが落ち着いた後）
+--     なので触らない。履歴が伸びても毎晩の処理量・時間は一定
+--   - テーブルは PARTITION BY report_date / CLUSTER BY child_asin（parent は parent_asin）
+--   - テーブルがない・未パーティションの旧テーブル（CREATE OR REPLACE 版）のときは自動で全件再構築する
+--   - 全件再構築したいとき（product_master の商品名・standard_cost_history の原価を過去に遡って直したときなど）は
+--     full_refresh を TRUE にして手動実行する
+--   - inventory_level は「再計算した時点の最新在庫」。確定済みの日付は最後に再計算した時点の値が残る
+--   - 原価は dim_standard_cost_daily（dim_standard_cost.sql。先に実行される）に report_date で等値結合する
+--
+-- 登録・更新: python scripts/scheduled_query_deploy.py --apply（ヘッダの Schedule 等とこのファイルの SQL を反映する）
+
+DECLARE lookback_days INT64 DEFAULT 14;
+DECLARE full_refresh BOOL DEFAULT FALSE;
+DECLARE start_date DATE;
+DECLARE parent_full_refresh BOOL;
+DECLARE parent_start_date DATE;
+
+SET full_refresh = full_refresh OR NOT EXISTS (
+  SELECT 1 FROM `main-project-477501.analytics.INFORMATION_SCHEMA.COLUMNS`
+  WHERE table_name = 'fact_daily_asin' AND column_name = 'report_date' AND is_partitioning_column = 'YES'
+);
+SET start_date = IF(full_refresh, DATE '1970-01-01',
+                    DATE_SUB(CURRENT_DATE('Asia/Tokyo'), INTERVAL lookback_days DAY));
 
-CREATE OR REPLACE TABLE `main-project-477501.analytics.fact_daily_asin` AS
+CREATE TEMP TABLE fact_daily_asin_window AS
 WITH
 traffic AS (
   SELECT
@@ -20,6 +39,7 @@ traffic AS (
     units_ordered, ordered_product_sales, total_order_items,
     sessions, page_views
   FROM `main-project-477501.analytics.stg_sp_traffic_child_asin`
+  WHERE report_date >= start_date
 ),
 products AS (
   SELECT asin, amazon_sku, name AS product_name
@@ -37,18 +57,9 @@ ads AS (
     SUM(ad_purchases_7d) AS ad_purchases,
     SUM(ad_units_sold_7d) AS ad_units_sold
   FROM `main-project-477501.analytics.stg_ads_product_daily`
+  WHERE report_date >= start_date
   GROUP BY report_date, advertised_asin
 ),
-costs AS (
-  SELECT
-    asin, standard_cost, effective_start_date,
-    COALESCE(
-      DATE_SUB(LEAD(effective_start_date) OVER (PARTITION BY asin ORDER BY effective_start_date), INTERVAL 1 DAY),
-      DATE '9999-12-31'
-    ) AS effective_end_date
-  FROM `main-project-477501.analytics.stg_cost_standard`
-  WHERE asin IS NOT NULL
-),
 latest_inventory AS (
   SELECT asin, fulfillable_quantity AS inventory_level
   FROM (
@@ -94,12 +105,32 @@ SELECT
 FROM traffic t
 LEFT JOIN products p ON t.child_asin = p.asin
 LEFT JOIN ads a ON t.report_date = a.report_date AND t.child_asin = a.child_asin
-LEFT JOIN costs c ON t.child_asin = c.asin
-  AND t.report_date BETWEEN c.effective_start_date AND c.effective_end_date
+LEFT JOIN `main-project-477501.analytics.dim_standard_cost_daily` c
+  ON t.child_asin = c.asin AND t.report_date = c.cost_date
 LEFT JOIN latest_inventory inv ON t.child_asin = inv.asin;
 
--- fact_daily_parent_asin も同時更新
-CREATE OR REPLACE TABLE `main-project-477501.analytics.fact_daily_parent_asin` AS
+IF full_refresh THEN
+  CREATE OR REPLACE TABLE `main-project-477501.analytics.fact_daily_asin`
+  PARTITION BY report_date
+  CLUSTER BY child_asin
+  AS SELECT * FROM fact_daily_asin_window;
+ELSE
+  -- 窓内の既存行を消して再計算結果を入れる（窓外のパーティションは読み書きしない）
+  MERGE `main-project-477501.analytics.fact_daily_asin` T
+  USING fact_daily_asin_window S
+  ON FALSE
+  WHEN NOT MATCHED BY SOURCE AND T.report_date >= start_date THEN DELETE
+  WHEN NOT MATCHED THEN INSERT ROW;
+END IF;
+
+-- fact_daily_parent_asin も同じ窓で更新（parent だけ未パーティションのときは fact_daily_asin 全体から作り直す）
+SET parent_full_refresh = full_refresh OR NOT EXISTS (
+  SELECT 1 FROM `main-project-477501.analytics.INFORMATION_SCHEMA.COLUMNS`
+  WHERE table_name = 'fact_daily_parent_asin' AND column_name = 'report_date' AND is_partitioning_column = 'YES'
+);
+SET parent_start_date = IF(parent_full_refresh, DATE '1970-01-01', start_date);
+
+CREATE TEMP TABLE fact_daily_parent_asin_window AS
 SELECT
   report_date, parent_asin,
   MIN(product_name) AS product_name,
@@ -125,4 +156,18 @@ SELECT
   SAFE_DIVIDE(SUM(organic_units), NULLIF(SUM(organic_sessions), 0)) AS organic_cvr,
   SAFE_DIVIDE(SUM(ad_cost), NULLIF(SUM(ad_clicks), 0)) AS cpc
 FROM `main-project-477501.analytics.fact_daily_asin`
+WHERE report_date >= parent_start_date
 GROUP BY report_date, parent_asin;
+
+IF parent_full_refresh THEN
+  CREATE OR REPLACE TABLE `main-project-477501.analytics.fact_daily_parent_asin`
+  PARTITION BY report_date
+  CLUSTER BY parent_asin
+  AS SELECT * FROM fact_daily_parent_asin_window;
+ELSE
+  MERGE `main-project-477501.analytics.fact_daily_parent_asin` T
+  USING fact_daily_parent_asin_window S
+  ON FALSE
+  WHEN NOT MATCHED BY SOURCE AND T.report_date >= parent_start_date THEN DELETE
+  WHEN NOT MATCHED THEN INSERT ROW;
+END IF;
@@ -1,10 +1,71 @@
 -- Scheduled Query: fact_monthly_settlement_sku
--- Schedule: 毎日 03:00 JST (18:00 UTC前日)
--- Destination: main-project-477501.analytics.fact_monthly_settlement_sku
--- Write preference: WRITE_TRUNCATE (全置換)
+-- Display name: EC Analytics: fact_monthly_settlement_sku
+-- Schedule: every day 18:00 (= 毎日 03:00 JST)
+-- Disabled: true（scripts/pipeline_dag.py が依存関係の順に実行する。Schedule は DAG を止めたときの控え）
+-- Destination dataset: analytics
 -- Transfer Config: projects/850116866513/locations/us-central1/transferConfigs/69a14225-0000-2699-8504-14223bb1fd6e
+-- 書き込み先: main-project-477501.analytics.fact_monthly_settlement_sku
+--   （スクリプト内の MERGE / DDL で書き込むので、Destination table・Write disposition は指定しない）
+-- 登録・更新: python scripts/scheduled_query_deploy.py --apply
+--
+-- 差分更新: 締まっていない月（open_months）だけを再計算し、MERGE で差し替える
+--   - open_months = 前回までに取り込んでいない settlement_id の posted_date の月
+--                 + 広告費がまだ増えうる月（直近 ad_lookback_days 日の report_date の月）
+--     取り込み済みの settlement_id は fact_monthly_settlement_sku_refresh_log に記録する
+--     （精算レポートは確定後に変わらないので、新しい settlement_id がなければその月の精算額は変わらない）
+--   - 処理量は新しく入った精算の月の分だけで、過去の月の履歴が伸びても増えない
+--   - テーブルは PARTITION BY month_start（= year_month の月初日。月単位パーティション）/ CLUSTER BY sku
+--   - テーブルがない・未パーティションの旧テーブル（CREATE OR REPLACE 版）のときは自動で全件再構築する
+--   - 全件再構築したいとき（standard_cost_history の原価・product_master を過去に遡って直したときなど）は
+--     full_refresh を TRUE にして手動実行する
 
-CREATE OR REPLACE TABLE `main-project-477501.analytics.fact_monthly_settlement_sku` AS
+DECLARE ad_lookback_days INT64 DEFAULT 14;
+DECLARE full_refresh BOOL DEFAULT FALSE;
+DECLARE new_settlements ARRAY<STRING>;
+DECLARE open_months ARRAY<DATE>;
+DECLARE first_open_month DATE;
+DECLARE last_open_month DATE;
+
+CREATE TABLE IF NOT EXISTS `main-project-477501.analytics.fact_monthly_settlement_sku_refresh_log` (
+  refreshed_at TIMESTAMP,
+  mode STRING,
+  settlement_ids ARRAY<STRING>,
+  months ARRAY<DATE>
+);
+
+SET full_refresh = full_refresh OR NOT EXISTS (
+  SELECT 1 FROM `main-project-477501.analytics.INFORMATION_SCHEMA.COLUMNS`
+  WHERE table_name = 'fact_monthly_settlement_sku' AND column_name = 'month_start' AND is_partitioning_column = 'YES'
+);
+
+-- 前回までに取り込んでいない精算（全件再構築時はすべて）
+SET new_settlements = (
+  SELECT IFNULL(ARRAY_AGG(DISTINCT settlement_id), [])
+  FROM (
+    SELECT CAST(settlement_id AS STRING) AS settlement_id
+    FROM `main-project-477501.analytics.stg_sp_settlement`
+    WHERE settlement_id IS NOT NULL
+  )
+  WHERE full_refresh
+    OR settlement_id NOT IN (SELECT id FROM `main-project-477501.analytics.fact_monthly_settlement_sku_refresh_log`, UNNEST(settlement_ids) AS id)
+);
+
+SET open_months = (
+  SELECT IFNULL(ARRAY_AGG(DISTINCT month ORDER BY month), [])
+  FROM (
+    SELECT DATE_TRUNC(posted_date, MONTH) AS month
+    FROM `main-project-477501.analytics.stg_sp_settlement`
+    WHERE posted_date IS NOT NULL AND CAST(settlement_id AS STRING) IN UNNEST(new_settlements)
+    UNION ALL
+    SELECT DATE_TRUNC(report_date, MONTH)
+    FROM `main-project-477501.analytics.stg_ads_product_daily`
+    WHERE report_date >= DATE_SUB(CURRENT_DATE('Asia/Tokyo'), INTERVAL ad_lookback_days DAY)
+  )
+);
+
+SET (first_open_month, last_open_month) = (SELECT AS STRUCT MIN(m), MAX(m) FROM UNNEST(open_months) AS m);
+
+CREATE TEMP TABLE fact_monthly_settlement_sku_window AS
 WITH
 settlement_agg AS (
   SELECT FORMAT_DATE('%Y-%m', posted_date) AS year_month, sku,
@@ -17,6 +78,7 @@ settlement_agg AS (
     SUM(CASE WHEN transaction_type='Order' AND amount_type='ItemPrice' AND amount_description='Principal' THEN quantity_purchased ELSE 0 END) AS settlement_qty
   FROM `main-project-477501.analytics.stg_sp_settlement`
   WHERE sku IS NOT NULL AND posted_date IS NOT NULL
+    AND (full_refresh OR DATE_TRUNC(posted_date, MONTH) IN UNNEST(open_months))
   GROUP BY 1, 2
 ),
 ad_cost_monthly AS (
@@ -25,22 +87,18 @@ ad_cost_monthly AS (
     SUM(a.ad_cost) AS ad_cost_allocated
   FROM `main-project-477501.analytics.stg_ads_product_daily` a
   LEFT JOIN `main-project-477501.nocodb.product_master` pm ON a.advertised_asin = pm.asin
+  WHERE full_refresh OR DATE_TRUNC(a.report_date, MONTH) IN UNNEST(open_months)
   GROUP BY 1, 2
 ),
-cost_lookup AS (
-  SELECT amazon_sku, standard_cost, effective_start_date,
-    COALESCE(DATE_SUB(LEAD(effective_start_date) OVER (PARTITION BY amazon_sku ORDER BY effective_start_date), INTERVAL 1 DAY), DATE '9999-12-31') AS effective_end_date
-  FROM `main-project-477501.analytics.stg_cost_standard`
-  WHERE amazon_sku IS NOT NULL
-),
 settlement_with_cost AS (
+  -- 月初日に有効だった標準原価（dim_standard_cost_daily に月初日で等値結合）
   SELECT s.*, c.standard_cost
   FROM settlement_agg s
-  LEFT JOIN cost_lookup c ON s.sku = c.amazon_sku
-    AND PARSE_DATE('%Y-%m', s.year_month) BETWEEN DATE_TRUNC(c.effective_start_date, MONTH) AND DATE_TRUNC(c.effective_end_date, MONTH)
+  LEFT JOIN `main-project-477501.analytics.dim_standard_cost_daily` c
+    ON s.sku = c.sku AND c.cost_date = PARSE_DATE('%Y-%m', s.year_month)
 )
 SELECT
-  sc.year_month, sc.sku, pm.asin, pm.name AS product_name,
+  sc.year_month, PARSE_DATE('%Y-%m', sc.year_month) AS month_start, sc.sku, pm.asin, pm.name AS product_name,
   sc.settlement_sales, sc.settlement_tax, sc.amazon_fees, sc.points_granted, sc.promotions, sc.refund_total, sc.settlement_qty,
   COALESCE(ac.ad_cost_allocated, 0) AS ad_cost_allocated,
   sc.standard_cost AS standard_cost_per_unit,
@@ -52,5 +110,23 @@ SELECT
 FROM settlement_with_cost sc
 LEFT JOIN ad_cost_monthly ac ON sc.year_month = ac.year_month AND sc.sku = ac.sku
 LEFT JOIN `main-project-477501.nocodb.product_master` pm ON sc.sku = pm.amazon_sku
-WHERE sc.settlement_qty > 0 OR sc.settlement_sales != 0
-ORDER BY sc.year_month DESC, sc.settlement_sales DESC;
+WHERE sc.settlement_qty > 0 OR sc.settlement_sales != 0;
+
+IF full_refresh THEN
+  CREATE OR REPLACE TABLE `main-project-477501.analytics.fact_monthly_settlement_sku`
+  PARTITION BY DATE_TRUNC(month_start, MONTH)
+  CLUSTER BY sku
+  AS SELECT * FROM fact_monthly_settlement_sku_window;
+ELSEIF ARRAY_LENGTH(open_months) > 0 THEN
+  -- open_months の既存行を消して再計算結果を入れる（それ以外の月のパーティションは読み書きしない）
+  MERGE `main-project-477501.analytics.fact_monthly_settlement_sku` T
+  USING fact_monthly_settlement_sku_window S
+  ON FALSE
+  WHEN NOT MATCHED BY SOURCE
+    AND T.month_start BETWEEN first_open_month AND last_open_month
+    AND T.month_start IN UNNEST(open_months) THEN DELETE
+  WHEN NOT MATCHED THEN INSERT ROW;
+END IF;
+
+INSERT INTO `main-project-477501.analytics.fact_monthly_settlement_sku_refresh_log`
+VALUES (CURRENT_TIMESTAMP(), IF(full_refresh, 'full', 'incremental'), new_settlements, open_months);
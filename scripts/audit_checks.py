@@ -0,0 +1,449 @@
+"""
+月次締め 監査チェック（チェックレジストリ + 並列ランナー）
+
+各チェックは CHECKS に1件ずつ宣言する:
+  name         チェック名（結果の識別子）
+  group        links（振替リンク・未分類） / accounts（勘定科目の整合性） / ledger（BQ 仕訳・P/L）
+  backend      noco（NocoDB SQLite） / bq（BigQuery。--local でローカル DuckDB レプリカ）
+  severity     error（締め不可） / warning（要確認） / info（件数の報告のみ）
+  description  何を確認するか
+  query        SQL
+  expect       結果行に対する期待値（invariant）。(ok, 要約) を返す関数
+               expect_no_rows / expect_values({キー: 値}) / report_only
+  list         True なら PASS でも結果行を表示する（一覧の報告。省略時 False）
+
+ランナー:
+  - チェックは互いに独立なのでスレッドで並列実行（SQLite はスレッドごとに読み取り専用接続、BQ はクライアント共有）
+  - 結果は check・group・severity・status（PASS / FAIL / ERROR）・summary・rows・elapsed_sec の表
+    --json で機械可読な結果を書き出す
+  - severity=error のチェックが FAIL / ERROR なら終了コード 1
+  - BQ のチェックを含むときは先に journal_entries_mat を差分更新する（ledger チェックは実体化テーブルを読む）
+
+実行: python scripts/audit_checks.py                   全チェック
+      python scripts/audit_checks.py --group links     グループ指定（複数可）
+      python scripts/audit_checks.py --local --json tmp/audit_results.json
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+NOCO_DB_PATH = 'C:/Users/ninni/nocodb/noco.db'
+BQ_PROJECT = "main-project-477501"
+AUDIT_CONCURRENCY = 8
+MAX_ROWS_SHOWN = 10
+
+# ledger チェックは実体化テーブルを読む（パーティション・クラスタ済みで VIEW の全ソース展開をしない）
+# 実行前に journal_entries_mat を差分更新して VIEW に追いつかせる（--local はスナップショット時点の内容）
+JOURNAL_TABLE = f"{BQ_PROJECT}.accounting.journal_entries_mat"
+AMAZON_ACCOUNT_ID = 9          # 勘定科目「Amazon出品アカウント」（nocodb_id。deposit_matcher.py と同じ）
+BS_ACCOUNTS = ("'楽天銀行','PayPay銀行','Amazon出品アカウント','未払金',"
+               "'THE直行便','ESPRIME','YP','セールモンスター','事業主借','開業費','商品'")
+
+
+# ==================== 期待値 ====================
+
+def expect_no_rows(rows):
+    """該当行が0件であること（該当行 = 要対応）"""
+    return not rows, f'{len(rows)}件'
+
+
+def expect_values(expected, missing=None):
+    """1列目をキー・2列目を値として、expected のキーがすべて一致すること（行がないキーは missing とみなす）"""
+    def check(rows):
+        actual = {r[0]: r[1] for r in rows}
+        diffs = [f'{k}: {actual.get(k, missing)} ≠ {v}' for k, v in expected.items() if actual.get(k, missing) != v]
+        return not diffs, ', '.join(diffs) or ', '.join(f'{k}={v:,}' for k, v in expected.items())
+    return check
+
+
+def report_only(rows):
+    """件数・集計を報告するだけ（常に PASS）"""
+    if len(rows) == 1:
+        return True, ' '.join('' if v is None else f'{v:,}' if isinstance(v, (int, float)) else str(v)
+                              for v in rows[0])
+    return True, f'{len(rows)}行'
+
+
+# ==================== チェック定義 ====================
+
+CHECKS = [
+    # ---------- links: 振替リンク・未分類 ----------
+    {
+        'name': 'transfer_records_summary',
+        'group': 'links', 'backend': 'noco', 'severity': 'info',
+        'description': '振替テーブルの件数・期間',
+        'query': 'SELECT COUNT(*) AS cnt, MIN("振替日") AS first_date, MAX("振替日") AS last_date FROM "nc_opau___振替"',
+        'expect': report_only,
+    },
+    {
+        'name': 'rakuten_unclassified',
+        'group': 'links', 'backend': 'noco', 'severity': 'error',
+        'description': '楽天銀行: 振替リンクも勘定科目もない行',
+        'query': '''
+            SELECT id, "取引日", "入出金_円_", "入出金先内容"
+            FROM "nc_opau___楽天銀行ビジネス口座入出金明細"
+            WHERE "nc_opau___振替_id" IS NULL AND "nc_opau___freee勘定科目_id" IS NULL
+            ORDER BY "取引日"''',
+        'expect': expect_no_rows,
+    },
+    {
+        'name': 'paypay_unclassified',
+        'group': 'links', 'backend': 'noco', 'severity': 'error',
+        'description': 'PayPay銀行: 振替リンクも勘定科目もない行',
+        'query': '''
+            SELECT id, "操作日", "お預かり金額", "摘要"
+            FROM "nc_opau___PayPay銀行入出金明細"
+            WHERE "nc_opau___振替_id" IS NULL AND "nc_opau___freee勘定科目_id" IS NULL
+            ORDER BY "操作日"''',
+        'expect': expect_no_rows,
+    },
+    {
+        # NTT の振替_id は月次支払バッチへのリンクなので、振替フラグで判定する
+        # 勘定科目が未設定でも merchant_account_rules で BQ 側が補完する場合があるため warning
+        'name': 'ntt_unclassified',
+        'group': 'links', 'backend': 'noco', 'severity': 'warning',
+        'description': 'NTTカード: 振替でなく勘定科目もない行（merchant_account_rules 対象なら問題なし）',
+        'query': '''
+            SELECT id, "利用日", "ご利用金額", "ご利用加盟店"
+            FROM "nc_opau___NTTファイナンスBizカード明細"
+            WHERE "nc_opau___freee勘定科目_id" IS NULL AND ("振替" IS NULL OR "振替" = 0)
+            ORDER BY "利用日"''',
+        'expect': expect_no_rows,
+    },
+    {
+        'name': 'agency_unclassified',
+        'group': 'links', 'backend': 'noco', 'severity': 'error',
+        'description': '代行会社: 振替リンクも勘定科目もない行',
+        'query': '''
+            SELECT id, "金額_JPY_"
+            FROM "nc_opau___代行会社"
+            WHERE "nc_opau___振替_id" IS NULL AND "nc_opau___freee勘定科目_id" IS NULL''',
+        'expect': expect_no_rows,
+    },
+    {
+        'name': 'bank_link_summary',
+        'group': 'links', 'backend': 'noco', 'severity': 'info',
+        'description': '口座別 振替リンク済み件数・合計',
+        'query': '''
+            SELECT '楽天銀行', COUNT(*), SUM("入出金_円_") FROM "nc_opau___楽天銀行ビジネス口座入出金明細"
+            WHERE "nc_opau___振替_id" IS NOT NULL
+            UNION ALL
+            SELECT 'PayPay銀行', COUNT(*), SUM("お預かり金額") FROM "nc_opau___PayPay銀行入出金明細"
+            WHERE "nc_opau___振替_id" IS NOT NULL
+            UNION ALL
+            SELECT '代行会社', COUNT(*), SUM("金額_JPY_") FROM "nc_opau___代行会社" WHERE "nc_opau___振替_id" IS NOT NULL
+            UNION ALL
+            SELECT 'NTTカード（振替=1）', COUNT(*), SUM("ご利用金額") FROM "nc_opau___NTTファイナンスBizカード明細"
+            WHERE "振替" = 1''',
+        'expect': report_only,
+        'list': True,
+    },
+    {
+        # 旧 Amazon出品アカウント明細（2026-03-06 廃止）の DEPOSIT リンク状態。入金は銀行明細側で
+        # 勘定科目 = Amazon出品アカウント にする（deposit_matcher.py --apply）ので、銀行側の入金で確認する
+        'name': 'amazon_deposit_link_status',
+        'group': 'links', 'backend': 'noco', 'severity': 'info',
+        'description': 'Amazon入金（銀行の入金で勘定科目 = Amazon出品アカウント）の振替リンク状態',
+        'query': f'''
+            SELECT '楽天銀行' AS bank,
+              CASE WHEN "nc_opau___振替_id" IS NOT NULL THEN 'LINKED' ELSE 'ACCT_ONLY' END AS status,
+              COUNT(*) AS cnt, SUM("入出金_円_") AS total
+            FROM "nc_opau___楽天銀行ビジネス口座入出金明細"
+            WHERE "nc_opau___freee勘定科目_id" = {AMAZON_ACCOUNT_ID} AND "入出金_円_" > 0
+            GROUP BY 1, 2
+            UNION ALL
+            SELECT 'PayPay銀行',
+              CASE WHEN "nc_opau___振替_id" IS NOT NULL THEN 'LINKED' ELSE 'ACCT_ONLY' END,
+              COUNT(*), SUM("お預かり金額")
+            FROM "nc_opau___PayPay銀行入出金明細"
+            WHERE "nc_opau___freee勘定科目_id" = {AMAZON_ACCOUNT_ID} AND "お預かり金額" > 0
+            GROUP BY 1, 2''',
+        'expect': report_only,
+        'list': True,
+    },
+    {
+        'name': 'rakuten_classified_without_transfer',
+        'group': 'links', 'backend': 'noco', 'severity': 'info',
+        'description': '楽天銀行: 振替なし・勘定科目あり（通常仕訳として計上される行）',
+        'query': '''
+            SELECT r.id, r."取引日", r."入出金_円_", r."入出金先内容", a."勘定科目"
+            FROM "nc_opau___楽天銀行ビジネス口座入出金明細" r
+            LEFT JOIN "nc_opau___freee勘定科目" a ON r."nc_opau___freee勘定科目_id" = a.id
+            WHERE r."nc_opau___振替_id" IS NULL AND r."nc_opau___freee勘定科目_id" IS NOT NULL
+            ORDER BY r."取引日"''',
+        'expect': report_only,
+        'list': True,
+    },
+    {
+        'name': 'paypay_classified_without_transfer',
+        'group': 'links', 'backend': 'noco', 'severity': 'info',
+        'description': 'PayPay銀行: 振替なし・勘定科目あり（通常仕訳として計上される行）',
+        'query': '''
+            SELECT p.id, p."操作日", p."お預かり金額", p."摘要", a."勘定科目"
+            FROM "nc_opau___PayPay銀行入出金明細" p
+            LEFT JOIN "nc_opau___freee勘定科目" a ON p."nc_opau___freee勘定科目_id" = a.id
+            WHERE p."nc_opau___振替_id" IS NULL AND p."nc_opau___freee勘定科目_id" IS NOT NULL
+            ORDER BY p."操作日"''',
+        'expect': report_only,
+        'list': True,
+    },
+    {
+        'name': 'ntt_transfer_rows',
+        'group': 'links', 'backend': 'noco', 'severity': 'info',
+        'description': 'NTTカード: 振替=1 の行（journal_entries から除外される。勘定科目付きなら要確認）',
+        'query': '''
+            SELECT n.id, n."利用日", n."ご利用加盟店", n."ご利用金額", n."nc_opau___振替_id", a."勘定科目"
+            FROM "nc_opau___NTTファイナンスBizカード明細" n
+            LEFT JOIN "nc_opau___freee勘定科目" a ON n."nc_opau___freee勘定科目_id" = a.id
+            WHERE n."振替" = 1
+            ORDER BY n."利用日"''',
+        'expect': report_only,
+        'list': True,
+    },
+
+    # ---------- accounts: 勘定科目の整合性 ----------
+    {
+        'name': 'manual_journal_unknown_account',
+        'group': 'accounts', 'backend': 'noco', 'severity': 'error',
+        'description': '手動仕訳: 借方・貸方の科目 id が freee勘定科目 に存在しない',
+        'query': '''
+            SELECT m.id, m."仕訳日", m."借方科目_id", m."貸方科目_id", m."金額"
+            FROM "nc_opau___手動仕訳" m
+            LEFT JOIN "nc_opau___freee勘定科目" dr ON m."借方科目_id" = dr.id
+            LEFT JOIN "nc_opau___freee勘定科目" cr ON m."貸方科目_id" = cr.id
+            WHERE dr.id IS NULL OR cr.id IS NULL
+            ORDER BY m.id''',
+        'expect': expect_no_rows,
+    },
+    {
+        'name': 'manual_journal_incomplete',
+        'group': 'accounts', 'backend': 'noco', 'severity': 'warning',
+        'description': '手動仕訳: 仕訳日・金額が空（journal_entries から除外される）',
+        'query': '''
+            SELECT id, "仕訳日", "金額", "摘要"
+            FROM "nc_opau___手動仕訳"
+            WHERE "仕訳日" IS NULL OR "仕訳日" = '' OR "金額" IS NULL
+            ORDER BY id''',
+        'expect': expect_no_rows,
+    },
+    {
+        # 旧 事業主借テーブル（2026-03-06 廃止・手動仕訳に統合）の勘定科目チェック
+        'name': 'owner_contribution_accounts',
+        'group': 'accounts', 'backend': 'noco', 'severity': 'info',
+        'description': '手動仕訳の事業主借: 相手勘定科目の分布（想定外の科目がないか確認）',
+        'query': '''
+            SELECT CASE WHEN dr."勘定科目" = '事業主借' THEN m."貸方科目_id" ELSE m."借方科目_id" END AS acct_id,
+              CASE WHEN dr."勘定科目" = '事業主借' THEN cr."勘定科目" ELSE dr."勘定科目" END AS account_name,
+              COUNT(*) AS cnt, SUM(m."金額") AS total
+            FROM "nc_opau___手動仕訳" m
+            LEFT JOIN "nc_opau___freee勘定科目" dr ON m."借方科目_id" = dr.id
+            LEFT JOIN "nc_opau___freee勘定科目" cr ON m."貸方科目_id" = cr.id
+            WHERE dr."勘定科目" = '事業主借' OR cr."勘定科目" = '事業主借'
+            GROUP BY 1, 2
+            ORDER BY cnt DESC''',
+        'expect': report_only,
+        'list': True,
+    },
+    {
+        'name': 'manual_journal_list',
+        'group': 'accounts', 'backend': 'noco', 'severity': 'info',
+        'description': '手動仕訳: 全件の借方・貸方科目',
+        'query': '''
+            SELECT m.id, m."仕訳日", dr."勘定科目" AS debit, cr."勘定科目" AS credit, m."金額", m."摘要"
+            FROM "nc_opau___手動仕訳" m
+            LEFT JOIN "nc_opau___freee勘定科目" dr ON m."借方科目_id" = dr.id
+            LEFT JOIN "nc_opau___freee勘定科目" cr ON m."貸方科目_id" = cr.id
+            ORDER BY m.id''',
+        'expect': report_only,
+        'list': True,
+    },
+
+    # ---------- ledger: BQ 仕訳・P/L ----------
+    {
+        'name': 'journal_balance',
+        'group': 'ledger', 'backend': 'bq', 'severity': 'error',
+        'description': 'journal_entries_mat: 年度別に借方合計 = 貸方合計',
+        'query': f"""
+            SELECT fiscal_year,
+              SUM(CASE WHEN entry_side = 'debit' THEN amount_jpy ELSE -amount_jpy END) AS imbalance
+            FROM `{JOURNAL_TABLE}`
+            GROUP BY fiscal_year
+            HAVING imbalance != 0
+            ORDER BY fiscal_year""",
+        'expect': expect_no_rows,
+    },
+    {
+        'name': 'journal_missing_account',
+        'group': 'ledger', 'backend': 'bq', 'severity': 'error',
+        'description': 'journal_entries_mat: 勘定科目名が解決できない仕訳（ソース別）',
+        'query': f"""
+            SELECT source_table, COUNT(*) AS cnt, SUM(amount_jpy) AS amount
+            FROM `{JOURNAL_TABLE}`
+            WHERE account_name IS NULL
+            GROUP BY source_table
+            ORDER BY source_table""",
+        'expect': expect_no_rows,
+    },
+    {
+        'name': 'pl_confirmed_years',
+        'group': 'ledger', 'backend': 'bq', 'severity': 'error',
+        'description': '確定済み年度の純損益が確定申告値から変わっていない',
+        'query': f"""
+            SELECT fiscal_year,
+              SUM(CASE WHEN entry_side = 'credit' THEN amount_jpy ELSE -amount_jpy END) AS net_pl
+            FROM `{JOURNAL_TABLE}`
+            WHERE account_name NOT IN ({BS_ACCOUNTS})
+            GROUP BY fiscal_year""",
+        'expect': expect_values({2023: -1340610, 2024: -1088882}),
+    },
+    {
+        'name': 'amazon_account_closed_years',
+        'group': 'ledger', 'backend': 'bq', 'severity': 'error',
+        'description': 'Amazon出品アカウント: 確定済み年度の増減が 0',
+        'query': f"""
+            SELECT fiscal_year,
+              SUM(CASE WHEN entry_side = 'debit' THEN amount_jpy ELSE -amount_jpy END) AS balance
+            FROM `{JOURNAL_TABLE}`
+            WHERE account_name = 'Amazon出品アカウント'
+            GROUP BY fiscal_year""",
+        'expect': expect_values({2023: 0, 2024: 0}, missing=0),
+    },
+]
+
+
+# ==================== ランナー ====================
+
+class ConnectionPool:
+    """スレッドごとの SQLite 読み取り専用接続 + 共有 BQ クライアント（必要になった時点で作成）"""
+
+    def __init__(self, local=False):
+        self.local = local
+        self.thread = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        self._bq = None
+
+    def noco(self):
+        if not hasattr(self.thread, 'conn'):
+            conn = sqlite3.connect(f'file:{NOCO_DB_PATH}?mode=ro', uri=True, check_same_thread=False)
+            self.thread.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return self.thread.conn
+
+    def bq(self):
+        with self.lock:
+            if self._bq is None:
+                if self.local:
+                    from warehouse_local import LocalClient
+                    self._bq = LocalClient()
+                else:
+                    from bq_client import get_client
+                    self._bq = get_client()
+            return self._bq
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+
+def execute(pool, check):
+    """(列名, 行タプルのリスト) を返す"""
+    if check['backend'] == 'noco':
+        cur = pool.noco().execute(check['query'])
+        return [d[0] for d in cur.description], cur.fetchall()
+    job = pool.bq().query(check['query'])
+    result = job.result()
+    columns = [f.name for f in result.schema] if hasattr(result, 'schema') else job.columns
+    return columns, [tuple(row) for row in result]
+
+
+def run_check(pool, check):
+    start = time.monotonic()
+    result = {k: check[k] for k in ('name', 'group', 'backend', 'severity', 'description')}
+    result['list'] = check.get('list', False)
+    try:
+        columns, rows = execute(pool, check)
+        ok, summary = check['expect'](rows)
+        result.update(status='PASS' if ok else 'FAIL', summary=summary, columns=columns, rows=rows)
+    except Exception as e:
+        result.update(status='ERROR', summary=str(e).splitlines()[0], columns=[], rows=[])
+    result['elapsed_sec'] = round(time.monotonic() - start, 3)
+    return result
+
+
+def run_checks(checks, local=False, concurrency=AUDIT_CONCURRENCY):
+    pool = ConnectionPool(local=local)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(lambda check: run_check(pool, check), checks))
+    finally:
+        pool.close()
+
+
+def print_results(results, verbose=False):
+    marks = {'PASS': '✓', 'FAIL': '✗', 'ERROR': '!'}
+    for group in dict.fromkeys(r['group'] for r in results):
+        print(f'\n=== {group} ===')
+        for r in (r for r in results if r['group'] == group):
+            mark = 'ℹ' if r['severity'] == 'info' else marks[r['status']]
+            if r['status'] == 'FAIL' and r['severity'] == 'warning':
+                mark = '⚠'
+            print(f"  {mark} {r['name']:<32} {r['summary']}  ({r['elapsed_sec']:.2f}s)")
+            if r['status'] != 'PASS' or verbose or r['list']:
+                print(f"      {r['description']}")
+                for row in r['rows'][:MAX_ROWS_SHOWN]:
+                    print('      ' + ' | '.join('' if v is None else str(v) for v in row))
+                if len(r['rows']) > MAX_ROWS_SHOWN:
+                    print(f"      ...他 {len(r['rows']) - MAX_ROWS_SHOWN}件")
+
+
+def write_json(results, path):
+    records = [
+        {**{k: v for k, v in r.items() if k not in ('columns', 'rows')},
+         'row_count': len(r['rows']),
+         'rows': [dict(zip(r['columns'], row)) for row in r['rows']]}
+        for r in results
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2, default=str)
+
+
+def main(groups=None):
+    parser = argparse.ArgumentParser(description='月次締め 監査チェック')
+    parser.add_argument('--group', nargs='+', choices=sorted({c['group'] for c in CHECKS}), default=groups,
+                        help='実行するグループ（省略時は全グループ）')
+    parser.add_argument('--check', nargs='+', help='実行するチェック名')
+    parser.add_argument('--local', action='store_true', help='BQ チェックをローカル DuckDB レプリカで実行')
+    parser.add_argument('--json', metavar='PATH', help='結果を JSON で書き出す')
+    parser.add_argument('--verbose', '-v', action='store_true', help='PASS したチェックの行も表示')
+    args = parser.parse_args()
+
+    checks = [c for c in CHECKS
+              if (not args.group or c['group'] in args.group) and (not args.check or c['name'] in args.check)]
+    start = time.monotonic()
+    if not args.local and any(c['backend'] == 'bq' for c in checks):
+        from bq_client import get_client
+        from journal_entries_mat import refresh
+        print('=== journal_entries_mat 差分更新 ===')
+        refresh(get_client())
+    results = run_checks(checks, local=args.local)
+    print_results(results, verbose=args.verbose)
+    if args.json:
+        write_json(results, args.json)
+
+    failed = [r for r in results if r['status'] == 'ERROR' or (r['status'] == 'FAIL' and r['severity'] == 'error')]
+    warned = [r for r in results if r['status'] == 'FAIL' and r['severity'] == 'warning']
+    print(f'\n{len(results)}チェック  {time.monotonic() - start:.1f}s  '
+          f'要対応 {len(failed)}件 / 要確認 {len(warned)}件')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+BigQuery クエリ結果のローカル永続キャッシュ（調査スクリプト共通）
+
+CachedClient().query(sql).result() は bigquery.Client と同じように使え、同じクエリの2回目以降は
+BQ に投げずにローカルの結果を返す（課金 0・即時）。
+
+キャッシュキー: 正規化した SQL（コメント除去・空白圧縮）+ クエリパラメータ
+               + 参照する全テーブルの last_modified_time（VIEW は定義を辿って実テーブルまで展開）
+  → NocoDB 同期などで参照テーブルが更新されると自動的に別キーになり、BQ に再クエリする
+    （テーブルのメタデータはクエリごとに取り直す。同じ CachedClient を使い続けても更新を見落とさない）
+キャッシュしないクエリ（そのまま BQ で実行）:
+  - SELECT / WITH 以外（DDL・DML）、INFORMATION_SCHEMA、CURRENT_DATE() など実行時刻で結果が変わる関数
+  - FROM / JOIN の参照先に `main-project-477501.ds.tbl`（バッククォート付きの完全修飾名）・CTE・UNNEST・
+    サブクエリ以外（nocodb.x のような省略形・他プロジェクト）を含むもの（更新を検知できないため。VIEW の定義内も同じ）
+  - 外部テーブル（GCS 上のファイル更新が last_modified_time に現れない）を参照するもの
+保存先: tmp/bq_query_cache.sqlite（結果は pickle + zlib）。合計 MAX_CACHE_BYTES を超えたら
+       最終参照が古いものから削除（LRU）
+
+使い方:
+    sys.path.insert(0, 'scripts')
+    from bq_cache import CachedClient
+    client = CachedClient()
+    for row in client.query(q).result(): ...
+
+実行: python scripts/bq_cache.py --stats   キャッシュの件数・サイズ
+      python scripts/bq_cache.py --clear   キャッシュを全削除
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import time
+import zlib
+from google.cloud import bigquery
+from bq_client import get_client
+from view_deploy import TABLE_REF
+
+BQ_PROJECT = "main-project-477501"
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmp', 'bq_query_cache.sqlite')
+MAX_CACHE_BYTES = 200 * 1024**2
+
+STRING_LITERAL = re.compile(r"'(?:\\.|[^'\\])*'|\"(?:\\.|[^\"\\])*\"")
+# FROM を含むが参照先ではない構文（EXTRACT(YEAR FROM d)・TRIM(BOTH FROM s)・SUBSTRING(s FROM 2)・IS DISTINCT FROM x）
+# 関数の括弧内（1段までの入れ子を含む）にある FROM を消す
+NON_TABLE_FROM = re.compile(
+    r'(\b(?:EXTRACT|TRIM|SUBSTRING)\s*\((?:[^()]|\([^()]*\))*?)\bFROM\b|\bDISTINCT\s+FROM\b', re.IGNORECASE)
+CTE_NAME = re.compile(r'(?:\bWITH(?:\s+RECURSIVE)?|,)\s*([A-Za-z_]\w*)\s+AS\s*\(', re.IGNORECASE)
+FROM_KEYWORD = re.compile(r'\b(?:FROM|JOIN)\s+', re.IGNORECASE)
+FROM_TARGET = re.compile(r'`[^`]*`|[A-Za-z_][\w.-]*|\(')
+# 「別名 ,」の後にカンマ区切りの次の参照先が続く（FROM a x, b / FROM t, UNNEST(...)）
+FROM_NEXT = re.compile(
+    r'(?:\s+(?:AS\s+)?(?!(?:WHERE|GROUP|ORDER|LEFT|RIGHT|INNER|FULL|CROSS|JOIN|ON|USING|LIMIT|HAVING|WINDOW'
+    r'|QUALIFY|UNION|EXCEPT|INTERSECT|FOR)\b)[A-Za-z_]\w*)?\s*,\s*', re.IGNORECASE)
+
+UNCACHEABLE = re.compile(
+    r'INFORMATION_SCHEMA|__TABLES__|\bCURRENT_(DATE|DATETIME|TIME|TIMESTAMP)\b|\bRAND\s*\(|\bGENERATE_UUID\s*\(|\bSESSION_USER\s*\(',
+    re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """コメントを除き空白を1つにまとめる（文字列リテラル内の空白も圧縮されるが、キー用途なので問題ない）"""
+    sql = re.sub(r'--[^\n]*', ' ', sql)
+    sql = re.sub(r'/\*.*?\*/', ' ', sql, flags=re.DOTALL)
+    return ' '.join(sql.split())
+
+
+def strip_sql(sql):
+    """参照先の検出用: コメント除去・空白圧縮し、文字列リテラルと参照先ではない FROM を消す"""
+    sql = STRING_LITERAL.sub("''", normalize_sql(sql))
+    return NON_TABLE_FROM.sub(lambda m: (m.group(1) or '') + ' ', sql)
+
+
+def from_targets(sql):
+    """FROM / JOIN の参照先（カンマ区切りの2つ目以降も含む）。サブクエリは '('"""
+    sql = strip_sql(sql)
+    for m in FROM_KEYWORD.finditer(sql):
+        pos = m.end()
+        while (target := FROM_TARGET.match(sql, pos)):
+            yield target[0]
+            nxt = FROM_NEXT.match(sql, target.end()) if target[0] != '(' else None
+            if not nxt:
+                break
+            pos = nxt.end()
+
+
+def unversioned_refs(sql):
+    """last_modified_time で更新を追えない参照先（TABLE_REF・CTE・UNNEST・サブクエリ以外）"""
+    # CTE 名もコメントを除いてから拾う（`),` と次の CTE 名の間のコメント行で見落とさない）
+    ctes = {name.lower() for name in CTE_NAME.findall(strip_sql(sql))}
+    return [t for t in from_targets(sql)
+            if t != '(' and t.upper() != 'UNNEST' and t.lower() not in ctes and not TABLE_REF.fullmatch(t)]
+
+
+def param_key(job_config):
+    params = getattr(job_config, 'query_parameters', None) or []
+    return repr(sorted((p.to_api_repr()['name'], repr(p.to_api_repr())) for p in params))
+
+
+class CachedQueryJob:
+    """QueryJob の代わり（result() / to_dataframe() / total_bytes_processed / cache_hit）"""
+
+    def __init__(self, columns, rows, total_bytes_processed, cache_hit):
+        self.columns = columns
+        self.field_to_index = {c: i for i, c in enumerate(columns)}
+        self.rows = rows
+        self.total_bytes_processed = total_bytes_processed
+        self.cache_hit = cache_hit
+
+    def result(self):
+        return [bigquery.Row(values, self.field_to_index) for values in self.rows]
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame(self.rows, columns=self.columns)
+
+
+class CachedClient:
+    def __init__(self, client=None, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.client = client or get_client()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        with self._connect() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+              key TEXT PRIMARY KEY,
+              sql TEXT,
+              payload BLOB,
+              size INTEGER,
+              bytes_processed INTEGER,
+              created_at REAL,
+              accessed_at REAL
+            )""")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def source_versions(self, sql, _seen=None):
+        """参照する実テーブルの {table_id: last_modified(ms)}。キャッシュ不可なら None
+        （メタデータは毎回 get_table で取り直す。呼び出しごとに最新の last_modified_time を見る）"""
+        if unversioned_refs(sql):
+            return None
+        seen = set() if _seen is None else _seen
+        versions = {}
+        for ref in TABLE_REF.findall(sql):
+            if ref in seen:
+                continue
+            seen.add(ref)
+            table = self.client.get_table(ref)
+            if table.table_type == 'EXTERNAL':
+                return None
+            if table.table_type == 'VIEW':
+                nested = self.source_versions(table.view_query, seen)
+                if nested is None:
+                    return None
+                versions.update(nested)
+            else:
+                versions[ref] = int(table.modified.timestamp() * 1000)
+        return versions
+
+    def cache_key(self, sql, job_config=None):
+        normalized = normalize_sql(sql)
+        if not re.match(r'(SELECT|WITH)\b', normalized, re.IGNORECASE) or UNCACHEABLE.search(normalized):
+            return None
+        versions = self.source_versions(sql)
+        if not versions:
+            return None
+        body = '\n'.join([normalized, param_key(job_config)] + [f'{t}@{v}' for t, v in sorted(versions.items())])
+        return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+    def query(self, sql, job_config=None):
+        key = self.cache_key(sql, job_config)
+        if key is not None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT payload FROM cache WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            if row:
+                self.hits += 1
+                columns, rows = pickle.loads(zlib.decompress(row[0]))
+                return CachedQueryJob(columns, rows, 0, True)
+
+        job = self.client.query(sql, job_config=job_config)
+        result = job.result()
+        columns = [f.name for f in result.schema]
+        rows = [tuple(r.values()) for r in result]
+        self.misses += 1
+        if key is not None:
+            self._store(key, sql, columns, rows, job.total_bytes_processed or 0)
+        return CachedQueryJob(columns, rows, job.total_bytes_processed, False)
+
+    def _store(self, key, sql, columns, rows, bytes_processed):
+        payload = zlib.compress(pickle.dumps((columns, rows), protocol=pickle.HIGHEST_PROTOCOL))
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, normalize_sql(sql), payload, len(payload), bytes_processed, now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed_at").fetchall():
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    # bigquery.Client のその他のメソッドはそのまま委譲
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BQ クエリキャッシュの管理')
+    parser.add_argument('--stats', action='store_true', help='件数・サイズ・節約したスキャン量を表示')
+    parser.add_argument('--clear', action='store_true', help='キャッシュを全削除')
+    args = parser.parse_args()
+    if not os.path.exists(CACHE_PATH):
+        print('キャッシュなし')
+        return
+    conn = sqlite3.connect(CACHE_PATH)
+    if args.clear:
+        conn.execute("DELETE FROM cache")
+        conn.commit()
+        conn.execute("VACUUM")
+        print('キャッシュを削除しました')
+    else:
+        cnt, size, scanned = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(bytes_processed), 0) FROM cache").fetchone()
+        print(f'=== {os.path.normpath(CACHE_PATH)} ===')
+        print(f'  {cnt}件  {size / 1024**2:,.1f} MB / 上限 {MAX_CACHE_BYTES / 1024**2:,.0f} MB')
+        print(f'  キャッシュ済みクエリの元スキャン量: {scanned / 1024**2:,.1f} MB（再実行1回ごとの節約分）')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
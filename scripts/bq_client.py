@@ -0,0 +1,100 @@
+"""
+BigQuery 共通クライアント（スクリプト共通のデータアクセス）
+
+- get_client(): プロセス内で1つの bigquery.Client を使い回す（認証・HTTP セッションを再利用、スレッドセーフ）
+- クライアント経由の全クエリにジョブラベルを付与（コストのスクリプト別集計用）
+    app=accounting-scripts, script=<実行スクリプト名>（+ 呼び出し側で labels={'step': ...} を追加可）
+- query_arrow() / query_dataframe(): 結果を BigQuery Storage Read API で Arrow / pandas に直接ダウンロード
+  （年度全件の取得などで REST のページングより速く、Row オブジェクトを作らない分メモリも少ない）
+  google-cloud-bigquery-storage が入っていない環境では REST にフォールバック
+
+使い方:
+    from bq_client import get_client, query, query_arrow
+    for row in query(sql, params=[bigquery.ScalarQueryParameter('fy', 'INT64', 2025)]):
+        ...
+    table = query_arrow(sql, labels={'step': 'fetch'})      # pyarrow.Table
+    rows = table.to_pylist()                                # [{列名: 値}, ...]
+
+スクリプト別コスト:
+    SELECT l.value AS script, SUM(total_bytes_billed) / POW(1024, 3) AS gb_billed
+    FROM `region-<データセットのリージョン>`.INFORMATION_SCHEMA.JOBS, UNNEST(labels) l
+    WHERE l.key = 'script' AND creation_time >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 30 DAY)
+    GROUP BY 1 ORDER BY 2 DESC
+"""
+import os
+import re
+import sys
+import threading
+from google.cloud import bigquery
+
+try:
+    from google.cloud import bigquery_storage
+except ImportError:  # Storage Read API なし → REST でダウンロード
+    bigquery_storage = None
+
+BQ_PROJECT = "main-project-477501"
+APP_LABEL = 'accounting-scripts'
+
+_lock = threading.RLock()
+_client = None
+_storage_client = None
+
+
+def label_value(value):
+    """BQ ラベル値の制約（小文字英数字・_・-、63文字以内）に合わせる"""
+    return re.sub(r'[^a-z0-9_-]', '_', value.lower())[:63] or 'unknown'
+
+
+def default_labels():
+    script = os.path.splitext(os.path.basename(sys.argv[0] or ''))[0]
+    return {'app': APP_LABEL, 'script': label_value(script)}
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            _client = bigquery.Client(
+                project=BQ_PROJECT,
+                default_query_job_config=bigquery.QueryJobConfig(labels=default_labels()),
+            )
+        return _client
+
+
+def get_storage_client():
+    """Storage Read API クライアント（パッケージがなければ None）"""
+    global _storage_client
+    if bigquery_storage is None:
+        return None
+    with _lock:
+        if _storage_client is None:
+            _storage_client = bigquery_storage.BigQueryReadClient()
+        return _storage_client
+
+
+def job_config(params=None, labels=None, **kwargs):
+    """パラメータ・追加ラベル付きの QueryJobConfig（既定ラベルに labels をマージ）"""
+    return bigquery.QueryJobConfig(
+        query_parameters=params or [],
+        labels={**default_labels(), **{k: label_value(str(v)) for k, v in (labels or {}).items()}},
+        **kwargs,
+    )
+
+
+def query(sql, params=None, labels=None):
+    """クエリを実行して RowIterator を返す（小さな結果・Row でのアクセス向け）"""
+    return get_client().query(sql, job_config=job_config(params, labels)).result()
+
+
+def query_arrow(sql, params=None, labels=None):
+    """クエリ結果を Storage Read API で pyarrow.Table として取得"""
+    storage = get_storage_client()
+    result = query(sql, params, labels)
+    return result.to_arrow(bqstorage_client=storage, create_bqstorage_client=False)
+
+
+def query_dataframe(sql, params=None, labels=None):
+    """クエリ結果を Storage Read API で pandas.DataFrame として取得"""
+    storage = get_storage_client()
+    result = query(sql, params, labels)
+    return result.to_dataframe(bqstorage_client=storage, create_bqstorage_client=False)
@@ -0,0 +1,332 @@
+"""
+Amazon 精算の入金額 ↔ 銀行入金 の照合（月次締め STEP 4）
+
+Amazon 側は BQ の精算レポート（analytics.stg_sp_settlement）から settlement_id ごとの入金額
+（SUM(amount)、deposit_date）を作る。NocoDB の Amazon出品アカウント明細は 2026-03-06 に廃止済みで、
+Amazon の仕訳は settlement_journal_view から直接 journal_entries に入る（reference/nocodb-tables.md）。
+銀行側は振替リンクがなく、勘定科目が未設定か Amazon出品アカウントの入金（楽天銀行・PayPay銀行）。
+両者を「金額 ±AMOUNT_TOLERANCE 円・日付 ±DATE_WINDOW 日」で照合し、勘定科目が未設定の銀行入金に
+Amazon出品アカウントを設定する提案を TSV に書き出す。確認後に --apply で反映する。
+（銀行入金は Dr.銀行 / Cr.Amazon出品アカウント で計上され、精算仕訳の Amazon出品アカウント残高を消し込む。
+  Amazon 側の行がもうないので振替レコードは作らない。振替リンクを付けると銀行側も仕訳から除外される）
+
+照合:
+  - 銀行ごとに (金額, 日付) でソートした索引を作り、精算1件あたり許容金額ごとに二分探索で
+    日付範囲を切り出す（全体 O(n log n)。旧 tmp/find_amazon_bank_matches.py の総当たりを置き換え）
+  - 候補が複数ある（同額の入金が近い日付に並ぶ）場合は、候補グラフの連結成分ごとに
+    割当問題（ハンガリアン法）を解き、1対1で「リンク件数最大 → 金額差・日付差の合計最小」の組を選ぶ
+  - 候補が複数あった行は status=ambiguous として提案に残す（要確認）
+  - 銀行側が既に Amazon出品アカウントの組は照合済みとして件数だけ表示する。
+    入金の見つからない精算・どの精算にも対応しない Amazon出品アカウントの入金は一覧を表示する（要確認）
+
+提案ファイル（tmp/deposit_match_proposals.tsv。銀行側の勘定科目が未設定の組だけ）:
+  settlement_id, deposit_date, deposit_amount, bank, bank_id, bank_date, bank_amount, day_diff, yen_diff,
+  candidates, status
+  不要な行を削除してから --apply する。適用時に銀行側がまだ振替リンクなし・勘定科目未設定であることを再確認する。
+
+実行: python scripts/deposit_matcher.py                 照合して提案を書き出す（BQ・NocoDB とも読み取りのみ）
+      python scripts/deposit_matcher.py --since 2026-01-01 --days 5 --yen 0
+      python scripts/deposit_matcher.py --local           精算データをローカル DuckDB レプリカから読む
+      python scripts/deposit_matcher.py --apply tmp/deposit_match_proposals.tsv
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import bisect
+import csv
+import datetime
+import os
+import sqlite3
+from collections import Counter
+
+BQ_PROJECT = "main-project-477501"
+NOCO_DB_PATH = 'C:/Users/ninni/nocodb/noco.db'
+PROPOSALS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmp', 'deposit_match_proposals.tsv')
+TRANSFER_COL = 'nc_opau___振替_id'
+ACCOUNT_COL = 'nc_opau___freee勘定科目_id'
+AMAZON_ACCOUNT_ID = 9          # 勘定科目「Amazon出品アカウント」（nocodb_id）
+DATE_WINDOW = 7                # deposit_date と銀行入金日のずれ（通常 0〜3日）
+AMOUNT_TOLERANCE = 1           # 円
+DAY_COST, YEN_COST = 1, 100    # 割当コスト: 金額差は日付差より重く見る
+
+# 入金側の口座（amount 列は入金がプラス）
+BANKS = [
+    {'name': '楽天銀行', 'table': 'nc_opau___楽天銀行ビジネス口座入出金明細',
+     'date': '取引日', 'amount': '入出金_円_'},
+    {'name': 'PayPay銀行', 'table': 'nc_opau___PayPay銀行入出金明細',
+     'date': '操作日', 'amount': 'お預かり金額'},
+]
+
+FIELDS = ['settlement_id', 'deposit_date', 'deposit_amount', 'bank', 'bank_id', 'bank_date', 'bank_amount',
+          'day_diff', 'yen_diff', 'candidates', 'status']
+
+# 精算ごとの入金額（マイナス = Amazon への支払い。銀行入金はないので対象外）
+SETTLEMENT_DEPOSITS_SQL = f"""
+SELECT
+  CAST(settlement_id AS STRING) AS settlement_id,
+  DATE(MAX(deposit_date)) AS deposit_date,
+  CAST(ROUND(SUM(amount)) AS INT64) AS deposit_amount
+FROM `{BQ_PROJECT}.analytics.stg_sp_settlement`
+WHERE settlement_id IS NOT NULL
+GROUP BY 1
+HAVING deposit_date >= @since AND deposit_amount > 0
+ORDER BY deposit_date, settlement_id
+"""
+
+
+def to_date(value):
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def load_amazon_deposits(client, since):
+    """stg_sp_settlement の settlement_id ごとの入金（deposit_date が since 以降）"""
+    from google.cloud import bigquery
+    config = bigquery.QueryJobConfig(query_parameters=[bigquery.ScalarQueryParameter('since', 'DATE', since)])
+    rows = client.query(SETTLEMENT_DEPOSITS_SQL, job_config=config).result()
+    return [{'id': r['settlement_id'], 'date': to_date(r['deposit_date']), 'amount': int(r['deposit_amount'])}
+            for r in rows]
+
+
+def load_bank_deposits(conn, bank, since):
+    """振替リンクがなく、勘定科目が未設定か Amazon出品アカウントの入金（日付は since - DATE_WINDOW 以降）"""
+    start = (since - datetime.timedelta(days=DATE_WINDOW)).isoformat()
+    rows = conn.execute(f'''
+        SELECT id, "{bank['date']}", "{bank['amount']}", "{ACCOUNT_COL}" FROM "{bank['table']}"
+        WHERE "{TRANSFER_COL}" IS NULL AND "{bank['amount']}" > 0 AND "{bank['date']}" >= ?
+          AND ("{ACCOUNT_COL}" IS NULL OR "{ACCOUNT_COL}" = ?)''', (start, AMAZON_ACCOUNT_ID)).fetchall()
+    return [{'bank': bank['name'], 'id': r[0], 'date': to_date(r[1]), 'amount': int(r[2]),
+             'classified': r[3] == AMAZON_ACCOUNT_ID} for r in rows]
+
+
+class DepositIndex:
+    """(金額, 日付) でソートした入金の索引。金額・日付の範囲検索を二分探索で行う"""
+
+    def __init__(self, deposits):
+        self.deposits = sorted(deposits, key=lambda d: (d['amount'], d['date'].toordinal()))
+        self.keys = [(d['amount'], d['date'].toordinal()) for d in self.deposits]
+
+    def candidates(self, amount, date, days=DATE_WINDOW, yen=AMOUNT_TOLERANCE):
+        day = date.toordinal()
+        for a in range(amount - yen, amount + yen + 1):
+            lo = bisect.bisect_left(self.keys, (a, day - days))
+            hi = bisect.bisect_right(self.keys, (a, day + days))
+            yield from self.deposits[lo:hi]
+
+
+def hungarian(cost):
+    """行数 <= 列数 のコスト行列の最小コスト割当。各行に割り当てた列番号のリストを返す"""
+    n, m = len(cost), len(cost[0])
+    inf = float('inf')
+    u, v = [0] * (n + 1), [0] * (m + 1)
+    p, way = [0] * (m + 1), [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], inf, 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    assignment = [None] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+    return assignment
+
+
+def components(edges):
+    """候補グラフ {amazon_id: {bank_key: cost}} を連結成分 [(amazon_ids, bank_keys)] に分ける"""
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, banks in edges.items():
+        for b in banks:
+            parent[find(('a', a))] = find(('b', b))
+    groups = {}
+    for a, banks in edges.items():
+        left, right = groups.setdefault(find(('a', a)), (set(), set()))
+        left.add(a)
+        right.update(banks)
+    return [(sorted(left), sorted(right, key=str)) for left, right in groups.values()]
+
+
+def assign(edges):
+    """1対1の最適割当 {amazon_id: bank_key}（リンク件数最大 → コスト合計最小）"""
+    result = {}
+    for left, right in components(edges):
+        if len(left) == 1 and len(right) == 1:
+            result[left[0]] = right[0]
+            continue
+        # 候補にない組は成分内のコスト合計より大きくして、リンク件数の最大化を優先させる
+        forbidden = 1 + sum(c for a in left for c in edges[a].values())
+        cost = [[edges[a].get(b, forbidden) for b in right] for a in left]
+        if len(left) <= len(right):
+            pairs = [(a, right[j]) for a, j in zip(left, hungarian(cost))]
+        else:
+            transposed = [list(col) for col in zip(*cost)]
+            pairs = [(left[i], b) for b, i in zip(right, hungarian(transposed))]
+        for a, b in pairs:
+            if b in edges[a]:
+                result[a] = b
+    return result
+
+
+def match(amazon, bank_deposits, days=DATE_WINDOW, yen=AMOUNT_TOLERANCE):
+    """照合結果（組ごとの行）のリストと、候補のない精算のリストを返す"""
+    indexes = [DepositIndex(deps) for deps in bank_deposits]
+    banks = {}
+    edges = {}
+    for dep in amazon:
+        cands = {}
+        for index in indexes:
+            for b in index.candidates(dep['amount'], dep['date'], days, yen):
+                key = (b['bank'], b['id'])
+                banks[key] = b
+                cands[key] = (DAY_COST * abs((b['date'] - dep['date']).days)
+                              + YEN_COST * abs(b['amount'] - dep['amount']))
+        if cands:
+            edges[dep['id']] = cands
+    chosen = assign(edges)
+    proposals, unmatched = [], []
+    for dep in amazon:
+        key = chosen.get(dep['id'])
+        if key is None:
+            unmatched.append(dep)
+            continue
+        b = banks[key]
+        n = len(edges[dep['id']])
+        proposals.append({
+            'settlement_id': dep['id'], 'deposit_date': dep['date'].isoformat(), 'deposit_amount': dep['amount'],
+            'bank': b['bank'], 'bank_id': b['id'], 'bank_date': b['date'].isoformat(), 'bank_amount': b['amount'],
+            'day_diff': (b['date'] - dep['date']).days, 'yen_diff': b['amount'] - dep['amount'],
+            'candidates': n, 'status': 'unique' if n == 1 else 'ambiguous',
+            'classified': b['classified'],
+        })
+    return proposals, unmatched
+
+
+def write_proposals(proposals, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, delimiter='\t', extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(proposals)
+
+
+def apply_proposals(conn, path):
+    """提案ファイルの各行について、銀行入金の勘定科目を Amazon出品アカウントに設定"""
+    with open(path, encoding='utf-8', newline='') as f:
+        proposals = list(csv.DictReader(f, delimiter='\t'))
+    banks = {b['name']: b for b in BANKS}
+    now = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S+00:00')
+    updated, skipped = 0, 0
+    for p in proposals:
+        bank = banks[p['bank']]
+        row = conn.execute(f'SELECT "{TRANSFER_COL}", "{ACCOUNT_COL}" FROM "{bank["table"]}" WHERE id = ?',
+                           (int(p['bank_id']),)).fetchone()
+        if not row or row[0] is not None or row[1] is not None:
+            print(f"  SKIP settlement {p['settlement_id']} ↔ {p['bank']} {p['bank_id']}: "
+                  f"行がないか振替リンク・勘定科目が設定済み")
+            skipped += 1
+            continue
+        conn.execute(f'UPDATE "{bank["table"]}" SET "{ACCOUNT_COL}" = ?, updated_at = ? WHERE id = ?',
+                     (AMAZON_ACCOUNT_ID, now, int(p['bank_id'])))
+        print(f"  {p['bank']} {p['bank_id']} ({p['bank_date']} ¥{int(p['bank_amount']):,}) → Amazon出品アカウント"
+              f"（settlement {p['settlement_id']}）")
+        updated += 1
+    conn.commit()
+    print(f'\n勘定科目設定: {updated}件 / スキップ: {skipped}件')
+    if updated:
+        print('次のステップ: BQ sync → 月次監査（python scripts/audit_checks.py --group links）')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Amazon 精算の入金額 ↔ 銀行入金 の照合')
+    parser.add_argument('--since', type=datetime.date.fromisoformat,
+                        default=datetime.date(datetime.date.today().year, 1, 1),
+                        help='対象の deposit_date の開始日（既定: 今年の1月1日）')
+    parser.add_argument('--days', type=int, default=DATE_WINDOW, help=f'日付の許容差（既定 ±{DATE_WINDOW}日）')
+    parser.add_argument('--yen', type=int, default=AMOUNT_TOLERANCE, help=f'金額の許容差（既定 ±{AMOUNT_TOLERANCE}円）')
+    parser.add_argument('--local', action='store_true', help='精算データをローカル DuckDB レプリカから読む')
+    parser.add_argument('--out', default=PROPOSALS_PATH, help='提案ファイルの出力先')
+    parser.add_argument('--apply', metavar='TSV', help='確認済みの提案ファイルを NocoDB に適用')
+    args = parser.parse_args()
+
+    if args.apply:
+        conn = sqlite3.connect(NOCO_DB_PATH)
+        print(f'=== 勘定科目設定: {args.apply} ===')
+        apply_proposals(conn, args.apply)
+        conn.close()
+        return
+
+    if args.local:
+        from warehouse_local import LocalClient
+        client = LocalClient()
+    else:
+        from bq_client import get_client
+        client = get_client()
+    amazon = load_amazon_deposits(client, args.since)
+    conn = sqlite3.connect(f'file:{NOCO_DB_PATH}?mode=ro', uri=True)
+    bank_deposits = [load_bank_deposits(conn, bank, args.since) for bank in BANKS]
+    conn.close()
+    print(f'精算（入金あり・{args.since} 以降）: {len(amazon)}件 / 銀行入金（未分類 + Amazon出品アカウント）: '
+          + ', '.join(f"{b['name']} {len(d)}件" for b, d in zip(BANKS, bank_deposits)))
+
+    matches, unmatched = match(amazon, bank_deposits, args.days, args.yen)
+    proposals = [m for m in matches if not m['classified']]
+    print(f'\n=== 照合（金額 ±{args.yen}円・日付 ±{args.days}日） ===')
+    print(f'  照合済み（銀行側が Amazon出品アカウント）: {len(matches) - len(proposals)}件')
+    print(f'  提案: {len(proposals)}件（要確認 ambiguous: '
+          f"{sum(p['status'] == 'ambiguous' for p in proposals)}件）")
+    if matches:
+        print(f"  日付差の分布: {dict(sorted(Counter(p['day_diff'] for p in matches).items()))}")
+    for p in proposals:
+        mark = '  ← 要確認' if p['status'] == 'ambiguous' else ''
+        print(f"  settlement {p['settlement_id']} ({p['deposit_date']} ¥{p['deposit_amount']:,}) ↔ "
+              f"{p['bank']} {p['bank_id']} ({p['bank_date']} ¥{p['bank_amount']:,}) "
+              f"diff={p['day_diff']:+d}d{mark}")
+    if unmatched:
+        print(f'\n=== 入金の見つからない精算: {len(unmatched)}件（銀行明細の未取込・相殺など → 個別に確認） ===')
+        for dep in unmatched:
+            print(f"  settlement {dep['id']}: {dep['date']} ¥{dep['amount']:,}")
+    matched_banks = {(m['bank'], m['bank_id']) for m in matches}
+    orphans = [b for deps in bank_deposits for b in deps
+               if b['classified'] and b['date'] >= args.since and (b['bank'], b['id']) not in matched_banks]
+    if orphans:
+        print(f'\n=== 対応する精算のない Amazon出品アカウントの入金: {len(orphans)}件（要確認） ===')
+        for b in orphans:
+            print(f"  {b['bank']} id={b['id']}: {b['date']} ¥{b['amount']:,}")
+
+    if proposals:
+        write_proposals(proposals, args.out)
+        print(f'\n提案を書き出しました: {os.path.normpath(args.out)}')
+        print(f'確認後: python scripts/deposit_matcher.py --apply {os.path.normpath(args.out)}')
+
+
+if __name__ == '__main__':
+    main()
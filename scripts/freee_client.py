@@ -0,0 +1,184 @@
+"""
+freee API 共有クライアント（同期・削除スクリプト共通）
+
+- requests.Session + コネクションプールで接続を再利用
+- トークンバケットで freee のレート制限（目安: 3,600回/時/事業所）以下に抑える
+- map() で並列実行（同時実行数は concurrency で制限、全スレッドで同じバケットを共有）
+  複数年度を並列同期するなど map() を入れ子にしても、実行中リクエスト数は concurrency を超えない
+- 429 / 5xx / 通信エラーはジッター付き指数バックオフでリトライ（Retry-After があればそれ以上待つ）
+  ※ POST は二重登録を避けるため 429 のみリトライ
+- メソッド別の呼び出し回数・レイテンシ・リトライ数を集計（print_stats）
+
+使い方:
+    client = FreeeClient(get_headers(token), concurrency=4)
+    res = client.request('GET', f"{FREEE_API_BASE}/manual_journals?company_id={cid}")
+    results = client.map(lambda mj_id: client.request('DELETE', ...), mj_ids, label='削除')
+    client.print_stats()
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# freee 会計 API の上限は 3,600回/時 → 定常 1回/秒、短時間のバーストは 10回まで
+DEFAULT_RATE_PER_SEC = 1.0
+DEFAULT_BURST = 10
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SEC = 1.0
+BACKOFF_MAX_SEC = 120.0
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# POST は冪等でないため、サーバ側で処理された可能性がある 5xx・通信エラーではリトライしない
+RETRY_STATUS_POST = {429}
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット（rate 個/秒で補充、最大 burst 個）"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self, seconds):
+        """429 を受けたら全スレッドを止める（バケットを空にして seconds 分の借りを作る）"""
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class FreeeClient:
+    def __init__(self, headers, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE_PER_SEC,
+                 burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES):
+        self.headers = headers
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, burst)
+        self.in_flight = threading.BoundedSemaphore(max(concurrency, 1))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 1))
+        self.session.mount('https://', adapter)
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+
+    def _record(self, method, elapsed, retries, failed):
+        with self.stats_lock:
+            s = self.stats.setdefault(method, {'calls': 0, 'total_sec': 0.0, 'max_sec': 0.0,
+                                               'retries': 0, 'failed': 0})
+            s['calls'] += 1
+            s['total_sec'] += elapsed
+            s['max_sec'] = max(s['max_sec'], elapsed)
+            s['retries'] += retries
+            s['failed'] += int(failed)
+
+    @staticmethod
+    def _retry_after(value):
+        """Retry-After（秒数 または HTTP-date）→ 待つ秒数。読めない値は None（通常のバックオフ）"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value)) or None
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds()) or None
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def request(self, method, url, json_data=None):
+        """1回の API 呼び出し（レート制限・リトライ込み）。最終的なレスポンスを返す"""
+        retry_status = RETRY_STATUS_POST if method == 'POST' else RETRY_STATUS
+        start = time.monotonic()
+        res = None
+        error = None
+        attempt = 0
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                with self.in_flight:
+                    res = self.session.request(method, url, headers=self.headers, json=json_data, timeout=60)
+                error = None
+            except requests.RequestException as e:
+                if method == 'POST':
+                    self._record(method, time.monotonic() - start, attempt, True)
+                    raise
+                res, error = None, e
+
+            if res is not None and res.status_code not in retry_status:
+                break
+            if attempt == self.max_retries:
+                break
+
+            retry_after = None
+            if res is not None and res.status_code == 429:
+                retry_after = self._retry_after(res.headers.get('Retry-After'))
+            wait = self._backoff(attempt, retry_after)
+            if res is not None and res.status_code == 429:
+                self.bucket.drain(wait)
+            reason = res.status_code if res is not None else type(error).__name__
+            print(f"    {method} retry {attempt + 1}/{self.max_retries} ({reason}). Waiting {wait:.1f}s...")
+            time.sleep(wait)
+
+        failed = res is None or res.status_code in retry_status
+        self._record(method, time.monotonic() - start, attempt, failed)
+        if failed:
+            reason = res.status_code if res is not None else error
+            print(f"    ✗ {method} {url.split('?')[0]}: リトライ上限 ({reason})")
+        if res is None:
+            raise error
+        return res
+
+    def map(self, fn, items, label=None, progress_every=50):
+        """items の各要素に fn を並列適用（結果は items と同じ順序で返す）"""
+        items = list(items)
+        done = [0]
+        done_lock = threading.Lock()
+
+        def run(item):
+            result = fn(item)
+            if label:
+                with done_lock:
+                    done[0] += 1
+                    n = done[0]
+                if n % progress_every == 0:
+                    print(f"    {n}/{len(items)} {label}")
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(run, items))
+
+    def print_stats(self):
+        print("\n  === freee API 統計 ===")
+        for method, s in sorted(self.stats.items()):
+            avg = s['total_sec'] / s['calls'] if s['calls'] else 0
+            print(f"  {method:<6} {s['calls']:>5}回  平均 {avg*1000:,.0f}ms  最大 {s['max_sec']*1000:,.0f}ms"
+                  f"  リトライ {s['retries']}  失敗 {s['failed']}")
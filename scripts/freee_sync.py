@@ -0,0 +1,554 @@
+"""
+BQ journal_entries → freee 振替伝票 同期（複数年度対応）
+
+差分同期（デフォルト）:
+1. BQ から指定年度の全仕訳を1クエリで取得し、トランザクションごとに fingerprint を計算
+2. freee の振替伝票を取得し、チェックポイント（source_key → freee id）と突合
+3. 新規は POST、内容変更は PUT、BQ から消えた伝票は DELETE（変更分のみ API 呼び出し）
+
+全件再登録（--full）:
+1. BQ から指定年度の全仕訳を取得
+2. freee の該当年度の振替伝票・取引を全削除
+3. BQ データを振替伝票として freee に登録
+
+年度は並列に同期する（freee API の同時実行数・レート制限は freee_client で全年度共有）。
+勘定科目マッピングは BQ accounting.freee_account_mapping から読み込む。
+取得の前に、棚卸仕訳が参照する analytics.dim_standard_cost が NocoDB の標準原価より古ければ作り直す。
+
+途中で失敗・中断しても、年度別チェックポイント（source_key → freee id の JSONL）から
+登録済みの伝票をスキップして再開できる（--full も全件削除できていれば Step 2 を飛ばす）。
+
+実行:
+  python scripts/freee_sync.py 2025
+  python scripts/freee_sync.py 2023-2025 --full
+  python scripts/freee_sync.py 2024 2025 --yes
+"""
+import sys, json, hashlib, os, threading, argparse
+sys.stdout.reconfigure(encoding='utf-8')
+sys.path.insert(0, 'C:/Users/ninni/.claude/skills/freee/scripts')
+
+from concurrent.futures import ThreadPoolExecutor
+from auth import get_access_token, get_company_id, get_headers, FREEE_API_BASE
+from google.cloud import bigquery
+from bq_client import get_client, query, query_arrow
+from journal_entries_mat import ensure_dim_standard_cost
+from journal_validation import JOURNAL_COLUMNS_SQL, validate, print_report
+from freee_client import FreeeClient
+
+# === 設定 ===
+BQ_PROJECT = 'main-project-477501'
+# freee API 同時実行数（全年度で共有。レート制限は freee_client のトークンバケット）
+FREEE_CONCURRENCY = 4
+# freee の最初の会計年度。この年度には前年度までの残高を開始残高仕訳として登録する
+OPENING_BALANCE_YEAR = 2023
+
+
+def checkpoint_path(fiscal_year):
+    """同期チェックポイント（JSONL 追記型）: 登録・更新・削除のたびに source_key → freee id を1行追記"""
+    return f'tmp/freee_sync_fy{fiscal_year}.checkpoint.jsonl'
+
+
+def parse_years(tokens):
+    """['2023-2025'] / ['2024', '2025'] → [2023, 2024, 2025]"""
+    years = set()
+    for token in tokens:
+        if '-' in token:
+            start, end = token.split('-', 1)
+            years.update(range(int(start), int(end) + 1))
+        else:
+            years.add(int(token))
+    return sorted(years)
+
+
+def load_account_map():
+    """BQ accounting.freee_account_mapping → {account_name: freee account_item_id}"""
+    sql = f"""
+    SELECT account_name, account_item_id
+    FROM `{BQ_PROJECT}.accounting.freee_account_mapping`
+    WHERE account_item_id IS NOT NULL
+    """
+    return {row.account_name: int(row.account_item_id) for row in query(sql, labels={'step': 'account_map'})}
+
+
+def build_payload(cid, txn):
+    """BQ トランザクション → freee 振替伝票 payload"""
+    details = []
+    for d in txn['details']:
+        details.append({
+            'entry_side': d['entry_side'],
+            'account_item_id': d['account_item_id'],
+            'amount': d['amount'],
+            'tax_code': 0,
+            'description': d['description'][:255] if d['description'] else '',
+        })
+    return {
+        'company_id': cid,
+        'issue_date': txn['journal_date'],
+        'adjustment': False,
+        'details': details,
+    }
+
+
+def fingerprint(issue_date, details):
+    """振替伝票の内容ハッシュ（日付 + 明細。明細の並び順には依存しない）"""
+    lines = sorted(
+        (d['entry_side'], d['account_item_id'], d['amount'], d.get('description') or '')
+        for d in details
+    )
+    raw = json.dumps([issue_date, lines], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class SyncCheckpoint:
+    """freee 同期のチェックポイント（JSONL 追記型ジャーナル）
+
+    1 API 呼び出しが成功するたびに1行追記して fsync する。途中でクラッシュしても
+    再実行時に replay すれば「どの source_key がどの freee id で登録済みか」が復元できる。
+
+    op:
+      map        {source_key, freee_id, fingerprint}  登録・更新・引き継ぎ
+      unmap      {freee_id}                           削除
+      full_begin / cleared / full_done                 --full 実行の進行状況
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}        # source_key → {'freee_id', 'fingerprint'}
+        self.full_run = None   # 未完了の --full 実行: {'cleared': bool}
+        self._replay()
+        self.f = open(path, 'a', encoding='utf-8')
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # クラッシュ時の書きかけ行
+                self._apply(rec)
+
+    def _apply(self, rec):
+        op = rec['op']
+        if op == 'map':
+            self.state[rec['source_key']] = {'freee_id': rec['freee_id'], 'fingerprint': rec['fingerprint']}
+        elif op == 'unmap':
+            for key in [k for k, v in self.state.items() if v['freee_id'] == rec['freee_id']]:
+                del self.state[key]
+        elif op == 'full_begin':
+            self.state = {}
+            self.full_run = {'cleared': False}
+        elif op == 'cleared':
+            self.full_run['cleared'] = True
+        elif op == 'full_done':
+            self.full_run = None
+
+    def record(self, op, **fields):
+        rec = {'op': op, **fields}
+        with self.lock:
+            self.f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self._apply(rec)
+
+    def compact(self):
+        """完了後にジャーナルを現在のマッピングだけに書き直す"""
+        with self.lock:
+            self.f.close()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key, v in sorted(self.state.items()):
+                    f.write(json.dumps({'op': 'map', 'source_key': key, **v}, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, self.path)
+            self.f = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        self.f.close()
+
+
+def fetch_opening_balance(fiscal_year):
+    """前年度末までの残高 → 開始残高仕訳（freee には前年度データがないため）"""
+    sql = f"""
+    SELECT account_name,
+      SUM(CASE WHEN entry_side='debit' THEN amount_jpy ELSE -amount_jpy END) AS balance
+    FROM `{BQ_PROJECT}.accounting.journal_entries`
+    WHERE fiscal_year < {fiscal_year}
+    GROUP BY 1
+    HAVING ABS(SUM(CASE WHEN entry_side='debit' THEN amount_jpy ELSE -amount_jpy END)) > 0
+    """
+    rows = list(query(sql, labels={'step': 'opening_balance'}))
+    if not rows:
+        return None
+    opening = {'journal_date': f'{fiscal_year}-01-01', 'source_key': 'opening_balance', 'details': []}
+    for row in rows:
+        bal = int(row.balance)
+        opening['details'].append({
+            'entry_side': 'debit' if bal > 0 else 'credit',
+            'account_name': row.account_name,
+            'amount': abs(bal),
+            'description': f'FY{fiscal_year - 1}期末残高（開始残高）',
+        })
+    dr = sum(d['amount'] for d in opening['details'] if d['entry_side'] == 'debit')
+    cr = sum(d['amount'] for d in opening['details'] if d['entry_side'] == 'credit')
+    assert dr == cr, f"開始残高貸借不一致: Dr={dr} Cr={cr}"
+    print(f"  FY{fiscal_year} 開始残高仕訳追加: {len(rows)}科目 {dr:,}円")
+    return opening
+
+
+def step1_fetch_bq(fiscal_years):
+    """BQ から指定年度の仕訳データを1クエリで取得し、年度別・トランザクション単位にグループ化"""
+    years_label = ', '.join(f'FY{y}' for y in fiscal_years)
+    print(f"\n=== Step 1: BQ {years_label} データ取得 ===")
+    ensure_dim_standard_cost(get_client())
+    account_map = load_account_map()
+    print(f"  勘定科目マッピング: {len(account_map)}科目 (accounting.freee_account_mapping)")
+
+    sql = JOURNAL_COLUMNS_SQL + """
+    WHERE fiscal_year IN UNNEST(@fiscal_years)
+    ORDER BY journal_date, source_table, source_id, entry_side
+    """
+    # 年度全件は Storage Read API で Arrow として取得
+    table = query_arrow(sql, params=[bigquery.ArrayQueryParameter('fiscal_years', 'INT64', fiscal_years)],
+                        labels={'step': 'fetch_journal_entries'})
+    print(f"  取得行数: {table.num_rows}")
+
+    # 貸借バランス・勘定科目マッピングを列単位で検証（source_key・account_item_id 列も付与）
+    table, report = validate(table, account_map)
+
+    # 年度 → トランザクション単位にグループ化（freee の payload 用に伝票ごとの明細 dict を作る）
+    cols = {name: table.column(name).to_pylist() for name in (
+        'fiscal_year', 'source_key', 'journal_date', 'entry_side', 'account_name', 'account_item_id',
+        'amount_jpy', 'description')}
+    by_year = {fy: {} for fy in fiscal_years}
+    for i in range(table.num_rows):
+        txns = by_year[cols['fiscal_year'][i]]
+        key = cols['source_key'][i]
+        if key not in txns:
+            txns[key] = {
+                'journal_date': cols['journal_date'][i],
+                'source_key': key,
+                'details': []
+            }
+        txns[key]['details'].append({
+            'entry_side': cols['entry_side'][i],
+            'account_name': cols['account_name'][i],
+            'account_item_id': cols['account_item_id'][i],
+            'amount': cols['amount_jpy'][i],
+            'description': cols['description'][i] or '',
+        })
+
+    if OPENING_BALANCE_YEAR in by_year:
+        opening = fetch_opening_balance(OPENING_BALANCE_YEAR)
+        if opening:
+            for d in opening['details']:
+                d['account_item_id'] = account_map.get(d['account_name'])
+                if d['account_item_id'] is None:
+                    report['unmapped'].append({'account_name': d['account_name'], 'rows': 1,
+                                               'amount': d['amount'], 'fiscal_years': [OPENING_BALANCE_YEAR]})
+            by_year[OPENING_BALANCE_YEAR]['opening_balance'] = opening
+
+    for fy, txns in by_year.items():
+        print(f"  FY{fy} トランザクション数: {len(txns)}")
+
+    print_report(report)
+    if report['unmapped']:
+        sys.exit(1)
+
+    return {fy: list(txns.values()) for fy, txns in by_year.items()}
+
+
+def list_freee_ids(client, cid, resource, fiscal_year):
+    """freee の FY の振替伝票（manual_journals）/ 取引（deals）を全件取得"""
+    start = f"{fiscal_year}-01-01"
+    end = f"{fiscal_year}-12-31"
+    items = []
+    offset = 0
+    while True:
+        url = f"{FREEE_API_BASE}/{resource}?company_id={cid}&start_issue_date={start}&end_issue_date={end}&limit=100&offset={offset}"
+        res = client.request('GET', url)
+        if res.status_code != 200:
+            print(f"    Error: {res.status_code} {res.text[:200]}")
+            sys.exit(1)
+        batch = res.json().get(resource, [])
+        if not batch:
+            break
+        items.extend(batch)
+        offset += len(batch)
+    return items
+
+
+def delete_all(client, cid, resource, ids, label, checkpoint=None):
+    """ids を並列削除して失敗件数を返す"""
+    def delete(item_id):
+        url = f"{FREEE_API_BASE}/{resource}/{item_id}?company_id={cid}"
+        res = client.request('DELETE', url)
+        if res.status_code not in (200, 204):
+            print(f"    ✗ ID:{item_id} 削除失敗: {res.status_code}")
+            return False
+        if checkpoint is not None:
+            checkpoint.record('unmap', freee_id=item_id)
+        return True
+
+    results = client.map(delete, ids, label=f'{label}削除済み')
+    failed = results.count(False)
+    if ids:
+        print(f"  ✓ {label} {len(ids) - failed}件 削除完了" + (f"（失敗 {failed}件）" if failed else ""))
+    return failed
+
+
+def step2_clear_freee(client, cid, fiscal_year):
+    """freee の FY データを全削除して削除失敗件数を返す"""
+    print(f"\n=== Step 2: freee FY{fiscal_year} データ削除 ===")
+
+    print("  振替伝票を取得中...")
+    mj_ids = [mj['id'] for mj in list_freee_ids(client, cid, 'manual_journals', fiscal_year)]
+    print(f"  振替伝票: {len(mj_ids)}件")
+    failed = delete_all(client, cid, 'manual_journals', mj_ids, '振替伝票')
+
+    print("  取引を取得中...")
+    deal_ids = [d['id'] for d in list_freee_ids(client, cid, 'deals', fiscal_year)]
+    print(f"  取引: {len(deal_ids)}件")
+    return failed + delete_all(client, cid, 'deals', deal_ids, '取引')
+
+
+def step3_import(client, cid, txns, checkpoint):
+    """BQ トランザクションを freee 振替伝票として並列登録（チェックポイント済みはスキップ）"""
+    done = [t for t in txns if t['source_key'] in checkpoint.state]
+    txns = [t for t in txns if t['source_key'] not in checkpoint.state]
+    print(f"\n=== Step 3: freee 振替伝票登録 ({len(txns)}件) ===")
+    if done:
+        print(f"  チェックポイントから再開: 登録済み {len(done)}件をスキップ")
+    lock = threading.Lock()
+    counts = {'success': 0, 'errors': 0}
+    abort = threading.Event()
+
+    def post(txn):
+        if abort.is_set():
+            return
+        payload = build_payload(cid, txn)
+        url = f"{FREEE_API_BASE}/manual_journals"
+        res = client.request('POST', url, json_data=payload)
+        if res.status_code in (200, 201):
+            checkpoint.record('map', source_key=txn['source_key'],
+                              freee_id=res.json()['manual_journal']['id'],
+                              fingerprint=fingerprint(payload['issue_date'], payload['details']))
+        with lock:
+            if res.status_code in (200, 201):
+                counts['success'] += 1
+                return
+            counts['errors'] += 1
+            print(f"  ✗ [{txn['source_key']}] {txn['journal_date']}: {res.status_code}")
+            print(f"    {res.text[:300]}")
+            if counts['errors'] >= 5 and not abort.is_set():
+                print("  エラーが多すぎるため中断（再実行すると登録済みの続きから再開）")
+                abort.set()
+
+    client.map(post, txns, label='登録済み')
+
+    success, errors = counts['success'], counts['errors']
+    print(f"\n  完了: 成功 {success} / 失敗 {errors} / 合計 {len(txns)}")
+    return success, errors
+
+
+def fetch_freee_journals(client, cid, fiscal_year):
+    """freee の FY 振替伝票を取得 → {freee_id: fingerprint}"""
+    return {
+        mj['id']: fingerprint(mj['issue_date'], mj.get('details', []))
+        for mj in list_freee_ids(client, cid, 'manual_journals', fiscal_year)
+    }
+
+
+def plan_sync(txns, state, freee_journals, cid):
+    """BQ・同期状態・freee を突合して create/update/delete の計画を作る
+
+    - 状態ファイルに freee_id があり freee 側にも存在 → 内容が違えば update
+    - 状態ファイルにない（初回・状態ファイル消失）→ freee 側の同一内容の伝票を引き継ぐ
+    - どちらにもない → create
+    - どの BQ トランザクションにも対応しない freee 伝票 → delete
+    """
+    creates, updates, unchanged = [], [], []
+    claimed = {}  # freee_id → source_key
+
+    # freee 側の fingerprint → 未割当の freee_id 一覧（状態ファイルなしでの引き継ぎ用）
+    by_fp = {}
+    known_ids = {v['freee_id'] for v in state.values()}
+    for freee_id, fp in freee_journals.items():
+        if freee_id not in known_ids:
+            by_fp.setdefault(fp, []).append(freee_id)
+
+    for txn in txns:
+        payload = build_payload(cid, txn)
+        fp = fingerprint(payload['issue_date'], payload['details'])
+        txn['fingerprint'] = fp
+        entry = state.get(txn['source_key'])
+        freee_id = entry['freee_id'] if entry else None
+
+        if freee_id in freee_journals and freee_id not in claimed:
+            claimed[freee_id] = txn['source_key']
+            if freee_journals[freee_id] == fp:
+                unchanged.append((txn, freee_id))
+            else:
+                updates.append((txn, freee_id))
+            continue
+
+        candidates = by_fp.get(fp)
+        if candidates:
+            adopted = candidates.pop()
+            claimed[adopted] = txn['source_key']
+            unchanged.append((txn, adopted))
+        else:
+            creates.append(txn)
+
+    deletes = [freee_id for freee_id in freee_journals if freee_id not in claimed]
+    return creates, updates, deletes, unchanged
+
+
+def step3_sync_diff(client, cid, txns, fiscal_year, checkpoint):
+    """差分同期: 変更のあった振替伝票だけを create/update/delete"""
+    print(f"\n=== Step 2: freee FY{fiscal_year} 振替伝票と突合 ===")
+    freee_journals = fetch_freee_journals(client, cid, fiscal_year)
+    creates, updates, deletes, unchanged = plan_sync(txns, checkpoint.state, freee_journals, cid)
+    print(f"  freee 既存: {len(freee_journals)}件 / チェックポイント: {len(checkpoint.state)}件")
+    print(f"  変更なし: {len(unchanged)} / 新規: {len(creates)} / 更新: {len(updates)} / 削除: {len(deletes)}")
+
+    for txn, freee_id in unchanged:
+        if checkpoint.state.get(txn['source_key']) != {'freee_id': freee_id, 'fingerprint': txn['fingerprint']}:
+            checkpoint.record('map', source_key=txn['source_key'], freee_id=freee_id,
+                              fingerprint=txn['fingerprint'])
+
+    print(f"\n=== Step 3: 差分反映 ===")
+    lock = threading.Lock()
+    errors = delete_all(client, cid, 'manual_journals', deletes, '振替伝票', checkpoint)
+
+    def update(item):
+        txn, freee_id = item
+        url = f"{FREEE_API_BASE}/manual_journals/{freee_id}"
+        res = client.request('PUT', url, json_data=build_payload(cid, txn))
+        if res.status_code == 200:
+            checkpoint.record('map', source_key=txn['source_key'], freee_id=freee_id,
+                              fingerprint=txn['fingerprint'])
+            return True
+        with lock:
+            print(f"  ✗ [{txn['source_key']}] ID:{freee_id} 更新失敗: {res.status_code} {res.text[:200]}")
+        return False
+
+    def create(txn):
+        url = f"{FREEE_API_BASE}/manual_journals"
+        res = client.request('POST', url, json_data=build_payload(cid, txn))
+        if res.status_code in (200, 201):
+            checkpoint.record('map', source_key=txn['source_key'],
+                              freee_id=res.json()['manual_journal']['id'], fingerprint=txn['fingerprint'])
+            return True
+        with lock:
+            print(f"  ✗ [{txn['source_key']}] {txn['journal_date']}: {res.status_code} {res.text[:200]}")
+        return False
+
+    errors += client.map(update, updates, label='更新済み').count(False)
+    errors += client.map(create, creates, label='登録済み').count(False)
+
+    # BQ から消えた source_key をジャーナルから落とす
+    live_keys = {t['source_key'] for t in txns}
+    for key in [k for k in checkpoint.state if k not in live_keys]:
+        del checkpoint.state[key]
+
+    print(f"\n  完了: 新規 {len(creates)} / 更新 {len(updates)} / 削除 {len(deletes)} / 失敗 {errors}")
+    return errors
+
+
+def sync_year(client, cid, fiscal_year, txns, full):
+    """1年度分の同期（差分 or 全件再登録）。失敗件数を返す。
+    途中で例外（POST の通信エラー・リトライ上限後の PUT/DELETE 通信エラーなど）が起きたら
+    その年度だけ中断して例外を返す（他の年度の同期は続ける。チェックポイントは閉じる）"""
+    path = checkpoint_path(fiscal_year)
+    checkpoint = SyncCheckpoint(path)
+    try:
+        if full:
+            if checkpoint.full_run is None:
+                checkpoint.record('full_begin')
+            else:
+                print(f"  FY{fiscal_year}: 前回の --full 実行が未完了 → チェックポイントから再開")
+
+            # Step 2: freee 既存データ削除（前回実行で削除済みならスキップ）
+            # 削除に失敗した伝票が残ったまま登録すると二重計上になるので、全件削除できたときだけ
+            # cleared を記録して Step 3 に進む（失敗したら中断し、次回の実行で Step 2 からやり直す）
+            errors = 0
+            if not checkpoint.full_run['cleared']:
+                errors = step2_clear_freee(client, cid, fiscal_year)
+                if errors:
+                    print(f"  ✗ FY{fiscal_year}: 削除失敗 {errors}件 → 登録せず中断（再実行で削除からやり直し）")
+                else:
+                    checkpoint.record('cleared')
+
+            # Step 3: インポート
+            if errors == 0:
+                success, errors = step3_import(client, cid, txns, checkpoint)
+                if errors == 0:
+                    checkpoint.record('full_done')
+        else:
+            errors = step3_sync_diff(client, cid, txns, fiscal_year, checkpoint)
+
+        if errors == 0:
+            checkpoint.compact()
+    except Exception as e:
+        print(f"  ✗ FY{fiscal_year}: 中断 ({type(e).__name__}: {e})")
+        errors = e
+    finally:
+        checkpoint.close()
+    print(f"  FY{fiscal_year} チェックポイント: {path} ({len(checkpoint.state)}件)")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BQ journal_entries → freee 振替伝票 同期')
+    parser.add_argument('years', nargs='+', help='会計年度（例: 2025 / 2023-2025 / 2024 2025）')
+    parser.add_argument('--full', action='store_true', help='freee の該当年度を全削除してから全件登録')
+    parser.add_argument('--yes', '-y', action='store_true', help='確認プロンプトを省略')
+    args = parser.parse_args()
+    fiscal_years = parse_years(args.years)
+
+    # Step 1: BQ データ取得（全年度1クエリ）
+    txns_by_year = step1_fetch_bq(fiscal_years)
+
+    # 確認
+    print(f"\n{'='*50}")
+    for fy in fiscal_years:
+        print(f"FY{fy}: {len(txns_by_year[fy])}件の振替伝票を freee に同期します")
+    if args.full:
+        print(f"  - freee の既存データを全削除")
+        print(f"  - BQ のデータを振替伝票として新規登録")
+    else:
+        print(f"  - 差分同期: 変更のあった振替伝票のみ 新規/更新/削除")
+    if not args.yes:
+        confirm = input("実行しますか？ (y/n): ").strip().lower()
+        if confirm != 'y':
+            print("キャンセル")
+            return
+
+    # freee認証
+    token = get_access_token()
+    cid = get_company_id(token)
+    print(f"Company: {cid}")
+    client = FreeeClient(get_headers(token), concurrency=FREEE_CONCURRENCY)
+
+    # 年度を並列同期（API 呼び出しは client のレート制限・同時実行数を共有）
+    with ThreadPoolExecutor(max_workers=len(fiscal_years)) as pool:
+        errors = dict(zip(fiscal_years, pool.map(
+            lambda fy: sync_year(client, cid, fy, txns_by_year[fy], args.full), fiscal_years)))
+
+    print(f"\n=== 同期結果 ===")
+    for fy in fiscal_years:
+        if isinstance(errors[fy], Exception):
+            status = f'✗ 中断 {type(errors[fy]).__name__}（再実行で続きから再開）'
+        else:
+            status = '✓' if errors[fy] == 0 else f'✗ 失敗 {errors[fy]}件（再実行で続きから再開）'
+        print(f"  FY{fy}: {status}")
+    client.print_stats()
+    print("\n=== 同期完了 ===")
+    if any(errors.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+BQ accounting.journal_entries_mat（journal_entries VIEW の実体化テーブル）更新スクリプト
+
+テーブル構成:
+  - PARTITION BY DATE_TRUNC(journal_date, MONTH)（月単位パーティション）
+  - CLUSTER BY account_name, source_table
+  - 列は journal_entries VIEW と同一
+
+差分更新（デフォルト）:
+  1. 前回更新時刻（journal_entries_mat_refresh_log）以降に更新された参照テーブルを __TABLES__ で検出
+  2. 参照テーブルが更新された source_table の SQL だけを生成（journal_sources.py）して再計算し、MERGE で差し替え
+     （VIEW / 外部テーブル経由のソース = amazon_settlement・棚卸仕訳 は毎回再計算）
+棚卸仕訳の VIEW は標準原価を analytics.dim_standard_cost から引くため、更新の前に dim が
+standard_cost_history・product_master より古くないか確認し、古ければ作り直す（ensure_dim_standard_cost）
+全件再構築（--full）: VIEW 定義の変更後やテーブル未作成時。CREATE OR REPLACE TABLE で作り直す
+
+集計・監査クエリは journal_entries_mat を参照し、journal_date で絞り込むとパーティションが効く:
+  WHERE journal_date BETWEEN '2025-01-01' AND '2025-12-31'
+
+実行: uv run --with google-cloud-bigquery python scripts/journal_entries_mat.py [--full]
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+from datetime import datetime, timezone
+from pathlib import Path
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+from bq_client import get_client
+from journal_sources import SOURCES, source_dependencies, build_merge_sql
+
+BQ_PROJECT = "main-project-477501"
+VIEW_ID = f"{BQ_PROJECT}.accounting.journal_entries"
+MAT_ID = f"{BQ_PROJECT}.accounting.journal_entries_mat"
+LOG_ID = f"{BQ_PROJECT}.accounting.journal_entries_mat_refresh_log"
+DIM_STANDARD_COST_ID = f"{BQ_PROJECT}.analytics.dim_standard_cost"
+DIM_STANDARD_COST_INPUTS = ['nocodb.standard_cost_history', 'nocodb.product_master']
+DIM_STANDARD_COST_SQL = Path(__file__).resolve().parent.parent / 'scheduled_queries' / 'dim_standard_cost.sql'
+
+# source_table → 参照する実テーブル（dataset.table）。journal_sources.py のレジストリから生成
+# ここにない source_table（amazon_settlement・棚卸仕訳など VIEW / 外部テーブル経由）は毎回再計算する
+SOURCE_DEPENDENCIES = source_dependencies()
+ALWAYS_REFRESH = [src['name'] for src in SOURCES if src['name'] not in SOURCE_DEPENDENCIES]
+
+FULL_REBUILD_SQL = f"""
+CREATE OR REPLACE TABLE `{MAT_ID}`
+PARTITION BY DATE_TRUNC(journal_date, MONTH)
+CLUSTER BY account_name, source_table
+AS SELECT * FROM `{VIEW_ID}`
+"""
+
+
+def ensure_log_table(client):
+    client.query(f"""
+    CREATE TABLE IF NOT EXISTS `{LOG_ID}` (
+      refreshed_at TIMESTAMP,
+      mode STRING,
+      refreshed_sources ARRAY<STRING>,
+      affected_rows INT64
+    )
+    """).result()
+
+
+def table_exists(client, table_id):
+    try:
+        client.get_table(table_id)
+        return True
+    except NotFound:
+        return False
+
+
+def ensure_dim_standard_cost(client):
+    """棚卸仕訳 VIEW が参照する dim_standard_cost を標準原価の最新に揃える（作り直したら True）
+
+    NocoDB で原価を直した後、01:30 のスケジュールや DAG を待たずに会計へ反映するため
+    """
+    try:
+        built = client.get_table(DIM_STANDARD_COST_ID).modified
+    except NotFound:
+        built = None
+    latest = max(client.get_table(f"{BQ_PROJECT}.{t}").modified for t in DIM_STANDARD_COST_INPUTS)
+    if built is not None and built >= latest:
+        return False
+    print('  dim_standard_cost: 標準原価の更新を反映して作り直し')
+    client.query(DIM_STANDARD_COST_SQL.read_text(encoding='utf-8')).result()
+    return True
+
+
+def last_refreshed_at(client):
+    rows = list(client.query(f"SELECT MAX(refreshed_at) AS t FROM `{LOG_ID}`").result())
+    return rows[0].t if rows else None
+
+
+def modified_tables(client, since):
+    """since 以降に更新された実テーブル（dataset.table）の集合"""
+    datasets = sorted({t.split('.')[0] for deps in SOURCE_DEPENDENCIES.values() for t in deps})
+    union = "\nUNION ALL\n".join(
+        f"SELECT '{ds}' AS dataset_id, table_id, last_modified_time FROM `{BQ_PROJECT}.{ds}.__TABLES__`"
+        for ds in datasets
+    )
+    since_ms = int(since.timestamp() * 1000)
+    query = f"SELECT dataset_id, table_id FROM ({union}) WHERE last_modified_time >= {since_ms}"
+    return {f"{r.dataset_id}.{r.table_id}" for r in client.query(query).result()}
+
+
+def write_log(client, started_at, mode, sources, affected_rows):
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter('refreshed_at', 'TIMESTAMP', started_at),
+        bigquery.ScalarQueryParameter('mode', 'STRING', mode),
+        bigquery.ArrayQueryParameter('sources', 'STRING', sources),
+        bigquery.ScalarQueryParameter('affected_rows', 'INT64', affected_rows),
+    ])
+    client.query(
+        f"INSERT INTO `{LOG_ID}` VALUES (@refreshed_at, @mode, @sources, @affected_rows)",
+        job_config=job_config,
+    ).result()
+
+
+def refresh(client, full=False):
+    """journal_entries_mat を更新する（full=True で全件再構築）"""
+    # 更新開始時刻を記録（実行中にソースが更新されても次回拾えるように）
+    started_at = datetime.now(timezone.utc)
+    ensure_log_table(client)
+    ensure_dim_standard_cost(client)
+    since = None if full else last_refreshed_at(client)
+
+    if full or since is None or not table_exists(client, MAT_ID):
+        print('  journal_entries_mat: 全件再構築')
+        job = client.query(FULL_REBUILD_SQL)
+        job.result()
+        print(f'    処理: {(job.total_bytes_processed or 0) / 1024**2:,.1f} MB')
+        write_log(client, started_at, 'full', [], client.get_table(MAT_ID).num_rows)
+        return
+
+    changed = modified_tables(client, since)
+    refresh_sources = sorted(src for src, deps in SOURCE_DEPENDENCIES.items() if changed & set(deps))
+    print(f'  前回更新: {since:%Y-%m-%d %H:%M:%S} UTC')
+    print(f'  更新テーブル: {sorted(changed) or "なし"}')
+    print(f'  再計算: {refresh_sources} + 毎回: {ALWAYS_REFRESH}')
+
+    job = client.query(build_merge_sql(MAT_ID, refresh_sources + ALWAYS_REFRESH))
+    job.result()
+    affected = job.num_dml_affected_rows or 0
+    print(f'    MERGE: {affected:,} 行  処理: {(job.total_bytes_processed or 0) / 1024**2:,.1f} MB')
+    write_log(client, started_at, 'incremental', refresh_sources, affected)
+
+
+def main():
+    client = get_client()
+    full = '--full' in sys.argv[1:]
+    print('=== journal_entries_mat 更新 ===')
+    refresh(client, full=full)
+
+    # VIEW と件数・貸借合計が一致するか確認
+    print()
+    print('=== VIEW との整合性チェック ===')
+    q = """
+    SELECT fiscal_year, COUNT(*) AS cnt,
+      SUM(CASE WHEN entry_side = 'debit' THEN amount_jpy ELSE -amount_jpy END) AS balance
+    FROM `{table}`
+    GROUP BY fiscal_year
+    """
+    view = {r.fiscal_year: (r.cnt, r.balance) for r in client.query(q.format(table=VIEW_ID)).result()}
+    mat = {r.fiscal_year: (r.cnt, r.balance) for r in client.query(q.format(table=MAT_ID)).result()}
+    ok = True
+    for fy in sorted(set(view) | set(mat), key=lambda y: (y is None, y)):
+        if view.get(fy) != mat.get(fy):
+            ok = False
+            print(f'  FY{fy}: VIEW={view.get(fy)} MAT={mat.get(fy)}  ✗ 不一致')
+    if ok:
+        print('  全年度 件数・残高一致 ✓')
+
+
+if __name__ == '__main__':
+    main()
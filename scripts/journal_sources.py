@@ -0,0 +1,314 @@
+"""
+accounting.journal_entries のソース定義（レジストリ）と SQL 生成
+
+ソースの追加・振替例外の変更は SOURCES / TRANSFER_EXCEPTIONS を編集するだけでよい。
+ここから以下を生成する:
+  - build_view_sql()        journal_entries VIEW 定義（各ソース1スキャン + CROSS JOIN UNNEST で2行展開）
+  - build_merge_sql(names)  journal_entries_mat の差分更新 MERGE（指定ソースだけをスキャン）
+  - source_dependencies()   source_table → 参照する実テーブル（差分更新の変更検知用）
+  - estimate_cost(client)   ソース別の dry-run スキャン量
+
+ソース定義のキー:
+  name           source_table 列の値
+  comment        SQL コメント
+  table / alias  スキャンするテーブル（dataset.table）
+  joins          追加 JOIN（LEFT JOIN / CROSS JOIN UNNEST 句をそのまま）
+  depends_on     joins で参照する実テーブル（差分更新の変更検知用）
+  source_id      source_id 列の式
+  date           仕訳日の元列 / date_type: 'STRING'（'%Y-%m-%d'）or 'TIMESTAMP'
+  amount         符号付き金額の式（legs の借貸判定に使う）
+  amount_jpy     amount_jpy 列の式（省略時 ABS(amount)）
+  debit_when     1本目の leg が借方になる条件（2本目は逆側）。'TRUE' なら常に 借方/貸方 の順
+  legs           [1本目の勘定科目式, 2本目の勘定科目式]
+  description    摘要の式
+  where          抽出条件
+  transfer       振替_id 列（TRANSFER_EXCEPTIONS の例外科目以外の振替行を除外）
+  always_refresh VIEW・外部テーブル経由で変更検知できない → 差分更新で毎回再計算
+  passthrough    既存 VIEW の行をそのまま UNION する（棚卸仕訳）
+"""
+BQ_PROJECT = "main-project-477501"
+
+# 振替行のうち、相手勘定がこの科目（account_items.nocodb_id）なら仕訳に含める
+# （振替の片側だけで計上するため。詳細は system_design.md §6.1「振替フィルタの詳細設計」）
+TRANSFER_EXCEPTIONS = {
+    'paypay_bank': (5, 6),                   # ESPRIME, 楽天銀行
+    'rakuten_bank': (3, 5, 6, 7, 8, 70),     # THE直行便, ESPRIME, 楽天銀行, YP, PayPay銀行, 未払金
+}
+
+# Amazon 精算の列 → (相手勘定, 摘要ラベル)
+AMAZON_SETTLEMENT_COLUMNS = [
+    ('sales_product',        '売上高',     '商品売上'),
+    ('sales_shipping',       '売上高',     '受取配送料'),
+    ('sales_refunds',        '売上戻り高', '返品'),
+    ('sales_promotions',     '売上値引高', 'プロモーション'),
+    ('income_reimbursement', '雑収入',     '補償'),
+    ('expense_commission',   '販売手数料', '販売手数料'),
+    ('expense_fba_shipping', '荷造運賃',   'FBA配送費'),
+    ('expense_points',       '売上値引高', 'Amazonポイント'),
+    ('expense_advertising',  '広告宣伝費', '広告費'),
+    ('expense_storage',      '地代家賃',   '保管費'),
+    ('expense_subscription', '諸会費',     '月額料'),
+    ('expense_other',        '雑費',       'その他'),
+    ('reserve_withheld',     '仮払金',     '引当金'),
+    ('reserve_released',     '仮払金',     '引当金解放'),
+]
+
+
+def _amazon_unnest():
+    rows = []
+    for i, (col, counterpart, label) in enumerate(AMAZON_SETTLEMENT_COLUMNS):
+        if i == 0:
+            rows.append(f"STRUCT('{col}' AS col, CAST({col} AS INT64) AS amount, "
+                        f"'{counterpart}' AS counterpart, '{label}' AS label)")
+        else:
+            rows.append(f"STRUCT('{col}', CAST({col} AS INT64), '{counterpart}', '{label}')")
+    return "CROSS JOIN UNNEST([\n    " + ",\n    ".join(rows) + "\n  ]) t"
+
+
+def _account_join(alias, key_expr):
+    return f"LEFT JOIN `{BQ_PROJECT}.nocodb.account_items` {alias} ON {key_expr} = {alias}.nocodb_id"
+
+
+NTT_RULE_JOIN = (
+    f"LEFT JOIN `{BQ_PROJECT}.accounting.merchant_account_rules` ntr\n"
+    "  ON ntr.source_table = 'ntt_finance' AND ntr.match_type = 'EXACT' AND n.merchant_name = ntr.match_value"
+)
+
+SOURCES = [
+    {
+        'name': 'amazon_settlement',
+        'comment': '① Amazon（Amazon出品アカウント側 Dr/Cr + 相手勘定側 Cr/Dr）',
+        'table': 'accounting.settlement_journal_view', 'alias': 's',
+        'joins': [_amazon_unnest()],
+        'source_id': "CONCAT('amazon_', CAST(s.settlement_id AS STRING), '_', t.col)",
+        'date': 's.booking_date', 'date_type': 'TIMESTAMP',
+        'amount': 't.amount',
+        'debit_when': 't.amount >= 0',
+        'legs': ["'Amazon出品アカウント'", 't.counterpart'],
+        'description': "CONCAT('settlement ', CAST(s.settlement_id AS STRING), ': ', t.label)",
+        'where': 't.amount != 0 AND s.booking_date IS NOT NULL',
+        'always_refresh': True,
+    },
+    {
+        'name': 'paypay_bank',
+        'comment': '② PayPay 銀行（銀行側: 通常取引 + Amazon→PayPay入金 + PayPay→ESPRIME送金 / 相手勘定側）',
+        'table': 'nocodb.paypay_bank_statements', 'alias': 'p',
+        'joins': [_account_join('ai', 'p.`freee勘定科目_id`')],
+        'depends_on': ['nocodb.account_items'],
+        'source_id': 'CAST(p.nocodb_id AS STRING)',
+        'date': 'p.transaction_date', 'date_type': 'STRING',
+        'amount': 'p.amount',
+        'debit_when': 'p.amount >= 0',
+        'legs': ["'PayPay銀行'", 'ai.account_name'],
+        'description': 'p.description',
+        'where': 'p.amount IS NOT NULL AND p.`freee勘定科目_id` IS NOT NULL',
+        'transfer': 'p.`振替_id`',
+    },
+    {
+        'name': 'rakuten_bank',
+        'comment': '③ 楽天銀行（銀行側: 通常取引 + 保有口座への送金 + 未払金支払 + Amazon入金 / 相手勘定側）',
+        'table': 'nocodb.rakuten_bank_statements', 'alias': 'r',
+        'joins': [_account_join('ai', 'r.`freee勘定科目_id`')],
+        'depends_on': ['nocodb.account_items'],
+        'source_id': 'CAST(r.nocodb_id AS STRING)',
+        'date': 'r.transaction_date', 'date_type': 'STRING',
+        'amount': 'r.amount_jpy',
+        'debit_when': 'r.amount_jpy >= 0',
+        'legs': ["'楽天銀行'", 'ai.account_name'],
+        'description': 'r.counterparty_description',
+        'where': 'r.amount_jpy IS NOT NULL AND r.`freee勘定科目_id` IS NOT NULL',
+        'transfer': 'r.`振替_id`',
+    },
+    {
+        # NOTE: NTT の振替_id は月次支払バッチへのリンク（経費→支払の紐付け）であり、
+        # 振替フラグではない。そのため transfer ではなく is_transfer フィルタを使う。
+        'name': 'ntt_finance',
+        'comment': '④ NTT Finance（経費側: merchant_account_rules で勘定科目上書き / カード負債側: 未払金）',
+        'table': 'nocodb.ntt_finance_statements', 'alias': 'n',
+        'joins': [_account_join('ai', 'n.`freee勘定科目_id`'), NTT_RULE_JOIN],
+        'depends_on': ['nocodb.account_items', 'accounting.merchant_account_rules'],
+        'source_id': 'CAST(n.nocodb_id AS STRING)',
+        'date': 'n.usage_date', 'date_type': 'STRING',
+        'amount': 'n.usage_amount',
+        'amount_jpy': 'ABS(CAST(n.usage_amount AS INT64))',
+        'debit_when': 'n.usage_amount < 0',
+        'legs': ['COALESCE(ntr.account_name, ai.account_name)', "'未払金'"],
+        'description': (
+            "CASE WHEN ntr.memo IS NOT NULL\n"
+            "    THEN CONCAT(COALESCE(n.merchant_name, n.description, ''), ' [', ntr.memo, ']')\n"
+            "    ELSE COALESCE(n.merchant_name, n.description) END"
+        ),
+        'where': ('(n.is_transfer IS FALSE OR n.is_transfer IS NULL)\n'
+                  '  AND n.usage_amount IS NOT NULL\n'
+                  '  AND (n.`freee勘定科目_id` IS NOT NULL OR ntr.account_name IS NOT NULL)'),
+    },
+    {
+        'name': 'agency_transactions',
+        'comment': '⑤ 代行会社（経費側 / 口座側: payment_account がそのまま勘定科目名）',
+        'table': 'nocodb.agency_transactions', 'alias': 'a',
+        'joins': [_account_join('ai', 'CAST(a.`freee勘定科目_id` AS INT64)')],
+        'depends_on': ['nocodb.account_items'],
+        'source_id': 'CAST(a.nocodb_id AS STRING)',
+        'date': 'a.transaction_date', 'date_type': 'STRING',
+        'amount': 'a.amount_foreign',
+        'amount_jpy': 'CAST(ABS(ROUND(a.amount_foreign * COALESCE(a.exchange_rate, 1))) AS INT64)',
+        'debit_when': 'a.amount_foreign < 0',
+        'legs': ['ai.account_name', 'a.payment_account'],
+        'description': "TRIM(CONCAT(COALESCE(a.cost_category, ''), ' ', COALESCE(a.memo, '')))",
+        'where': 'a.`振替_id` IS NULL\n  AND a.amount_foreign IS NOT NULL AND a.`freee勘定科目_id` IS NOT NULL',
+    },
+    {
+        'name': 'sale_monster',
+        'comment': '⑥ セールモンスター（売上高側 / セールモンスター口座側）',
+        'table': 'nocodb.sale_monster_reports', 'alias': 'sm',
+        'joins': [],
+        'source_id': "CONCAT('sm_', CAST(sm.nocodb_id AS STRING))",
+        'date': 'sm.sale_date', 'date_type': 'STRING',
+        'amount': 'sm.total_amount_incl_tax',
+        'debit_when': "(sm.sale_category = '販売売上') IS NOT TRUE",
+        'legs': ["'売上高'", "'セールモンスター'"],
+        'description': "CONCAT(COALESCE(sm.marketplace, ''), ': ', SUBSTR(COALESCE(sm.detail_description, ''), 1, 60))",
+        'where': 'sm.total_amount_incl_tax IS NOT NULL AND sm.sale_date IS NOT NULL',
+    },
+    {
+        'name': 'manual_journal',
+        'comment': '⑦ 手動仕訳（借方側 / 貸方側）- 事業主借も含む',
+        'table': 'nocodb.manual_journal_entries', 'alias': 'm',
+        'joins': [_account_join('ai_dr', 'm.debit_account_id'), _account_join('ai_cr', 'm.credit_account_id')],
+        'depends_on': ['nocodb.account_items'],
+        'source_id': "CONCAT('manual_', CAST(m.nocodb_id AS STRING))",
+        'date': 'm.journal_date', 'date_type': 'STRING',
+        'amount': 'm.amount',
+        'amount_jpy': 'm.amount',
+        'debit_when': 'TRUE',
+        'legs': ['ai_dr.account_name', 'ai_cr.account_name'],
+        'description': 'm.description',
+        'where': 'm.journal_date IS NOT NULL AND m.amount IS NOT NULL',
+    },
+    {
+        'name': 'inventory',
+        'comment': '⑧ 棚卸仕訳',
+        'table': 'accounting.inventory_journal_view',
+        'passthrough': True,
+        'always_refresh': True,
+    },
+]
+
+COLUMNS = ['source_id', 'journal_date', 'fiscal_year', 'entry_side', 'account_name',
+           'amount_jpy', 'tax_code', 'description', 'source_table']
+
+
+def get_source(name):
+    for src in SOURCES:
+        if src['name'] == name:
+            return src
+    raise KeyError(name)
+
+
+def _date_expr(src):
+    if src['date_type'] == 'STRING':
+        return f"SAFE.PARSE_DATE('%Y-%m-%d', {src['date']})"
+    return f"DATE({src['date']})"
+
+
+def _transfer_filter(src):
+    exceptions = TRANSFER_EXCEPTIONS.get(src['name'], ())
+    if not exceptions:
+        return f"{src['transfer']} IS NULL"
+    ids = ', '.join(str(i) for i in exceptions)
+    return f"({src['transfer']} IS NULL OR ai.nocodb_id IN ({ids}))"
+
+
+def compile_source(src):
+    """1ソース → SELECT 文（全列に別名を付けるので単体でも UNION の一部でも使える）"""
+    table = f"`{BQ_PROJECT}.{src['table']}`"
+    if src.get('passthrough'):
+        return f"-- {src['comment']}\nSELECT\n  {', '.join(COLUMNS)}\nFROM {table}"
+
+    alias = src['alias']
+    date = _date_expr(src)
+    amount_jpy = src.get('amount_jpy', f"ABS({src['amount']})")
+    first, second = src['legs']
+    if src['debit_when'] == 'TRUE':
+        first_side, second_side = "'debit'", "'credit'"
+    else:
+        first_side = f"IF({src['debit_when']}, 'debit', 'credit')"
+        second_side = f"IF({src['debit_when']}, 'credit', 'debit')"
+    where = src['where']
+    if src.get('transfer'):
+        where += f"\n  AND {_transfer_filter(src)}"
+    joins = '\n'.join(src['joins'])
+    return f"""-- {src['comment']}
+SELECT
+  {src['source_id']} AS source_id,
+  {date} AS journal_date,
+  EXTRACT(YEAR FROM {date}) AS fiscal_year,
+  leg.entry_side,
+  leg.account_name,
+  {amount_jpy} AS amount_jpy,
+  CAST(NULL AS INT64) AS tax_code,
+  {src['description']} AS description,
+  '{src['name']}' AS source_table
+FROM {table} {alias}
+{joins + chr(10) if joins else ''}CROSS JOIN UNNEST([
+  STRUCT({first_side} AS entry_side, {first} AS account_name),
+  STRUCT({second_side}, {second})
+]) leg
+WHERE {where}"""
+
+
+def build_view_sql(names=None):
+    """journal_entries VIEW の SELECT（names 指定時はそのソースだけ）"""
+    sources = SOURCES if names is None else [get_source(n) for n in names]
+    header = "-- 各ソースは1回だけスキャンし、CROSS JOIN UNNEST で借方・貸方の2行（leg）に展開する\n"
+    return header + "\n\nUNION ALL\n\n".join(compile_source(src) for src in sources) + "\n"
+
+
+def source_dependencies():
+    """差分更新で変更検知できるソース → 参照する実テーブル（dataset.table）"""
+    return {
+        src['name']: [src['table']] + src.get('depends_on', [])
+        for src in SOURCES if not src.get('always_refresh')
+    }
+
+
+def build_merge_sql(mat_id, names):
+    """指定ソースの行だけを再計算して mat_id に MERGE（ON FALSE で丸ごと差し替え）
+
+    passthrough ソース（棚卸仕訳）は source_table の値を VIEW 側で決めるため、
+    レジストリ上の他ソース名以外の行を対象にする。
+    """
+    sources = [get_source(n) for n in names]
+    own = [s['name'] for s in sources if not s.get('passthrough')]
+    conditions = []
+    if own:
+        conditions.append("T.source_table IN (" + ', '.join(f"'{n}'" for n in own) + ")")
+    if any(s.get('passthrough') for s in sources):
+        others = [s['name'] for s in SOURCES if not s.get('passthrough')]
+        conditions.append("T.source_table NOT IN (" + ', '.join(f"'{n}'" for n in others) + ")")
+    return f"""MERGE `{mat_id}` T
+USING (
+{build_view_sql(names)}
+) S
+ON FALSE
+WHEN NOT MATCHED THEN INSERT ROW
+WHEN NOT MATCHED BY SOURCE AND ({' OR '.join(conditions)}) THEN DELETE
+"""
+
+
+def estimate_cost(client, names=None):
+    """ソース別 dry-run スキャン量（bytes）→ {name: bytes}"""
+    from google.cloud import bigquery
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    sources = SOURCES if names is None else [get_source(n) for n in names]
+    return {
+        src['name']: client.query(compile_source(src), job_config=job_config).total_bytes_processed
+        for src in sources
+    }
+
+
+def print_cost(costs):
+    total = sum(costs.values())
+    for name, b in costs.items():
+        print(f'  {name:<22} {b / 1024**2:>10,.2f} MB')
+    print(f'  {"合計":<20} {total / 1024**2:>10,.2f} MB')
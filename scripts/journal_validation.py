@@ -0,0 +1,120 @@
+"""
+journal_entries の複式簿記検証（列指向 / pyarrow.compute）
+
+freee 同期の Step 1 で取得した Arrow テーブル（1行 = 1仕訳明細）に対して、Python のループを使わずに:
+  - source_key（source_table:source_id）単位の貸借バランス（借方合計 = 貸方合計）
+  - 勘定科目名 → freee account_item_id のマッピング有無
+を検証し、構造化したレポート（dict）を返す。年度をまたいだ全期間でも1秒未満で終わる。
+
+レポート:
+  {'rows': 行数, 'transactions': 伝票数,
+   'unbalanced': [{'fiscal_year', 'source_key', 'debit', 'credit', 'diff'}, ...],
+   'unmapped':   [{'account_name', 'rows', 'amount', 'fiscal_years'}, ...]}
+
+単体実行（freee には接続しない）:
+  uv run --with google-cloud-bigquery --with pyarrow python scripts/journal_validation.py [2023 2024 ...]
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import pyarrow as pa
+import pyarrow.compute as pc
+
+BQ_PROJECT = "main-project-477501"
+
+JOURNAL_COLUMNS_SQL = f"""
+SELECT fiscal_year, source_table, source_id,
+       FORMAT_DATE('%Y-%m-%d', journal_date) as journal_date,
+       entry_side, account_name, amount_jpy, description
+FROM `{BQ_PROJECT}.accounting.journal_entries`
+"""
+
+
+def with_source_key(table):
+    """source_key 列（source_table:source_id）を追加"""
+    key = pc.binary_join_element_wise(
+        pc.cast(table['source_table'], pa.string()), pc.cast(table['source_id'], pa.string()), ':')
+    return table.append_column('source_key', key)
+
+
+def attach_account_ids(table, account_map):
+    """account_item_id 列を追加（マッピングにない科目は null）"""
+    names = pa.array(list(account_map), pa.string())
+    ids = pa.array(list(account_map.values()), pa.int64())
+    idx = pc.index_in(table['account_name'], value_set=names)
+    return table.append_column('account_item_id', pc.take(ids, idx))
+
+
+def unbalanced_transactions(table):
+    is_debit = pc.equal(table['entry_side'], 'debit')
+    amount = pc.cast(table['amount_jpy'], pa.int64())
+    zero = pa.scalar(0, pa.int64())
+    sides = pa.table({
+        'fiscal_year': table['fiscal_year'],
+        'source_key': table['source_key'],
+        'debit': pc.if_else(is_debit, amount, zero),
+        'credit': pc.if_else(is_debit, zero, amount),
+    })
+    totals = sides.group_by(['fiscal_year', 'source_key']).aggregate([('debit', 'sum'), ('credit', 'sum')])
+    diff = pc.subtract(totals['debit_sum'], totals['credit_sum'])
+    bad = totals.append_column('diff', diff).filter(pc.not_equal(diff, 0))
+    bad = bad.sort_by([('fiscal_year', 'ascending'), ('source_key', 'ascending')])
+    return [{'fiscal_year': r['fiscal_year'], 'source_key': r['source_key'], 'debit': r['debit_sum'],
+             'credit': r['credit_sum'], 'diff': r['diff']} for r in bad.to_pylist()]
+
+
+def unmapped_accounts(table):
+    missing = table.filter(pc.is_null(table['account_item_id']))
+    if missing.num_rows == 0:
+        return []
+    missing = missing.append_column('account', pc.fill_null(missing['account_name'], '(NULL)'))
+    totals = missing.group_by('account').aggregate([
+        ('account', 'count'), ('amount_jpy', 'sum'), ('fiscal_year', 'distinct')])
+    return [{'account_name': r['account'], 'rows': r['account_count'], 'amount': r['amount_jpy_sum'],
+             'fiscal_years': sorted(r['fiscal_year_distinct'])} for r in totals.sort_by('account').to_pylist()]
+
+
+def validate(table, account_map):
+    """(source_key・account_item_id 列を追加したテーブル, レポート) を返す"""
+    table = attach_account_ids(with_source_key(table), account_map)
+    report = {
+        'rows': table.num_rows,
+        'transactions': len(pc.unique(table['source_key'])),
+        'unbalanced': unbalanced_transactions(table),
+        'unmapped': unmapped_accounts(table),
+    }
+    return table, report
+
+
+def print_report(report, max_shown=20):
+    print(f"  検証: {report['rows']:,}行 / {report['transactions']:,}伝票")
+    for m in report['unmapped']:
+        years = ', '.join(f'FY{y}' for y in m['fiscal_years'])
+        print(f"  ⚠ マッピング未定義: {m['account_name']}（{m['rows']}行 ¥{m['amount']:,} {years}）")
+    for u in report['unbalanced'][:max_shown]:
+        print(f"  ⚠ 貸借不一致: {u['source_key']} Dr={u['debit']:,} Cr={u['credit']:,}")
+    if len(report['unbalanced']) > max_shown:
+        print(f"  ...他 {len(report['unbalanced']) - max_shown}件の貸借不一致")
+    if not report['unmapped'] and not report['unbalanced']:
+        print('  貸借バランス・勘定科目マッピング OK')
+
+
+def main():
+    from google.cloud import bigquery
+    from bq_client import query, query_arrow
+    years = [int(y) for y in sys.argv[1:]]
+    sql = JOURNAL_COLUMNS_SQL
+    params = []
+    if years:
+        sql += "WHERE fiscal_year IN UNNEST(@fiscal_years)"
+        params = [bigquery.ArrayQueryParameter('fiscal_years', 'INT64', years)]
+    account_map = {r.account_name: int(r.account_item_id) for r in query(f"""
+        SELECT account_name, account_item_id FROM `{BQ_PROJECT}.accounting.freee_account_mapping`
+        WHERE account_item_id IS NOT NULL""")}
+    _, report = validate(query_arrow(sql, params=params, labels={'step': 'validate'}), account_map)
+    print_report(report)
+    if report['unmapped'] or report['unbalanced']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""
+NocoDB → BQ 差分同期（nocodb データセット）
+
+WRITE_TRUNCATE で全テーブルを毎回入れ替える代わりに、変更のあった行だけを BQ に反映する。
+
+変更検知: 行ハッシュインデックス（tmp/nocodb_bq_sync_index.json）
+  - テーブルごとに nocodb_id → 行ハッシュ（全列の正規化 JSON の sha256）を保持
+  - 新規・ハッシュが変わった行 = upsert、インデックスにあって今回ない行 = 削除
+  - updated_at ではなく行ハッシュを使うのは、tmp/ の修正スクリプトが noco.db を直接 UPDATE しており
+    updated_at が更新されない場合がある・NocoDB の削除は物理削除で updated_at に現れないため
+反映: 差分行をステージングテーブル（{dataset}._stg_{table}）にロード → MERGE（削除行は同じ MERGE で DELETE）
+全件入れ替え: インデックスに未登録のテーブル・列構成や型が変わったテーブル・full=True のとき
+ロード: 行を明示的な Arrow スキーマで Parquet に書き出し、1テーブル1回のロードジョブで投入（全件・ステージングとも）
+  - 型は PINNED_TYPES（リンク列）> 既存 BQ テーブルの型 > 値から推定 の優先順で決める
+  - freee勘定科目_id・振替_id は全行 NULL でも INTEGER で作られ、行から消えた場合はロードせずエラーにする
+    （journal_entries VIEW が参照するため。列が落ちると VIEW が壊れる）
+  - 整数だけで INTEGER になった列に小数の値が来たら FLOAT に広げる（型が変わるのでそのテーブルは全件入れ替え）。
+    INTEGER のまま小数を int() で切り捨てることはしない（PINNED_TYPES の列に小数が来たらエラー）
+並列: テーブル単位で並列実行（concurrency 本）。インデックスはテーブルの反映が成功するたびに保存する
+      （MERGE 後に中断しても、次回は同じ行を再 MERGE するだけで結果は変わらない）
+
+※ 現状の main.py はまだこれを呼ばず WRITE_TRUNCATE のまま（切り替え手順は system_design.md §10）
+使い方（nocodb-to-bq/main.py から。行の取得・列名変換は main.py 側のまま）:
+    sys.path.insert(0, '<このリポジトリ>/scripts')
+    from nocodb_incremental import sync_tables
+    sync_tables(client, {'main-project-477501.nocodb.rakuten_bank_statements': rows, ...})
+
+実行: uv run --with google-cloud-bigquery --with pyarrow python scripts/nocodb_incremental.py --status          インデックスの状態を表示
+      uv run ... python scripts/nocodb_incremental.py --reset [table...]  インデックスを削除（次回そのテーブルは全件入れ替え）
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import datetime
+import decimal
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BQ_PROJECT = "main-project-477501"
+KEY_COLUMN = 'nocodb_id'
+SYNC_CONCURRENCY = 4
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmp', 'nocodb_bq_sync_index.json')
+
+# 型を固定する列（journal_entries VIEW が参照するリンク列。値の推定や NULL だけの列に型を左右させない）
+PINNED_TYPES = {
+    KEY_COLUMN: 'INTEGER',
+    'freee勘定科目_id': 'INTEGER',
+    '振替_id': 'INTEGER',
+}
+
+BQ_TO_ARROW = {
+    'INTEGER': pa.int64(),
+    'FLOAT': pa.float64(),
+    'NUMERIC': pa.decimal128(38, 9),
+    'BOOLEAN': pa.bool_(),
+    'STRING': pa.string(),
+    'DATE': pa.date32(),
+    'DATETIME': pa.timestamp('us'),
+    'TIMESTAMP': pa.timestamp('us', tz='UTC'),
+}
+BQ_TYPE_ALIASES = {'INT64': 'INTEGER', 'FLOAT64': 'FLOAT', 'BOOL': 'BOOLEAN', 'BIGNUMERIC': 'NUMERIC'}
+
+
+def canonical(value):
+    """ハッシュ・JSON ロード用に値を正規化（numpy/pandas の型・NaN・日付を吸収）"""
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()  # numpy スカラー
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else value
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def canonical_row(row):
+    return {k: canonical(v) for k, v in row.items()}
+
+
+def row_hash(row):
+    body = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class RowHashIndex:
+    """table_id → {'columns': [[列名, 型], ...], 'rows': {nocodb_id: 行ハッシュ}} を JSON ファイルに保持"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tables = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.tables = json.load(f)
+
+    def get(self, table_id):
+        return self.tables.get(table_id)
+
+    def put(self, table_id, columns, hashes):
+        with self.lock:
+            self.tables[table_id] = {'columns': columns, 'rows': hashes}
+            self._save()
+
+    def drop(self, table_id):
+        with self.lock:
+            self.tables.pop(table_id, None)
+            self._save()
+
+    def _save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.tables, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def infer_bq_type(values):
+    """正規化済みの値から BQ 型を推定（全 NULL は STRING）"""
+    types = {type(v) for v in values if v is not None}
+    if not types:
+        return 'STRING'
+    if types <= {bool}:
+        return 'BOOLEAN'
+    if types <= {int}:
+        return 'INTEGER'
+    if types <= {int, float}:
+        return 'FLOAT'
+    return 'STRING'
+
+
+def is_fractional(value):
+    """INTEGER 列に入れると切り捨てになる値か（正規化済みの値。文字列の数値も見る）"""
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return False
+    return isinstance(value, float) and not value.is_integer()
+
+
+def table_schema(client, table_id, rows, columns):
+    """ロード用の BQ スキーマ（PINNED_TYPES > 既存テーブルの型 > 推定）"""
+    try:
+        existing = {f.name: BQ_TYPE_ALIASES.get(f.field_type, f.field_type)
+                    for f in client.get_table(table_id).schema}
+    except NotFound:
+        existing = {}
+    dropped = [c for c in PINNED_TYPES if c in existing and c not in columns]
+    if dropped:
+        raise ValueError(f'VIEW が参照する列が行にありません: {dropped}（main.py の SKIP_COLUMNS を確認）')
+
+    schema = []
+    for col in columns:
+        bq_type = PINNED_TYPES.get(col) or existing.get(col)
+        if bq_type not in BQ_TO_ARROW:
+            bq_type = infer_bq_type(row.get(col) for row in rows)
+        elif bq_type == 'INTEGER' and col not in PINNED_TYPES and any(is_fractional(row.get(col)) for row in rows):
+            bq_type = 'FLOAT'
+        schema.append(bigquery.SchemaField(col, bq_type, mode='NULLABLE'))
+    return schema
+
+
+def arrow_value(value, bq_type):
+    if value is None:
+        return None
+    if bq_type == 'INTEGER':
+        if is_fractional(value):
+            raise ValueError(f'INTEGER 列に小数の値: {value!r}')
+        return int(float(value)) if isinstance(value, str) else int(value)
+    if bq_type == 'FLOAT':
+        return float(value)
+    if bq_type == 'NUMERIC':
+        return decimal.Decimal(str(value))
+    if bq_type == 'BOOLEAN':
+        return value in (1, True, '1', 'true', 'True')
+    if bq_type == 'DATE':
+        return datetime.date.fromisoformat(value[:10])
+    if bq_type in ('DATETIME', 'TIMESTAMP'):
+        dt = datetime.datetime.fromisoformat(value)
+        if bq_type == 'TIMESTAMP' and dt.tzinfo is None:
+            dt = dt.replace(tzinfo=datetime.timezone.utc)
+        return dt
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+
+
+def to_arrow(rows, schema):
+    """正規化済みの行を schema どおりの型で Arrow テーブルに変換"""
+    arrays = [
+        pa.array([arrow_value(row.get(f.name), f.field_type) for row in rows], type=BQ_TO_ARROW[f.field_type])
+        for f in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=pa.schema([(f.name, BQ_TO_ARROW[f.field_type]) for f in schema]))
+
+
+def plan_delta(rows, hashes, entry):
+    """(upsert 行, 削除キー) を返す。rows は正規化済み、hashes は rows と同じ順の行ハッシュ"""
+    previous = entry['rows']
+    upserts = [row for row, h in zip(rows, hashes) if previous.get(str(row[KEY_COLUMN])) != h]
+    current_keys = {str(row[KEY_COLUMN]) for row in rows}
+    deletes = [key for key in previous if key not in current_keys]
+    return upserts, deletes
+
+
+def load_rows(client, table_id, rows, schema):
+    """rows を Parquet に書き出し、table_id に WRITE_TRUNCATE で1回のロードジョブで投入"""
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition='WRITE_TRUNCATE',
+        schema=schema,
+    )
+    fd, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(fd)
+    try:
+        pq.write_table(to_arrow(rows, schema), path)
+        with open(path, 'rb') as f:
+            client.load_table_from_file(f, table_id, job_config=job_config).result()
+    finally:
+        os.remove(path)
+
+
+def build_merge_sql(table_id, staging_id, columns):
+    key = f'`{KEY_COLUMN}`'
+    update_cols = [c for c in columns if c != KEY_COLUMN]
+    col_list = ', '.join(f'`{c}`' for c in columns)
+    return f"""
+MERGE `{table_id}` T
+USING `{staging_id}` S
+ON T.{key} = S.{key}
+WHEN MATCHED THEN UPDATE SET {', '.join(f'`{c}` = S.`{c}`' for c in update_cols)}
+WHEN NOT MATCHED THEN INSERT ({col_list}) VALUES ({', '.join(f'S.`{c}`' for c in columns)})
+WHEN NOT MATCHED BY SOURCE AND CAST(T.{key} AS STRING) IN UNNEST(@deleted) THEN DELETE
+"""
+
+
+def apply_delta(client, table_id, schema, upserts, deletes):
+    """差分をステージング経由で MERGE。影響行数を返す"""
+    params = [bigquery.ArrayQueryParameter('deleted', 'STRING', deletes)]
+    job_config = bigquery.QueryJobConfig(query_parameters=params)
+    if not upserts:
+        job = client.query(
+            f"DELETE FROM `{table_id}` WHERE CAST(`{KEY_COLUMN}` AS STRING) IN UNNEST(@deleted)",
+            job_config=job_config)
+        job.result()
+        return job.num_dml_affected_rows or 0
+
+    project, dataset, table = table_id.split('.')
+    staging_id = f'{project}.{dataset}._stg_{table}'
+    load_rows(client, staging_id, upserts, schema)
+    try:
+        job = client.query(build_merge_sql(table_id, staging_id, [f.name for f in schema]),
+                           job_config=job_config)
+        job.result()
+        return job.num_dml_affected_rows or 0
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+
+def sync_table(client, index, table_id, rows, full=False):
+    """1テーブルを差分同期。{'mode', 'rows', 'upserts', 'deletes'} を返す"""
+    rows = [canonical_row(row) for row in rows]
+    hashes = [row_hash(row) for row in rows]
+    columns = sorted({c for row in rows for c in row})
+    schema = table_schema(client, table_id, rows, columns)
+    signature = [[f.name, f.field_type] for f in schema]
+    entry = index.get(table_id)
+    new_index = {str(row[KEY_COLUMN]): h for row, h in zip(rows, hashes)}
+
+    if full or entry is None or entry['columns'] != signature:
+        load_rows(client, table_id, rows, schema)
+        index.put(table_id, signature, new_index)
+        return {'mode': 'full', 'rows': len(rows), 'upserts': len(rows), 'deletes': 0}
+
+    upserts, deletes = plan_delta(rows, hashes, entry)
+    if upserts or deletes:
+        apply_delta(client, table_id, schema, upserts, deletes)
+        index.put(table_id, signature, new_index)
+    return {'mode': 'incremental', 'rows': len(rows), 'upserts': len(upserts), 'deletes': len(deletes)}
+
+
+def sync_tables(client, tables, full=False, concurrency=SYNC_CONCURRENCY, index=None):
+    """{table_id: rows} をテーブル単位で並列に差分同期。失敗したテーブル数を返す"""
+    index = index or RowHashIndex()
+
+    def run(table_id):
+        try:
+            return sync_table(client, index, table_id, tables[table_id], full=full)
+        except Exception as e:
+            return {'mode': 'error', 'error': e}
+
+    table_ids = list(tables)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = dict(zip(table_ids, pool.map(run, table_ids)))
+
+    print('=== NocoDB → BQ 差分同期 ===')
+    errors = 0
+    for table_id in table_ids:
+        r = results[table_id]
+        name = table_id.split('.', 1)[1]
+        if r['mode'] == 'error':
+            errors += 1
+            print(f"  ✗ {name}: {r['error']}")
+        elif r['mode'] == 'full':
+            print(f"  {name}: 全件入れ替え {r['rows']:,} 行")
+        elif r['upserts'] or r['deletes']:
+            print(f"  {name}: upsert {r['upserts']:,} / 削除 {r['deletes']:,}（全 {r['rows']:,} 行）")
+        else:
+            print(f"  {name}: 変更なし（{r['rows']:,} 行）")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NocoDB → BQ 差分同期インデックスの管理')
+    parser.add_argument('--status', action='store_true', help='インデックスの状態を表示')
+    parser.add_argument('--reset', nargs='*', metavar='TABLE',
+                        help='インデックスを削除（テーブル名省略時は全テーブル）。次回は全件入れ替え')
+    args = parser.parse_args()
+    index = RowHashIndex()
+
+    if args.reset is not None:
+        targets = args.reset or list(index.tables)
+        for table in targets:
+            table_id = table if table.count('.') == 2 else f'{BQ_PROJECT}.nocodb.{table}'
+            index.drop(table_id)
+            print(f'  {table_id}: インデックス削除')
+        return
+
+    print(f'=== 差分同期インデックス（{os.path.normpath(INDEX_PATH)}）===')
+    for table_id, entry in sorted(index.tables.items()):
+        print(f"  {table_id.split('.', 1)[1]:<45} {len(entry['rows']):>7,} 行  {len(entry['columns'])} 列")
+    if not index.tables:
+        print('  （未作成: 次回の同期で全テーブルを全件入れ替えして作成）')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+NTTファイナンスBizカード 請求月別の差額内訳（年度単位）
+
+請求月ごとに3つの合計を並べ、差額を「どの利用明細の組み合わせか」まで説明する:
+  請求額   NTT 生明細 MYLINK_<請求月>.csv の合計（ファイルがない月は空欄）
+  引落額   楽天銀行の NTT 引落し（取引月 = 請求月）
+  記録額   nocodb.ntt_finance_statements の利用額合計（payment_date の月 = 請求月）
+
+記録額と引落額（・請求額）の差額 d について:
+  d > 0  その請求月に記録した明細のうち、実際には請求されなかった組み合わせ（締め日後の利用など）
+  d < 0  前後の請求月・支払日未設定の明細のうち、この請求月に請求された組み合わせ
+候補は請求バッチの利用日範囲の両端 ±--window 日に絞って部分和（scripts/subset_sum.py）で探し、
+見つからなければ窓を倍々に広げて再探索する（広げた窓で見つかった解は「窓 ±N日」と表示。
+窓が広いほど偶然一致の可能性が高いので要確認）。
+請求額と引落額の差は明細では説明できない（手数料・手動送金など）ので金額のみ表示する。
+
+実行: python scripts/ntt_billing_reconcile.py 2024
+      python scripts/ntt_billing_reconcile.py 2023 2024 2025 --window 10
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import datetime
+from collections import defaultdict
+from pathlib import Path
+from bq_client import query
+from statement_ingest import iter_records
+from subset_sum import find_subsets, within
+
+BQ_PROJECT = "main-project-477501"
+RAW_DIR = Path(r"c:\Users\ninni\projects\rawdata\NTTファイナンスBizカード明細")
+DATE_WINDOW = 7
+MAX_SOLUTIONS = 3
+
+CHARGES_SQL = f"""
+SELECT nocodb_id, SAFE.PARSE_DATE('%Y-%m-%d', usage_date) AS usage_date, merchant_name,
+       -CAST(usage_amount AS INT64) AS amount, SAFE.PARSE_DATE('%Y-%m-%d', payment_date) AS payment_date
+FROM `{BQ_PROJECT}.nocodb.ntt_finance_statements`
+WHERE usage_amount IS NOT NULL
+"""
+
+WITHDRAWALS_SQL = f"""
+SELECT transaction_date, -amount_jpy AS amount
+FROM `{BQ_PROJECT}.nocodb.rakuten_bank_statements`
+WHERE (counterparty_description LIKE '%NTT%' OR counterparty_description LIKE '%ＮＴＴ%') AND amount_jpy < 0
+"""
+
+
+def month_of(date):
+    return f'{date.year}{date.month:02d}'
+
+
+def load_billing_totals(raw_dir=RAW_DIR):
+    """{請求月: MYLINK CSV の利用金額合計}"""
+    return {path.stem.replace('MYLINK_', ''): sum(r['amount'] for r in iter_records(path, 'ntt_mylink'))
+            for path in sorted(Path(raw_dir).glob('MYLINK_*.csv'))}
+
+
+def load_charges():
+    return [{'id': r.nocodb_id, 'date': r.usage_date, 'merchant': r.merchant_name or '', 'amount': r.amount,
+             'batch': month_of(r.payment_date) if r.payment_date else None}
+            for r in query(CHARGES_SQL, labels={'step': 'charges'}) if r.usage_date is not None]
+
+
+def load_withdrawals():
+    totals = defaultdict(int)
+    for r in query(WITHDRAWALS_SQL, labels={'step': 'withdrawals'}):
+        totals[month_of(datetime.date.fromisoformat(str(r.transaction_date)[:10]))] += r.amount
+    return totals
+
+
+def explain(diff, batch, charges, window):
+    """差額 diff を説明する明細の組み合わせ [(明細リスト, 見つかった窓の日数)]"""
+    batch_charges = [c for c in charges if c['batch'] == batch]
+    if not batch_charges:
+        return []
+    start = min(c['date'] for c in batch_charges)
+    end = max(c['date'] for c in batch_charges)
+    if diff > 0:
+        pool, target = batch_charges, diff
+    else:
+        pool, target = [c for c in charges if c['batch'] != batch], -diff
+    # 窓を倍々に広げながら探す（最初に見つかった窓の解を返す）
+    w, searched = window, -1
+    while searched < len(pool):
+        if diff > 0:
+            # 締め日付近（利用日範囲の両端）の明細
+            near = within(pool, start, start, w) + within(pool, end, end, w)
+            near = list({c['id']: c for c in near}.values())
+        else:
+            # 他の請求月・支払日未設定の明細のうち、この請求バッチの利用日範囲 ±w に入るもの
+            near = within(pool, start, end, w)
+        if len(near) > searched:
+            combos = find_subsets([c['amount'] for c in near], target, limit=MAX_SOLUTIONS)
+            if combos:
+                return [([near[i] for i in combo], w) for combo in combos]
+            searched = len(near)
+        if w > 366:
+            break
+        w = max(w * 2, 1)
+    return []
+
+
+def print_explanations(label, diff, solutions, window):
+    if not solutions:
+        print(f'    {label} {diff:+,}円: 明細の組み合わせでは説明できない')
+        return
+    for n, (combo, w) in enumerate(solutions, 1):
+        note = f'（窓 ±{w}日）' if w > window else ''
+        print(f'    {label} {diff:+,}円 = 候補{n}{note}: {len(combo)}件')
+        for c in sorted(combo, key=lambda c: c['date']):
+            batch = c['batch'] or '支払日未設定'
+            print(f"      {c['date']} {c['amount']:>9,}  {c['merchant'][:30]:<30} id={c['id']} 請求月={batch}")
+
+
+def reconcile_year(year, charges, billed, withdrawn, window=DATE_WINDOW):
+    recorded = defaultdict(int)
+    for c in charges:
+        if c['batch']:
+            recorded[c['batch']] += c['amount']
+    months = sorted(m for m in set(recorded) | set(withdrawn) | set(billed) if m.startswith(str(year)))
+    print(f"\n{'=' * 90}\nFY{year} NTTカード 請求月別突合（窓 ±{window}日）\n{'=' * 90}")
+    print(f"{'請求月':>8} {'請求額(CSV)':>12} {'引落額':>10} {'記録額':>10} {'記録-引落':>10} {'請求-引落':>10}")
+    issues = []
+    for m in months:
+        b, w, r = billed.get(m), withdrawn.get(m, 0), recorded.get(m, 0)
+        bw = '' if b is None else f'{b - w:>+10,}'
+        print(f"{m:>8} {'-' if b is None else f'{b:,}':>12} {w:>10,} {r:>10,} {r - w:>+10,} {bw:>10}")
+        if r != w or (b is not None and b != r):
+            issues.append((m, b, w, r))
+    for m, b, w, r in issues:
+        print(f'\n  ■ {m}')
+        if r != w:
+            print_explanations('記録-引落', r - w, explain(r - w, m, charges, window), window)
+        if b is not None and b != r and b != w:
+            print_explanations('記録-請求', r - b, explain(r - b, m, charges, window), window)
+        if b is not None and b != w:
+            print(f'    請求-引落 {b - w:+,}円: 明細外（手数料・手動送金・引落し口座違いなど）')
+    if not issues:
+        print('\n  全請求月で一致')
+    return issues
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NTTカード 請求額・引落額・NocoDB 記録額の差額内訳')
+    parser.add_argument('years', nargs='+', type=int, help='年度（暦年）')
+    parser.add_argument('--window', type=int, default=DATE_WINDOW, help=f'締め日付近とみなす日数（既定 ±{DATE_WINDOW}日）')
+    parser.add_argument('--raw-dir', default=str(RAW_DIR), help='MYLINK_*.csv のフォルダ')
+    args = parser.parse_args()
+
+    charges = load_charges()
+    withdrawn = load_withdrawals()
+    billed = load_billing_totals(args.raw_dir) if Path(args.raw_dir).is_dir() else {}
+    if not billed:
+        print(f'※ 生明細なし（{args.raw_dir}）→ 請求額は比較しない')
+    for year in args.years:
+        reconcile_year(year, charges, billed, withdrawn, args.window)
+
+
+if __name__ == '__main__':
+    main()
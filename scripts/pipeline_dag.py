@@ -0,0 +1,282 @@
+"""
+BQ 集計パイプラインの依存関係（DAG）ランナー
+
+固定時刻のスケジュールクエリ（dim_standard_cost 01:30 / fact_daily_asin 02:00 / fact_monthly_settlement_sku 03:00）の代わりに、
+テーブル単位の依存関係（stg・dim → fact、nocodb → dim・accounting）で各ノードを起動する:
+
+  - 入力が「新しい」（fresh に挙げた入力が今日 JST 0時以降に更新済み）になったノードから起動する。
+    Cloud Run の SP-API / Ads ジョブが早く終わった日は、その分早く fact が更新される
+  - 前回成功時から入力がどれも更新されていないノードはスキップ（BQ を1バイトも読まない）。
+    ただし always を付けたノード（入力の更新を __TABLES__ で検知できないもの）は毎回実行する
+  - 依存関係のないノードは並列に実行し、出力テーブルを入力に持つノードは上流の完了後に判定する
+  - 期限（--until）までに fresh の入力が更新されなかったノードは実行しない（古い入力では作らない）
+
+ノード（NODES に追加すれば他の集計も載せられる。inputs / outputs は dataset.table）:
+  dim_standard_cost           scheduled_queries/dim_standard_cost.sql（標準原価の期間表 + 日次展開。全件作り直し）
+  fact_daily_asin             scheduled_queries/fact_daily_asin.sql（直近 N 日のパーティション MERGE）
+  fact_monthly_settlement_sku scheduled_queries/fact_monthly_settlement_sku.sql（締まっていない月だけ MERGE）
+  journal_entries_mat         journal_entries_mat.refresh()（更新された NocoDB ソース + 毎回再計算のソースを MERGE。
+                              dim_standard_cost の後。毎回実行）
+
+テーブルの更新時刻は __TABLES__ の last_modified_time、前回成功時刻は analytics.pipeline_run_log。
+スケジュールはタスクスケジューラ等で15分おきに1回実行（1回の実行で、その時点で起動できるノードと
+その下流をすべて処理して終わる）するか、--watch で期限まで待ち続ける。
+ノードが実行する scheduled_queries/*.sql にはヘッダ `-- Disabled: true` を付けておき、
+scheduled_query_deploy.py --apply で転送設定を無効（disabled）の状態で登録・維持する
+（固定時刻との二重実行を防ぐ。DAG をやめるときはヘッダを外して --apply すれば固定時刻に戻る）。
+
+実行: uv run --with google-cloud-bigquery python scripts/pipeline_dag.py --plan      判定結果だけ表示
+      uv run --with google-cloud-bigquery python scripts/pipeline_dag.py            1回分実行
+      uv run --with google-cloud-bigquery python scripts/pipeline_dag.py --watch --until 09:00
+      uv run --with google-cloud-bigquery python scripts/pipeline_dag.py --only fact_daily_asin --force
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from google.cloud import bigquery
+from bq_client import get_client, job_config
+from journal_sources import SOURCES, source_dependencies
+
+BQ_PROJECT = "main-project-477501"
+LOG_ID = f"{BQ_PROJECT}.analytics.pipeline_run_log"
+SQL_DIR = Path(__file__).resolve().parent.parent / 'scheduled_queries'
+JST = timezone(timedelta(hours=9))
+POLL_SECONDS = 300
+MAX_WORKERS = 4
+
+
+# ---------- ノードの実行 ----------
+
+def run_sql_file(name):
+    """scheduled_queries/<name>.sql をスクリプトとして実行し、処理バイト数を返す"""
+    def run(client):
+        sql = (SQL_DIR / f'{name}.sql').read_text(encoding='utf-8')
+        job = client.query(sql, job_config=job_config(labels={'step': name}))
+        job.result()
+        return job.total_bytes_processed or 0
+    return run
+
+
+def run_journal_entries_mat(client):
+    from journal_entries_mat import refresh
+    refresh(client)
+    return None
+
+
+# inputs: 更新されたら再実行する入力 / fresh: 今日更新されるまで待つ入力（日次ロードされる stg）
+# always: 入力の更新を検知できないので毎回実行する理由（VIEW の last_modified_time は定義の変更でしか変わらず、
+#         外部テーブルは GCS のファイル更新が反映されない）
+NODES = [
+    {
+        'name': 'dim_standard_cost',
+        'inputs': ['nocodb.standard_cost_history', 'nocodb.product_master'],
+        'fresh': [],
+        'outputs': ['analytics.dim_standard_cost', 'analytics.dim_standard_cost_daily'],
+        'run': run_sql_file('dim_standard_cost'),
+    },
+    {
+        'name': 'fact_daily_asin',
+        'inputs': ['analytics.stg_sp_traffic_child_asin', 'analytics.stg_ads_product_daily',
+                   'analytics.dim_standard_cost_daily', 'analytics.stg_sp_inventory', 'nocodb.product_master'],
+        'fresh': ['analytics.stg_sp_traffic_child_asin', 'analytics.stg_ads_product_daily'],
+        'outputs': ['analytics.fact_daily_asin', 'analytics.fact_daily_parent_asin'],
+        'run': run_sql_file('fact_daily_asin'),
+    },
+    {
+        'name': 'fact_monthly_settlement_sku',
+        'inputs': ['analytics.stg_sp_settlement', 'analytics.stg_ads_product_daily',
+                   'analytics.dim_standard_cost_daily', 'nocodb.product_master'],
+        'fresh': ['analytics.stg_ads_product_daily'],
+        'outputs': ['analytics.fact_monthly_settlement_sku'],
+        'run': run_sql_file('fact_monthly_settlement_sku'),
+    },
+    {
+        'name': 'journal_entries_mat',
+        # 棚卸仕訳 VIEW が原価を引く dim_standard_cost も入力にする（dim の作り直しの後に実行・再計算）
+        'inputs': sorted({t for deps in source_dependencies().values() for t in deps}
+                         | {'analytics.dim_standard_cost'}),
+        'fresh': [],
+        'outputs': ['accounting.journal_entries_mat'],
+        'run': run_journal_entries_mat,
+        'always': '毎回再計算するソース（'
+                  + '・'.join(src['name'] for src in SOURCES if src.get('always_refresh'))
+                  + '）は VIEW・外部テーブル経由で更新を検知できない',
+    },
+]
+
+
+def upstream(nodes):
+    """ノード名 → 出力を入力に持つ上流ノード名の集合（循環があれば ValueError）"""
+    producers = {out: n['name'] for n in nodes for out in n['outputs']}
+    deps = {n['name']: {producers[t] for t in n['inputs'] if t in producers and producers[t] != n['name']}
+            for n in nodes}
+    done, visiting = set(), set()
+
+    def visit(name):
+        if name in visiting:
+            raise ValueError(f'依存関係が循環しています: {name}')
+        if name not in done:
+            visiting.add(name)
+            for d in deps[name]:
+                visit(d)
+            visiting.discard(name)
+            done.add(name)
+    for name in deps:
+        visit(name)
+    return deps
+
+
+# ---------- 状態 ----------
+
+def ensure_log_table(client):
+    client.query(f"""
+    CREATE TABLE IF NOT EXISTS `{LOG_ID}` (
+      node STRING,
+      started_at TIMESTAMP,
+      finished_at TIMESTAMP,
+      status STRING,
+      bytes_processed INT64,
+      message STRING
+    )
+    """).result()
+
+
+def last_success(client):
+    """ノード名 → 前回成功した実行の開始時刻"""
+    rows = client.query(f"SELECT node, MAX(started_at) AS t FROM `{LOG_ID}` WHERE status = 'success' GROUP BY node")
+    return {r.node: r.t for r in rows.result()}
+
+
+def table_versions(client, tables):
+    """dataset.table → last_modified_time（存在しないテーブルは含まない）"""
+    datasets = sorted({t.split('.')[0] for t in tables})
+    union = "\nUNION ALL\n".join(
+        f"SELECT '{ds}' AS dataset_id, table_id, last_modified_time FROM `{BQ_PROJECT}.{ds}.__TABLES__`"
+        for ds in datasets
+    )
+    return {f"{r.dataset_id}.{r.table_id}": datetime.fromtimestamp(r.last_modified_time / 1000, timezone.utc)
+            for r in client.query(union).result()}
+
+
+def write_log(client, node, started_at, status, bytes_processed=None, message=None):
+    client.query(
+        f"INSERT INTO `{LOG_ID}` VALUES (@node, @started_at, CURRENT_TIMESTAMP(), @status, @bytes, @message)",
+        job_config=bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter('node', 'STRING', node),
+            bigquery.ScalarQueryParameter('started_at', 'TIMESTAMP', started_at),
+            bigquery.ScalarQueryParameter('status', 'STRING', status),
+            bigquery.ScalarQueryParameter('bytes', 'INT64', bytes_processed),
+            bigquery.ScalarQueryParameter('message', 'STRING', message),
+        ]),
+    ).result()
+
+
+def check(node, versions, since, fresh_since, force=False):
+    """('run' | 'skip' | 'wait', 理由)"""
+    missing = [t for t in node['inputs'] if t not in versions]
+    if missing:
+        return 'wait', f'入力テーブルなし: {missing}'
+    stale = [t for t in node['fresh'] if versions[t] < fresh_since]
+    if stale:
+        return 'wait', f"未更新の入力: {', '.join(f'{t}（{versions[t].astimezone(JST):%m-%d %H:%M}）' for t in stale)}"
+    if force or since is None:
+        return 'run', '強制実行' if force else '初回'
+    if node.get('always'):
+        return 'run', node['always']
+    changed = [t for t in node['inputs'] if versions[t] > since]
+    if not changed:
+        return 'skip', f'前回成功（{since.astimezone(JST):%m-%d %H:%M}）以降に入力の更新なし'
+    return 'run', f'更新された入力: {changed}'
+
+
+# ---------- ランナー ----------
+
+def run_dag(client, nodes, watch=False, until=None, force=False, plan=False):
+    """起動できるノードを順に（独立なノードは並列に）実行し、ノード名 → 最終状態 を返す"""
+    deps = upstream(nodes)
+    by_name = {n['name']: n for n in nodes}
+    tables = {t for n in nodes for t in n['inputs'] + n['outputs']}
+    fresh_since = datetime.now(JST).replace(hour=0, minute=0, second=0, microsecond=0)
+    ensure_log_table(client)
+    success = last_success(client)
+    state = {n['name']: 'pending' for n in nodes}
+    running = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        while True:
+            versions = table_versions(client, tables)
+            waiting = []
+            for name in [n for n, s in state.items() if s == 'pending']:
+                if any(state[d] in ('pending', 'running') for d in deps[name]):
+                    continue
+                if any(state[d] in ('failed', 'stale') for d in deps[name]):
+                    state[name] = 'stale'
+                    print(f'  ✗ {name}: 上流ノードが失敗・未実行')
+                    continue
+                action, reason = check(by_name[name], versions, success.get(name), fresh_since, force)
+                if action == 'wait':
+                    waiting.append((name, reason))
+                elif action == 'skip' or plan:
+                    state[name] = 'skipped' if action == 'skip' else 'planned'
+                    print(f"  {'-' if action == 'skip' else '▶'} {name}: {reason}")
+                else:
+                    started_at = datetime.now(timezone.utc)
+                    print(f'  ▶ {name}: {reason}')
+                    running[pool.submit(by_name[name]['run'], client)] = (name, started_at)
+                    state[name] = 'running'
+            if running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, started_at = running.pop(future)
+                    try:
+                        processed = future.result()
+                    except Exception as e:
+                        state[name] = 'failed'
+                        print(f'  ✗ {name}: {e}')
+                        write_log(client, name, started_at, 'failed', message=str(e)[:1000])
+                        continue
+                    state[name] = 'success'
+                    elapsed = (datetime.now(timezone.utc) - started_at).total_seconds()
+                    size = f'  処理: {processed / 1024**2:,.1f} MB' if processed is not None else ''
+                    print(f'  ✓ {name}: {elapsed:,.0f} 秒{size}')
+                    write_log(client, name, started_at, 'success', processed)
+                continue
+            if waiting and watch and not plan and (until is None or datetime.now(JST) < until):
+                print(f"  … {datetime.now(JST):%H:%M} 待機中: {', '.join(n for n, _ in waiting)}")
+                time.sleep(POLL_SECONDS)
+                continue
+            for name, reason in waiting:
+                state[name] = 'stale'
+                print(f'  ⏸ {name}: {reason} → 今回は実行しない')
+            if not any(s == 'pending' for s in state.values()):
+                return state
+
+
+def parse_until(value):
+    hour, minute = map(int, value.split(':'))
+    until = datetime.now(JST).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return until if until > datetime.now(JST) else until + timedelta(days=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='stg → fact / nocodb → accounting の依存関係ランナー')
+    parser.add_argument('--plan', action='store_true', help='判定結果だけ表示して実行しない')
+    parser.add_argument('--watch', action='store_true', help='fresh の入力が更新されるまで待つ')
+    parser.add_argument('--until', type=parse_until, help='--watch の期限（HH:MM JST）')
+    parser.add_argument('--only', nargs='+', choices=[n['name'] for n in NODES], help='実行するノード')
+    parser.add_argument('--force', action='store_true', help='入力が更新されていなくても実行する')
+    args = parser.parse_args()
+
+    nodes = [n for n in NODES if not args.only or n['name'] in args.only]
+    print(f"=== パイプライン {datetime.now(JST):%Y-%m-%d %H:%M} JST{'（plan）' if args.plan else ''} ===")
+    state = run_dag(get_client(), nodes, watch=args.watch, until=args.until, force=args.force, plan=args.plan)
+    print('\n' + '  '.join(f'{name}={s}' for name, s in state.items()))
+    if any(s == 'failed' for s in state.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
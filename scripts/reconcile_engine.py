@@ -0,0 +1,327 @@
+"""
+3点突合エンジン（生明細 ↔ NocoDB ↔ BQ journal_entries）
+
+ソースごとに3つの明細集合を1回ずつ読み込み、Arrow テーブル（date, amount, ref, description）にして
+ハッシュ結合で突合する。旧 tmp/ntt_full_reconcile.py・ntt_verify_v2/v3.py・ntt_comparison.py が
+それぞれ MYLINK CSV のパースと DB クエリを書き直していた部分の共通化。
+
+  生明細 ↔ NocoDB        共通の ID がないので (日付, 金額, 同日同額内の通し番号) で結合。残りを日付で
+                          突き合わせたものが「金額違い」、それ以外が片側のみ
+  NocoDB ↔ journal_entries  source_id（末尾の数字 = NocoDB の id）で結合し、日付・金額の違いを見る
+                          NocoDB 側は仕訳対象の行だけ（振替リンク済みの行などを除く）
+
+結果のバケット（いずれも pyarrow.Table）:
+  matched / mismatch（両側の date_l/amount_l/date_r/amount_r）/ only_left / only_right
+
+生明細は scripts/statement_ingest.py で読み、パース結果を tmp/reconcile_raw_cache.pickle に
+ファイルごと（サイズ・更新時刻で判定）にキャッシュして、変わったファイルだけ再パースする。
+
+ソース（SOURCES に追加すれば他の明細にも使える。name は journal_sources.py の name と同じ）:
+  ntt_finance / paypay_bank / rakuten_bank / sale_monster
+金額の符号: カードは利用がプラス、銀行は入金がプラス、セールモンスターは販売売上がプラス
+
+実行: python scripts/reconcile_engine.py ntt_finance --year 2024
+      python scripts/reconcile_engine.py paypay_bank --from 2025-01-01 --to 2025-12-31 --detail 50
+      python scripts/reconcile_engine.py rakuten_bank --raw-dir D:/rawdata/楽天銀行 --no-cache
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import datetime
+import os
+import pickle
+import sqlite3
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+from journal_sources import TRANSFER_EXCEPTIONS
+from statement_ingest import iter_records, parse_date
+
+NOCO_DB_PATH = 'C:/Users/ninni/nocodb/noco.db'
+BQ_PROJECT = "main-project-477501"
+RAW_ROOT = Path(r"c:\Users\ninni\projects\rawdata")
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmp', 'reconcile_raw_cache.pickle')
+MAX_DETAIL = 20
+
+SCHEMA = pa.schema([('date', pa.date32()), ('amount', pa.int64()), ('ref', pa.string()), ('description', pa.string())])
+
+
+# ---------- ソース定義 ----------
+# noco_amount は生明細と同じ符号になる SQL 式。noco_journal_where は仕訳対象の行の条件
+# （journal_sources.py の where・振替除外に対応）
+
+def transfer_where(name):
+    """振替リンクのない行 + journal_sources.TRANSFER_EXCEPTIONS の科目の振替行（journal_sources と同じ条件）"""
+    exceptions = TRANSFER_EXCEPTIONS.get(name, ())
+    if not exceptions:
+        return '"nc_opau___振替_id" IS NULL'
+    ids = ', '.join(str(i) for i in exceptions)
+    return f'("nc_opau___振替_id" IS NULL OR "nc_opau___freee勘定科目_id" IN ({ids}))'
+
+
+SOURCES = [
+    {
+        'name': 'ntt_finance',
+        'raw_dir': RAW_ROOT / 'NTTファイナンスBizカード明細', 'raw_glob': 'MYLINK_*.csv', 'raw_format': 'ntt_mylink',
+        'noco_table': 'nc_opau___NTTファイナンスBizカード明細',
+        'noco_date': '利用日', 'noco_amount': '-"ご利用金額"', 'noco_description': 'ご利用加盟店',
+        'noco_journal_where': '("振替" IS NULL OR "振替" = 0)',
+        'journal_account': '未払金', 'journal_positive': 'credit',
+    },
+    {
+        'name': 'paypay_bank',
+        'raw_dir': RAW_ROOT / 'paypay銀行', 'raw_glob': '*.csv', 'raw_format': 'paypay_bank',
+        'noco_table': 'nc_opau___PayPay銀行入出金明細',
+        'noco_date': '操作日', 'noco_amount': '"お預かり金額"', 'noco_description': '摘要',
+        'noco_journal_where': transfer_where('paypay_bank'),
+        'journal_account': 'PayPay銀行', 'journal_positive': 'debit',
+    },
+    {
+        'name': 'rakuten_bank',
+        'raw_dir': RAW_ROOT / '楽天銀行ビジネス口座入出金明細', 'raw_glob': '*.csv', 'raw_format': 'rakuten_bank',
+        'noco_table': 'nc_opau___楽天銀行ビジネス口座入出金明細',
+        'noco_date': '取引日', 'noco_amount': '"入出金_円_"', 'noco_description': '入出金先内容',
+        'noco_journal_where': transfer_where('rakuten_bank'),
+        'journal_account': '楽天銀行', 'journal_positive': 'debit',
+    },
+    {
+        'name': 'sale_monster',
+        'raw_dir': RAW_ROOT / 'セールモンスター', 'raw_glob': '*.csv', 'raw_format': 'sale_monster',
+        'noco_table': 'nc_opau___セールモンスター売上レポート',
+        'noco_date': '売上日',
+        'noco_amount': 'CASE WHEN "売上区分名" = \'販売売上\' THEN ABS("税込合計金額_円_") ELSE -ABS("税込合計金額_円_") END',
+        'noco_description': '売上区分名',
+        'noco_journal_where': None,
+        'journal_account': 'セールモンスター', 'journal_positive': 'debit',
+    },
+]
+
+
+def get_source(name):
+    for src in SOURCES:
+        if src['name'] == name:
+            return src
+    raise KeyError(name)
+
+
+# ---------- 読み込み ----------
+
+def to_table(records):
+    return pa.Table.from_pylist(records, schema=SCHEMA) if records else SCHEMA.empty_table()
+
+
+def in_range(table, start=None, end=None):
+    """期間内の行（日付・金額が欠けた行は除く）"""
+    mask = pc.and_(pc.is_valid(table['date']), pc.is_valid(table['amount']))
+    if start:
+        mask = pc.and_(mask, pc.greater_equal(table['date'], pa.scalar(start, pa.date32())))
+    if end:
+        mask = pc.and_(mask, pc.less_equal(table['date'], pa.scalar(end, pa.date32())))
+    return table.filter(mask)
+
+
+class RawCache:
+    """{source: {path: (size, mtime_ns, records)}}。変わっていないファイルはパースしない"""
+
+    def __init__(self, path=CACHE_PATH, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.data = {}
+        if enabled and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.data = pickle.load(f)
+        self.dirty = False
+
+    def records(self, src, raw_dir=None):
+        files = sorted(Path(raw_dir or src['raw_dir']).glob(src['raw_glob']))
+        cached = self.data.setdefault(src['name'], {})
+        records = []
+        for path in files:
+            stat = path.stat()
+            entry = cached.get(str(path))
+            if not self.enabled or not entry or entry[:2] != (stat.st_size, stat.st_mtime_ns):
+                parsed = [{k: rec[k] for k in SCHEMA.names} for rec in iter_records(path, src['raw_format'])]
+                entry = (stat.st_size, stat.st_mtime_ns, parsed)
+                cached[str(path)] = entry
+                self.dirty = True
+            records.extend(entry[2])
+        for stale in set(cached) - {str(p) for p in files}:
+            del cached[stale]
+            self.dirty = True
+        return records, len(files)
+
+    def save(self):
+        if self.enabled and self.dirty:
+            with open(self.path, 'wb') as f:
+                pickle.dump(self.data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_noco(src, journal_scope=False):
+    where = src['noco_journal_where'] if journal_scope else None
+    sql = (f'SELECT id, "{src["noco_date"]}", {src["noco_amount"]}, "{src["noco_description"]}" '
+           f'FROM "{src["noco_table"]}"' + (f' WHERE {where}' if where else ''))
+    conn = sqlite3.connect(f'file:{NOCO_DB_PATH}?mode=ro', uri=True)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return to_table([{'date': parse_date(str(d or '')), 'amount': int(a) if a is not None else None,
+                      'ref': str(i), 'description': desc or ''} for i, d, a, desc in rows])
+
+
+def load_journal(src, start=None, end=None):
+    """journal_entries のうちソースの口座側の leg（ref = source_id 末尾の NocoDB id）"""
+    from google.cloud import bigquery
+    from bq_client import query_arrow
+    params = [bigquery.ScalarQueryParameter('source', 'STRING', src['name']),
+              bigquery.ScalarQueryParameter('account', 'STRING', src['journal_account']),
+              bigquery.ScalarQueryParameter('positive', 'STRING', src['journal_positive'])]
+    sql = f"""
+    SELECT journal_date AS date,
+           IF(entry_side = @positive, amount_jpy, -amount_jpy) AS amount,
+           REGEXP_EXTRACT(source_id, r'(\\d+)$') AS ref,
+           description
+    FROM `{BQ_PROJECT}.accounting.journal_entries`
+    WHERE source_table = @source AND account_name = @account"""
+    table = query_arrow(sql, params=params, labels={'step': f'reconcile_{src["name"]}'})
+    return in_range(table.select(SCHEMA.names).cast(SCHEMA), start, end)
+
+
+# ---------- 突合（Arrow のハッシュ結合） ----------
+
+def with_occurrence(table, keys, name):
+    """keys が同じ行の中での通し番号列 name を追加（同日・同額の明細を1件ずつ対応させる）"""
+    table = table.sort_by([(k, 'ascending') for k in keys] + [('ref', 'ascending')])
+    seq, prev, i = [], None, 0
+    for key in zip(*(table[k].to_pylist() for k in keys)):
+        i = i + 1 if key == prev else 0
+        seq.append(i)
+        prev = key
+    return table.append_column(name, pa.array(seq, pa.int64()))
+
+
+def _keyed(table, suffix, keys):
+    """結合キー列 + 明細列に _l / _r を付けた列"""
+    cols = {k: table[k] for k in keys}
+    cols.update({f'{c}_{suffix}': table[c] for c in SCHEMA.names})
+    return pa.table(cols)
+
+
+def _only(table, suffix):
+    return (table.select([f'{c}_{suffix}' for c in SCHEMA.names]).rename_columns(SCHEMA.names)
+            .sort_by([('date', 'ascending'), ('ref', 'ascending')]))
+
+
+def _matched(table):
+    return (table.select(['date_l', 'amount_l', 'ref_l', 'ref_r', 'description_l'])
+            .rename_columns(['date', 'amount', 'ref_l', 'ref_r', 'description']).sort_by('date'))
+
+
+def compare_by_value(left, right):
+    """ID を共有しない2集合: (日付, 金額, 通し番号) で一致 → 残りを (日付, 通し番号) で金額違いに"""
+    keys = ['date', 'amount', 'seq']
+    joined = _keyed(with_occurrence(left, ['date', 'amount'], 'seq'), 'l', keys).join(
+        _keyed(with_occurrence(right, ['date', 'amount'], 'seq'), 'r', keys), keys=keys, join_type='full outer')
+    matched = joined.filter(pc.and_(pc.is_valid(joined['ref_l']), pc.is_valid(joined['ref_r'])))
+    only_l = _only(joined.filter(pc.is_null(joined['ref_r'])), 'l')
+    only_r = _only(joined.filter(pc.is_null(joined['ref_l'])), 'r')
+
+    # 同じ日付に片側のみの行が両側にある → 順に金額違いとして対応させる
+    keys = ['date', 'dseq']
+    ol = _keyed(with_occurrence(only_l, ['date'], 'dseq'), 'l', keys)
+    orr = _keyed(with_occurrence(only_r, ['date'], 'dseq'), 'r', keys)
+    pairs = ol.join(orr, keys=keys, join_type='inner')
+    rest_l = ol.join(pairs.select(['ref_l']), keys='ref_l', join_type='left anti')
+    rest_r = orr.join(pairs.select(['ref_r']), keys='ref_r', join_type='left anti')
+    return {'matched': _matched(matched), 'mismatch': _mismatch_columns(pairs),
+            'only_left': _only(rest_l, 'l'), 'only_right': _only(rest_r, 'r')}
+
+
+def compare_by_ref(left, right):
+    """ID（ref）を共有する2集合: ref で結合し、日付・金額の違いを見る"""
+    joined = _keyed(left, 'l', ['ref']).join(_keyed(right, 'r', ['ref']), keys='ref', join_type='full outer')
+    both = joined.filter(pc.and_(pc.is_valid(joined['ref_l']), pc.is_valid(joined['ref_r'])))
+    same = pc.fill_null(pc.and_(pc.equal(both['date_l'], both['date_r']),
+                                pc.equal(both['amount_l'], both['amount_r'])), False)
+    return {'matched': _matched(both.filter(same)), 'mismatch': _mismatch_columns(both.filter(pc.invert(same))),
+            'only_left': _only(joined.filter(pc.is_null(joined['ref_r'])), 'l'),
+            'only_right': _only(joined.filter(pc.is_null(joined['ref_l'])), 'r')}
+
+
+def _mismatch_columns(table):
+    cols = ['date_l', 'amount_l', 'ref_l', 'description_l', 'date_r', 'amount_r', 'ref_r', 'description_r']
+    return table.select(cols).sort_by([('date_l', 'ascending')])
+
+
+# ---------- 実行 ----------
+
+def total(table, col='amount'):
+    return pc.sum(table[col]).as_py() or 0
+
+
+def print_comparison(title, result, left_name, right_name, max_detail=MAX_DETAIL):
+    m, mm, ol, orr = result['matched'], result['mismatch'], result['only_left'], result['only_right']
+    print(f"\n{'=' * 90}\n{title}\n{'=' * 90}")
+    print(f'  一致:           {m.num_rows:>6}件 {total(m):>12,}円')
+    print(f'  金額・日付違い: {mm.num_rows:>6}件 {left_name} {total(mm, "amount_l"):,}円 / '
+          f'{right_name} {total(mm, "amount_r"):,}円')
+    print(f'  {left_name}のみ: {ol.num_rows:>6}件 {total(ol):>12,}円')
+    print(f'  {right_name}のみ: {orr.num_rows:>6}件 {total(orr):>12,}円')
+    if mm.num_rows:
+        print(f'\n  --- 金額・日付違い（先頭{max_detail}件） ---')
+        for r in mm.slice(0, max_detail).to_pylist():
+            print(f"  {r['date_l']} {r['amount_l']:>10,} [{r['ref_l']}] ↔ {r['date_r']} {r['amount_r']:>10,} "
+                  f"[{r['ref_r']}]  {(r['description_l'] or '')[:30]}")
+    for name, table in ((left_name, ol), (right_name, orr)):
+        if table.num_rows:
+            print(f'\n  --- {name}のみ（先頭{max_detail}件） ---')
+            for r in table.slice(0, max_detail).to_pylist():
+                print(f"  {r['date']} {r['amount']:>10,} [{r['ref']}]  {(r['description'] or '')[:40]}")
+
+
+def reconcile(src, start=None, end=None, raw_dir=None, use_cache=True, with_journal=True):
+    """{'raw_noco': バケット, 'noco_journal': バケット}（生明細がなければ raw_noco は None）"""
+    results = {'raw_noco': None, 'noco_journal': None}
+    raw_dir = Path(raw_dir or src['raw_dir'])
+    if raw_dir.is_dir():
+        cache = RawCache(enabled=use_cache)
+        records, files = cache.records(src, raw_dir)
+        cache.save()
+        raw = in_range(to_table(records), start, end)
+        noco = in_range(load_noco(src), start, end)
+        print(f'生明細: {files}ファイル {raw.num_rows}件 / NocoDB: {noco.num_rows}件')
+        results['raw_noco'] = compare_by_value(raw, noco)
+    else:
+        print(f'※ 生明細フォルダなし（{raw_dir}）→ 生明細 ↔ NocoDB は省略')
+    if with_journal:
+        results['noco_journal'] = compare_by_ref(in_range(load_noco(src, journal_scope=True), start, end),
+                                                 load_journal(src, start, end))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生明細 ↔ NocoDB ↔ journal_entries の3点突合')
+    parser.add_argument('source', choices=[s['name'] for s in SOURCES])
+    parser.add_argument('--year', type=int, help='暦年（--from/--to の代わり）')
+    parser.add_argument('--from', dest='start', type=datetime.date.fromisoformat)
+    parser.add_argument('--to', dest='end', type=datetime.date.fromisoformat)
+    parser.add_argument('--raw-dir', help='生明細フォルダ（既定はソース定義の raw_dir）')
+    parser.add_argument('--no-cache', action='store_true', help='生明細のパースキャッシュを使わない')
+    parser.add_argument('--no-journal', action='store_true', help='BQ journal_entries との突合を省略')
+    parser.add_argument('--detail', type=int, default=MAX_DETAIL, help='差異の表示件数')
+    args = parser.parse_args()
+    start, end = args.start, args.end
+    if args.year:
+        start, end = datetime.date(args.year, 1, 1), datetime.date(args.year, 12, 31)
+
+    src = get_source(args.source)
+    results = reconcile(src, start, end, args.raw_dir, not args.no_cache, not args.no_journal)
+    period = f'{start or ""}〜{end or ""}' if start or end else '全期間'
+    if results['raw_noco']:
+        print_comparison(f'{src["name"]}: 生明細 ↔ NocoDB（{period}）', results['raw_noco'], '生明細', 'NocoDB',
+                         args.detail)
+    if results['noco_journal']:
+        print_comparison(f'{src["name"]}: NocoDB ↔ journal_entries（{period}）', results['noco_journal'],
+                         'NocoDB', 'BQ', args.detail)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+スケジュールクエリのデプロイ（scheduled_queries/*.sql → BigQuery Data Transfer の転送設定）
+
+SQL ファイルが唯一の定義。各ファイル先頭のコメントヘッダから設定を読み、既存の転送設定を1回だけ
+一覧取得して突き合わせる:
+  - 対応する設定がない → 作成
+  - SQL（ハッシュ）・スケジュール・表示名・宛先・有効/無効が違う → その項目だけ update_mask で更新
+  - 同じ → 何もしない（何度実行しても同じ結果）
+  - 同じクエリの設定が複数ある（旧 create_scheduled_queries.py / tmp/create_settlement_sq.py を
+    複数回実行してできた重複）→ 1つを残して削除（重複は並行して実行・課金される）
+既定は計画の表示だけ。--apply で反映する。
+
+ヘッダ（"-- キー: 値"。Scheduled Query と Schedule は必須）:
+  -- Scheduled Query: fact_daily_asin                      識別名（ファイル名と同じ）
+  -- Display name: EC Analytics: fact_daily_asin ...        既存設定との対応付け（省略時は識別名）
+  -- Schedule: every day 17:00 (= 毎日 02:00 JST)           UTC の BQ スケジュール構文（括弧以降は注記）
+  -- Destination dataset: analytics
+  -- Destination table: fact_x                              CREATE OR REPLACE ではなく SELECT だけのクエリのとき
+  -- Write disposition: WRITE_TRUNCATE                      同上
+  -- Transfer Config: projects/.../transferConfigs/...      既存設定を名前で固定する（重複時にこれを残す）
+  -- Disabled: true                                         無効（disabled）の状態で登録・維持する。
+                                                           scripts/pipeline_dag.py が実行するクエリに付ける
+                                                           （--apply しても固定時刻では動かない。削除ではないので
+                                                           再作成もされない。省略時は有効）
+対応付けは Transfer Config → Display name の順。どの SQL ファイルにも対応しない設定は表示のみで触らない。
+
+実行: uv run --with google-cloud-bigquery-datatransfer python scripts/scheduled_query_deploy.py
+      uv run --with google-cloud-bigquery-datatransfer python scripts/scheduled_query_deploy.py --apply
+      uv run --with google-cloud-bigquery-datatransfer python scripts/scheduled_query_deploy.py fact_daily_asin --apply
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import hashlib
+import re
+from pathlib import Path
+
+SQL_DIR = Path(__file__).resolve().parent.parent / 'scheduled_queries'
+LOCATION = 'us-central1'
+DATA_SOURCE = 'scheduled_query'
+
+HEADER_PATTERN = re.compile(r'^--\s*([A-Z][A-Za-z ]*?)\s*:\s*(.+?)\s*$')
+HEADER_KEYS = {
+    'Scheduled Query': 'name', 'Display name': 'display_name', 'Schedule': 'schedule',
+    'Destination dataset': 'dataset', 'Destination table': 'table', 'Write disposition': 'write_disposition',
+    'Transfer Config': 'config_name', 'Disabled': 'disabled',
+}
+TRUE_VALUES = ('true', 'yes', '1')
+
+
+# ---------- SQL ファイル ----------
+
+def sql_hash(text):
+    """改行コード・行末の空白の違いは同じ SQL とみなす"""
+    normalized = '\n'.join(line.rstrip() for line in text.replace('\r\n', '\n').strip().split('\n'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def parse_header(text):
+    """先頭のコメント行から {HEADER_KEYS の値: 値}"""
+    meta = {}
+    for line in text.splitlines():
+        if not line.startswith('--'):
+            if line.strip():
+                break
+            continue
+        m = HEADER_PATTERN.match(line)
+        if m and m[1] in HEADER_KEYS:
+            meta[HEADER_KEYS[m[1]]] = m[2]
+    return meta
+
+
+def load_spec(path):
+    text = Path(path).read_text(encoding='utf-8')
+    meta = parse_header(text)
+    missing = [k for k in ('name', 'schedule') if k not in meta]
+    if missing:
+        raise ValueError(f'{Path(path).name}: ヘッダに {missing} がありません')
+    params = {'query': text}
+    if meta.get('table'):
+        params['destination_table_name_template'] = meta['table']
+        params['write_disposition'] = meta.get('write_disposition', 'WRITE_TRUNCATE')
+    return {
+        'file': Path(path).name,
+        'name': meta['name'],
+        'disabled': re.sub(r'\s*[(（].*$', '', meta.get('disabled', '')).lower() in TRUE_VALUES,
+        'display_name': meta.get('display_name', meta['name']),
+        'schedule': re.sub(r'\s*[(（].*$', '', meta['schedule']),
+        'dataset': meta.get('dataset', ''),
+        'config_name': meta.get('config_name'),
+        'params': params,
+    }
+
+
+def load_specs(names=None):
+    specs = [load_spec(p) for p in sorted(SQL_DIR.glob('*.sql'))]
+    if names:
+        unknown = set(names) - {s['name'] for s in specs}
+        if unknown:
+            raise ValueError(f'SQL ファイルがありません: {sorted(unknown)}')
+        specs = [s for s in specs if s['name'] in names]
+    return specs
+
+
+# ---------- 既存設定との差分 ----------
+
+def config_params(cfg):
+    return {k: v for k, v in (cfg.params or {}).items()}
+
+
+def diff_fields(spec, cfg):
+    """更新が必要な項目（update_mask のパス）"""
+    fields = []
+    if cfg.display_name != spec['display_name']:
+        fields.append('display_name')
+    if cfg.schedule != spec['schedule']:
+        fields.append('schedule')
+    if (cfg.destination_dataset_id or '') != spec['dataset']:
+        fields.append('destination_dataset_id')
+    if bool(cfg.disabled) != spec['disabled']:
+        fields.append('disabled')
+    current = config_params(cfg)
+    if (sql_hash(current.get('query', '')) != sql_hash(spec['params']['query'])
+            or {k: v for k, v in current.items() if k != 'query'}
+            != {k: v for k, v in spec['params'].items() if k != 'query'}):
+        fields.append('params')
+    return fields
+
+
+def plan(specs, configs):
+    """[(操作, spec, 設定, 内容)]。操作は create / update / ok / delete / unmanaged"""
+    actions, claimed = [], set()
+    for spec in specs:
+        matches = [c for c in configs if spec['config_name'] and c.name == spec['config_name']]
+        matches += [c for c in configs if c.display_name == spec['display_name'] and c not in matches]
+        if not matches:
+            actions.append(('create', spec, None, []))
+            continue
+        # 残すのは Transfer Config で指定したもの、なければ最後に更新されたもの
+        keep = matches[0] if spec['config_name'] and matches[0].name == spec['config_name'] else \
+            max(matches, key=lambda c: c.update_time.timestamp() if c.update_time else 0)
+        fields = diff_fields(spec, keep)
+        actions.append(('update' if fields else 'ok', spec, keep, fields))
+        for c in matches:
+            claimed.add(c.name)
+            if c is not keep:
+                actions.append(('delete', spec, c, ['重複']))
+    actions += [('unmanaged', None, c, []) for c in configs if c.name not in claimed]
+    return actions
+
+
+def print_plan(actions):
+    marks = {'create': '+', 'update': '~', 'ok': '=', 'delete': '-', 'unmanaged': '?'}
+    for action, spec, cfg, detail in actions:
+        label = spec['file'] if spec else cfg.display_name
+        target = f' → {cfg.name.rsplit("/", 1)[-1]}' if cfg else ''
+        if action == 'create':
+            note = f"新規作成（{spec['schedule']}{'・無効' if spec['disabled'] else ''}）"
+        elif action == 'update':
+            note = f"更新: {', '.join(detail)}"
+            if 'params' in detail:
+                note += f"（SQL {sql_hash(config_params(cfg).get('query', ''))[:12]} → {sql_hash(spec['params']['query'])[:12]}）"
+        elif action == 'ok':
+            note = '変更なし（無効）' if spec['disabled'] else '変更なし'
+        elif action == 'delete':
+            note = f"削除（重複。{cfg.display_name} / {cfg.schedule}）"
+        else:
+            note = f'SQL ファイルなし（変更しない。{cfg.schedule}）'
+        print(f'  {marks[action]} {label}{target}: {note}')
+
+
+# ---------- 反映 ----------
+
+def apply_plan(client, parent, actions):
+    from google.cloud import bigquery_datatransfer_v1
+    from google.protobuf import field_mask_pb2, struct_pb2
+
+    def struct(params):
+        s = struct_pb2.Struct()
+        s.update(params)
+        return s
+
+    for action, spec, cfg, fields in actions:
+        if action == 'create':
+            created = client.create_transfer_config(parent=parent, transfer_config=bigquery_datatransfer_v1.TransferConfig(
+                display_name=spec['display_name'],
+                data_source_id=DATA_SOURCE,
+                destination_dataset_id=spec['dataset'],
+                schedule=spec['schedule'],
+                disabled=spec['disabled'],
+                params=struct(spec['params']),
+            ))
+            print(f"  作成: {spec['file']} → {created.name}")
+        elif action == 'update':
+            cfg.display_name = spec['display_name']
+            cfg.schedule = spec['schedule']
+            cfg.destination_dataset_id = spec['dataset']
+            cfg.disabled = spec['disabled']
+            cfg.params = struct(spec['params'])
+            client.update_transfer_config(transfer_config=cfg, update_mask=field_mask_pb2.FieldMask(paths=fields))
+            print(f"  更新: {spec['file']} → {cfg.name}（{', '.join(fields)}）")
+        elif action == 'delete':
+            client.delete_transfer_config(name=cfg.name)
+            print(f"  削除: {cfg.name}（{spec['file']} の重複）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='scheduled_queries/*.sql をスケジュールクエリに反映する')
+    parser.add_argument('names', nargs='*', help='対象の Scheduled Query 名（省略時はすべて）')
+    parser.add_argument('--apply', action='store_true', help='計画を反映する（省略時は表示のみ）')
+    args = parser.parse_args()
+
+    import google.auth
+    from google.cloud import bigquery_datatransfer_v1
+    specs = load_specs(args.names)
+    credentials, project = google.auth.default()
+    client = bigquery_datatransfer_v1.DataTransferServiceClient(credentials=credentials)
+    parent = f"projects/{project}/locations/{LOCATION}"
+    configs = list(client.list_transfer_configs(request={'parent': parent, 'data_source_ids': [DATA_SOURCE]}))
+    actions = plan(specs, configs)
+    if args.names:  # 対象を絞ったときは他の設定を「SQL ファイルなし」と表示しない
+        actions = [a for a in actions if a[0] != 'unmanaged']
+    print(f'=== スケジュールクエリ {len(specs)} 件 / 既存の転送設定 {len(configs)} 件 ===')
+    print_plan(actions)
+    if not any(a[0] in ('create', 'update', 'delete') for a in actions):
+        print('\n変更なし')
+        return
+    if not args.apply:
+        print('\n反映するには --apply を付けて実行')
+        return
+    print()
+    apply_plan(client, parent, actions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+明細の一括・冪等インポート（生明細 → NocoDB SQLite）
+
+各行の自然キー（日付, 時刻, 金額, 残高, 摘要 + 同じキー内の通し番号）の SHA-256 を列 "取込キー" に持ち、
+その列のユニークインデックスに対して
+  INSERT ... ON CONFLICT("取込キー") DO NOTHING
+を executemany で1トランザクションにまとめて流す。同じファイル・重なった期間を何度取り込んでも
+既存行はスキップされるので、1年分の明細をまとめて再実行できる。
+旧 tmp/import_paypay_202502.py・import_rakuten_personal.py の「MAX(id) を見て1行ずつ INSERT」
+「既に同期間のデータがあれば中止」の置き換え。
+
+  - 時刻・残高がない明細（カード）は空欄としてキーに含める。同日・同額・同摘要の利用が2回あるときは
+    通し番号（そのファイルの中で何件目か）で区別する。ファイルごとに数えるので、期間の重なったファイルを
+    一緒に取り込んでも同じ行が2件目扱いにならない
+  - "取込キー" 列がないテーブルには初回に列を追加し、既存行のキーを同じ規則（id 順の通し番号）で埋めて
+    からインデックスを作る。手入力済みの行と同じ明細は取り込まれない
+  - NocoDB の画面に "取込キー" 列を出すには NocoDB 側でメタ同期（Sync Metadata）する
+
+ターゲット（TARGETS に追加すれば他の明細も取り込める。name は statement_ingest.py の形式名）:
+  paypay_bank / rakuten_bank / ntt_mylink
+
+使い方（CSV 以外の明細も import_rows に行を渡せば同じ方式で取り込める）:
+    from statement_import import import_rows
+    inserted = import_rows(conn, table, key_columns, rows)      # rows: [{列名: 値}]
+
+実行: python scripts/statement_import.py paypay_bank C:/Users/ninni/projects/rawdata/paypay銀行 --dry-run
+      python scripts/statement_import.py rakuten_bank 2025_01.csv 2025_02.csv
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import datetime
+import hashlib
+import sqlite3
+from collections import Counter
+from pathlib import Path
+from statement_ingest import iter_records, parse_date
+
+NOCO_DB_PATH = 'C:/Users/ninni/nocodb/noco.db'
+KEY_COLUMN = '取込キー'
+KEY_FIELDS = ('date', 'time', 'amount', 'balance', 'description')
+
+
+# ---------- ターゲット定義 ----------
+# columns: {NocoDB 列名: レコード（statement_ingest の dict）→ 値}
+# key: {自然キーの項目: NocoDB 列名}（KEY_FIELDS のうち該当する列がない項目は空欄扱い）
+TARGETS = [
+    {
+        'name': 'paypay_bank',
+        'table': 'nc_opau___PayPay銀行入出金明細',
+        'columns': {
+            '操作日': lambda r: r['date'].isoformat(), '操作時刻': lambda r: r['time'],
+            '摘要': lambda r: r['description'], 'お預かり金額': lambda r: r['amount'],
+            '残高': lambda r: r['balance'], 'メモ': lambda r: r['memo'],
+        },
+        'key': {'date': '操作日', 'time': '操作時刻', 'amount': 'お預かり金額', 'balance': '残高',
+                'description': '摘要'},
+    },
+    {
+        'name': 'rakuten_bank',
+        'table': 'nc_opau___楽天銀行ビジネス口座入出金明細',
+        'columns': {
+            '取引日': lambda r: r['date'].isoformat(), '入出金_円_': lambda r: r['amount'],
+            '入出金先内容': lambda r: r['description'], '残高_円_': lambda r: r['balance'],
+        },
+        'key': {'date': '取引日', 'amount': '入出金_円_', 'balance': '残高_円_', 'description': '入出金先内容'},
+    },
+    {
+        'name': 'ntt_mylink',
+        'table': 'nc_opau___NTTファイナンスBizカード明細',
+        # NocoDB 側は利用をマイナスで持つ
+        'columns': {
+            '利用日': lambda r: r['date'].isoformat(), 'ご利用加盟店': lambda r: r['description'],
+            'ご利用金額': lambda r: -r['amount'],
+        },
+        'key': {'date': '利用日', 'amount': 'ご利用金額', 'description': 'ご利用加盟店'},
+    },
+]
+
+
+def get_target(name):
+    for target in TARGETS:
+        if target['name'] == name:
+            return target
+    raise ValueError(f"未知のターゲット: {name}（{', '.join(t['name'] for t in TARGETS)}）")
+
+
+# ---------- 自然キー ----------
+
+def _norm_date(value):
+    if isinstance(value, str) and len(value) == 10 and value[4] == '-' and value[7] == '-':
+        return value
+    date = parse_date(str(value))
+    return date.isoformat() if date else str(value).strip()
+
+
+def _norm_int(value):
+    if isinstance(value, int):
+        return str(value)
+    try:
+        return str(int(float(str(value).replace(',', ''))))
+    except ValueError:
+        return str(value).strip()
+
+
+def _norm_time(value):
+    parts = str(value).strip().split(':')
+    return ':'.join(f'{int(p):02d}' for p in parts) if all(p.isdigit() for p in parts) else str(value).strip()
+
+
+# DB に入っている値と CSV から作った値が同じ文字列になるように揃える
+_NORMALIZE = {'date': _norm_date, 'time': _norm_time, 'amount': _norm_int, 'balance': _norm_int,
+              'description': lambda v: str(v).strip()}
+
+
+def natural_keys(rows, key_columns):
+    """rows（{列名: 値}）の取込キーを順に返す。同じ自然キーの n 件目には n を付けて区別する"""
+    fields = [(key_columns.get(f), _NORMALIZE[f]) for f in KEY_FIELDS]
+    seen = Counter()
+    for row in rows:
+        parts = []
+        for column, norm in fields:
+            value = row.get(column) if column else None
+            parts.append('' if value is None or value == '' else norm(value))
+        natural = '\x1f'.join(parts)
+        n = seen[natural]
+        seen[natural] += 1
+        yield hashlib.sha256(f'{natural}\x1f{n}'.encode('utf-8')).hexdigest()
+
+
+def ensure_key_index(conn, table, key_columns):
+    """"取込キー" 列とユニークインデックスを用意する（既存行のキーは id 順の通し番号で埋める）"""
+    columns = [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+    if not columns:
+        raise ValueError(f'テーブルがありません: {table}')
+    if KEY_COLUMN not in columns:
+        conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{KEY_COLUMN}" TEXT')
+    elif not conn.execute(f'SELECT 1 FROM "{table}" WHERE "{KEY_COLUMN}" IS NULL LIMIT 1').fetchone():
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}__{KEY_COLUMN}" ON "{table}" ("{KEY_COLUMN}")')
+        return
+    fields = list(key_columns.values())
+    select = ', '.join(f'"{c}"' for c in fields)
+    rows = conn.execute(f'SELECT id, "{KEY_COLUMN}", {select} FROM "{table}" ORDER BY id').fetchall()
+    keys = natural_keys([dict(zip(fields, r[2:])) for r in rows], key_columns)
+    missing = [(key, r[0]) for r, key in zip(rows, keys) if r[1] is None]
+    if missing:
+        conn.executemany(f'UPDATE "{table}" SET "{KEY_COLUMN}" = ? WHERE id = ?', missing)
+        print(f'  既存行の取込キーを設定: {len(missing):,}件')
+    conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table}__{KEY_COLUMN}" ON "{table}" ("{KEY_COLUMN}")')
+
+
+def import_rows(conn, table, key_columns, rows, dry_run=False, keys=None):
+    """rows（{列名: 値} のリスト）を1トランザクションで取り込み、新規に入った件数を返す。
+    keys を省略すると rows 全体を1ファイルとみなして natural_keys で作る。
+    dry_run なら最後にロールバックする（列追加・既存行のキー設定も含めて元に戻る）"""
+    rows = list(rows)
+    keys = list(keys) if keys is not None else list(natural_keys(rows, key_columns))
+    if not rows:
+        return 0
+    own = not conn.in_transaction
+    if own:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        ensure_key_index(conn, table, key_columns)
+        columns = list(rows[0])
+        now = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S+00:00')
+        names = ', '.join(f'"{c}"' for c in columns)
+        sql = f'''
+            INSERT INTO "{table}" (created_at, updated_at, nc_order, "{KEY_COLUMN}", {names})
+            VALUES (?, ?, ?, ?, {', '.join('?' * len(columns))})
+            ON CONFLICT("{KEY_COLUMN}") DO NOTHING'''
+        # nc_order は既存の最大値の続き（スキップされた行の分は欠番になるが並び順には影響しない）
+        start = conn.execute(f'SELECT COALESCE(MAX(nc_order), 0) FROM "{table}"').fetchone()[0] + 1
+        before = conn.total_changes
+        conn.executemany(sql, ((now, now, float(start + i), key, *(row[c] for c in columns))
+                               for i, (row, key) in enumerate(zip(rows, keys))))
+        inserted = conn.total_changes - before
+    except BaseException:
+        if own:
+            conn.rollback()
+        raise
+    if own and dry_run:
+        conn.rollback()
+    elif own:
+        conn.commit()
+    return inserted
+
+
+def import_statements(conn, target, paths, dry_run=False):
+    """生明細ファイル群を statement_ingest で読み、ターゲットのテーブルに取り込む。(読んだ件数, 新規件数)"""
+    rows, keys = [], []
+    for path in paths:
+        file_rows = [{col: get(r) for col, get in target['columns'].items()}
+                     for r in iter_records(path, target['name'])]
+        print(f'  {Path(path).name}: {len(file_rows):,}件')
+        rows += file_rows
+        keys += natural_keys(file_rows, target['key'])
+    return len(rows), import_rows(conn, target['table'], target['key'], rows, dry_run, keys)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生明細を NocoDB SQLite に一括・冪等に取り込む')
+    parser.add_argument('target', choices=[t['name'] for t in TARGETS], help='明細の種類')
+    parser.add_argument('paths', nargs='+', help='CSV ファイルまたはフォルダ（フォルダは *.csv を名前順）')
+    parser.add_argument('--db', default=NOCO_DB_PATH, help='noco.db のパス')
+    parser.add_argument('--dry-run', action='store_true', help='件数だけ確認して書き込まない')
+    args = parser.parse_args()
+
+    target = get_target(args.target)
+    paths = []
+    for arg in args.paths:
+        p = Path(arg)
+        paths.extend(sorted(p.glob('*.csv')) if p.is_dir() else [p])
+    print(f"{target['table']} ← {len(paths)}ファイル{'（dry-run）' if args.dry_run else ''}")
+    conn = sqlite3.connect(args.db)
+    try:
+        total, inserted = import_statements(conn, target, paths, args.dry_run)
+    finally:
+        conn.close()
+    print(f'\n読込 {total:,}件 / 新規 {inserted:,}件 / 既存スキップ {total - inserted:,}件'
+          + ('（dry-run: 書き込みなし）' if args.dry_run else ''))
+    if inserted and not args.dry_run:
+        print('次のステップ: BQ sync → 月次監査（python scripts/audit_checks.py）')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+生明細ファイルの共通読み込み（ストリーミング + 文字コード・形式の自動判定）
+
+iter_records(path) はファイルを1回だけ先頭から読み、1行ずつ型付きのレコード（dict）を返す:
+  {'date': date, 'amount': int, 'description': str, 'ref': 'ファイル名:行番号', ...形式ごとの追加列}
+金額の符号: カードは利用がプラス、銀行は入金がプラス、セールモンスターは販売売上がプラス
+
+判定:
+  - 文字コード: 先頭 HEAD_BYTES バイトで BOM → utf-8-sig / UTF-8 として読めれば utf-8 / それ以外 cp932
+  - 形式: 1行目（ヘッダ）の列名で FORMATS から決める
+  - 判定結果は tmp/statement_formats.json に「先頭 HEAD_BYTES バイト + ファイルサイズ」のハッシュをキーに保存し、
+    同じファイルの2回目以降は試行デコードなしで読む（ファイル全体を2回読まないよう先頭だけでハッシュする）
+
+形式（FORMATS に追加すれば他の明細も読める）:
+  ntt_mylink     NTTファイナンスBizカード MYLINK CSV（簡易形式 UTF-8 / 詳細形式 cp932）
+  paypay_bank    PayPay銀行 入出金明細 CSV
+  rakuten_bank   楽天銀行ビジネス口座 入出金明細 CSV
+  sale_monster   セールモンスター売上レポート CSV
+
+使い方:
+    from statement_ingest import iter_records, iter_dir
+    for rec in iter_records(path, 'paypay_bank'):     # 形式が違えば ValueError
+        ...
+    total = sum(r['amount'] for r in iter_dir(raw_dir, 'MYLINK_*.csv', 'ntt_mylink'))
+
+実行: python scripts/statement_ingest.py <ファイルまたはフォルダ>...   判定結果と件数・合計を表示
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import codecs
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import re
+from pathlib import Path
+
+HEAD_BYTES = 64 * 1024
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmp', 'statement_formats.json')
+
+
+DATE_PATTERN = re.compile(r'^(\d{4})[-/](\d{1,2})[-/](\d{1,2})')
+
+
+def parse_date(value):
+    """2024-03-01 / 2024/3/1 / 20240301 → date（日付でなければ None）"""
+    value = value.strip().strip('"')
+    try:
+        if len(value) == 8 and value.isdigit():
+            return datetime.date(int(value[:4]), int(value[4:6]), int(value[6:]))
+        m = DATE_PATTERN.match(value)
+        return datetime.date(int(m[1]), int(m[2]), int(m[3])) if m else None
+    except ValueError:
+        return None
+
+
+def parse_int(value):
+    value = (value or '').strip().strip('"').replace(',', '')
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+# ---------- 形式ごとのレコード化（row: 列のリスト, col: {列名: 位置}） ----------
+
+def _get(row, col, name):
+    i = col.get(name)
+    return row[i].strip().strip('"') if i is not None and i < len(row) else ''
+
+
+def mylink_record(row, col):
+    """利用日,加盟店名,利用区分,利用金額。加盟店名にクォートなしのカンマがある行
+    （NOTION LABS, INC. など）は金額列を右にずらして読む"""
+    if len(row) < 4 or not (date := parse_date(row[0])):
+        return None
+    for extra in range(len(row) - 3):
+        amount = parse_int(row[3 + extra])
+        if amount is not None:
+            return {'date': date, 'amount': amount, 'description': ','.join(row[1:2 + extra]).strip()}
+    return None
+
+
+def paypay_record(row, col):
+    try:
+        date = datetime.date(int(_get(row, col, '操作日(年)')), int(_get(row, col, '操作日(月)')),
+                             int(_get(row, col, '操作日(日)')))
+    except ValueError:
+        return None
+    received, paid = parse_int(_get(row, col, 'お預り金額')), parse_int(_get(row, col, 'お支払金額'))
+    clock = [_get(row, col, f'操作時刻({u})') for u in ('時', '分', '秒')]
+    return {
+        'date': date,
+        'amount': received if received is not None else -(paid or 0),
+        'description': _get(row, col, '摘要'),
+        'time': ':'.join(f'{int(v):02d}' for v in clock) if all(v.isdigit() for v in clock) else None,
+        'balance': parse_int(_get(row, col, '残高')),
+        'memo': _get(row, col, 'メモ') or None,
+    }
+
+
+def rakuten_bank_record(row, col):
+    date, amount = parse_date(_get(row, col, '取引日')), parse_int(_get(row, col, '入出金(円)'))
+    if not date or amount is None:
+        return None
+    return {'date': date, 'amount': amount, 'description': _get(row, col, '入出金先内容'),
+            'balance': parse_int(_get(row, col, '残高(円)'))}
+
+
+def sale_monster_record(row, col):
+    date, amount = parse_date(_get(row, col, '売上日')), parse_int(_get(row, col, '税込合計金額(円)'))
+    if not date or amount is None:
+        return None
+    category, mall = _get(row, col, '売上区分名'), _get(row, col, 'モール名')
+    return {'date': date, 'amount': abs(amount) if category == '販売売上' else -abs(amount),
+            'description': f'{mall} {category}'.strip(), 'category': category, 'mall': mall}
+
+
+# header: ヘッダ行の列名リスト → この形式か
+FORMATS = [
+    {'name': 'ntt_mylink', 'record': mylink_record,
+     'header': lambda h: bool(h) and (h[0].startswith('利用日') or h[0].startswith('カード名義')
+                                      or any('NTTファイナンス' in c for c in h))},
+    {'name': 'paypay_bank', 'record': paypay_record,
+     'header': lambda h: '操作日(年)' in h and 'お預り金額' in h},
+    {'name': 'rakuten_bank', 'record': rakuten_bank_record,
+     'header': lambda h: '取引日' in h and '入出金(円)' in h},
+    {'name': 'sale_monster', 'record': sale_monster_record,
+     'header': lambda h: '売上日' in h and '税込合計金額(円)' in h},
+]
+_BY_NAME = {f['name']: f for f in FORMATS}
+
+
+def detect_encoding(head):
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)  # 末尾で切れた文字は許容
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp932'
+
+
+def detect_format(header):
+    header = [h.strip().strip('"') for h in header]
+    for fmt in FORMATS:
+        if fmt['header'](header):
+            return fmt['name']
+    return None
+
+
+class FormatCache:
+    """{先頭ハッシュ: {'encoding', 'format'}} を JSON で保持"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.data = None
+
+    def _load(self):
+        if self.data is None:
+            self.data = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding='utf-8') as f:
+                    self.data = json.load(f)
+
+    def get(self, key):
+        self._load()
+        return self.data.get(key)
+
+    def put(self, key, value):
+        self._load()
+        self.data[key] = value
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=1)
+
+
+_cache = FormatCache()
+
+
+def fingerprint(head, size):
+    return hashlib.sha256(head + str(size).encode()).hexdigest()
+
+
+def detect(path, cache=_cache):
+    """(encoding, format名) を返す。判定できない形式は format=None"""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        head = f.read(HEAD_BYTES)
+    key = fingerprint(head, path.stat().st_size)
+    hit = cache.get(key) if cache else None
+    if hit:
+        return hit['encoding'], hit['format']
+    encoding = detect_encoding(head)
+    first_line = head.split(b'\n', 1)[0].decode(encoding, errors='replace')
+    fmt = detect_format(next(csv.reader([first_line]), []))
+    if cache and fmt:
+        cache.put(key, {'encoding': encoding, 'format': fmt, 'file': path.name})
+    return encoding, fmt
+
+
+def iter_records(path, expected=None, cache=_cache):
+    """1ファイルのレコードを先頭から順に返す（ファイル全体をメモリに載せない）"""
+    path = Path(path)
+    encoding, fmt = detect(path, cache)
+    if fmt is None:
+        raise ValueError(f'{path}: 明細の形式を判定できません')
+    if expected and fmt != expected:
+        raise ValueError(f'{path}: {expected} を想定したが {fmt} 形式でした')
+    record = _BY_NAME[fmt]['record']
+    with open(path, 'rb') as raw:
+        reader = csv.reader(io.TextIOWrapper(raw, encoding=encoding, newline=''))
+        header = [h.strip().strip('"') for h in next(reader, [])]
+        col = {name: i for i, name in enumerate(header)}
+        for row in reader:
+            rec = record(row, col) if row else None
+            if rec:
+                rec['ref'] = f'{path.name}:{reader.line_num}'
+                yield rec
+
+
+def iter_dir(directory, pattern='*.csv', expected=None, cache=_cache):
+    """フォルダ内のファイル（名前順）のレコードを続けて返す"""
+    for path in sorted(Path(directory).glob(pattern)):
+        yield from iter_records(path, expected, cache)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    paths = []
+    for arg in sys.argv[1:]:
+        p = Path(arg)
+        paths.extend(sorted(p.glob('*.csv')) if p.is_dir() else [p])
+    for path in paths:
+        encoding, fmt = detect(path)
+        if fmt is None:
+            print(f'  {path.name}: 形式不明（{encoding}）')
+            continue
+        count = total = 0
+        for rec in iter_records(path):
+            count += 1
+            total += rec['amount']
+        print(f'  {path.name}: {fmt}（{encoding}）{count}件 合計 {total:,}円')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+部分和ソルバー（突合差額の内訳探索）
+
+「差額 X 円はどの明細の組み合わせか」を求める。旧 tmp/ntt_13000_breakdown.py の
+itertools.combinations 総当たり（2^n）を置き換える。
+
+  - どちらの方式も件数 k = 1, 2, ... の順に探し、件数の少ない解から limit 組見つけた時点で止める
+    （任意の解を打ち切りまで集めてから並べ替えるのではないので、少ない件数の解を取りこぼさない）
+  - 件数が MITM_MAX_ITEMS 以下: 半分全列挙（meet-in-the-middle）。2^(n/2) 個の部分和を2組作り、
+    片方を (合計, 件数) の辞書に入れてもう片方から (target - s, k - 件数) を引く
+  - それより多い: 件数別の金額 DP。先頭 i 件からちょうど k 件で作れる合計を Python の int をビット集合として持ち
+    （マイナス金額はオフセットで吸収）、target から逆向きに辿って組み合わせを復元する
+  - within() で日付窓に入る明細だけに絞ってから解くと、候補が数十件に収まり実質即時
+
+使い方:
+    from subset_sum import find_subsets, within
+    items = within(charges, date(2025, 3, 1), date(2025, 3, 31), days=5)
+    for combo in find_subsets([c['amount'] for c in items], 13_000):
+        print([items[i] for i in combo])
+"""
+import datetime
+
+MITM_MAX_ITEMS = 36
+MAX_SOLUTIONS = 5
+
+
+def within(items, start, end, days=0, date_key='date'):
+    """date_key の日付が [start - days, end + days] に入る明細だけを返す"""
+    lo = start - datetime.timedelta(days=days)
+    hi = end + datetime.timedelta(days=days)
+    return [it for it in items if it[date_key] is not None and lo <= it[date_key] <= hi]
+
+
+def _subset_sums(amounts, offset):
+    """amounts の全部分和 [(合計, ビットマスク)]。ビット位置は offset からの通し番号"""
+    sums = [(0, 0)]
+    for i, a in enumerate(amounts):
+        bit = 1 << (offset + i)
+        sums += [(s + a, m | bit) for s, m in sums]
+    return sums
+
+
+def _meet_in_the_middle(amounts, target, limit):
+    """件数 k = 1, 2, ... の順に、左半分 k - c 件 + 右半分 c 件 の組み合わせを探す"""
+    half = len(amounts) // 2
+    left = {}
+    for s, m in _subset_sums(amounts[:half], 0):
+        left.setdefault((s, m.bit_count()), []).append(m)
+    right = [[] for _ in range(len(amounts) - half + 1)]
+    for s, m in _subset_sums(amounts[half:], half):
+        right[m.bit_count()].append((s, m))
+    found = []
+    for k in range(1, len(amounts) + 1):
+        for c in range(max(0, k - half), min(k, len(right) - 1) + 1):
+            for s, m in right[c]:
+                for lm in left.get((target - s, k - c), ()):
+                    found.append(lm | m)
+                    if len(found) >= limit:
+                        return found
+    return found
+
+
+def _dp(amounts, target, limit):
+    """件数別の金額 DP。layers[k][i] = 先頭 i 件からちょうど k 件選んで作れる（target に届きうる）合計の集合"""
+    n = len(amounts)
+    offset = sum(-a for a in amounts if a < 0)
+    width = offset + sum(a for a in amounts if a > 0)
+    if not 0 <= target + offset <= width:
+        return []
+    # 残りの明細で埋められる範囲 [target - 残りのプラス合計, target + 残りのマイナス合計] 以外の合計は捨てる
+    pos_rest, neg_rest = [0] * (n + 1), [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        pos_rest[i] = pos_rest[i + 1] + max(amounts[i], 0)
+        neg_rest[i] = neg_rest[i + 1] + max(-amounts[i], 0)
+    windows = []
+    for i in range(n + 1):
+        lo = max(target - pos_rest[i] + offset, 0)
+        hi = min(target + neg_rest[i] + offset, width)
+        windows.append((1 << (hi + 1)) - (1 << lo) if lo <= hi else 0)
+
+    def has(bits, value):
+        return value + offset >= 0 and bits >> (value + offset) & 1
+
+    layers = [[(1 << offset) & w for w in windows]]
+    found = []
+    for k in range(1, n + 1):
+        prev, layer = layers[-1], [0]
+        for i, a in enumerate(amounts, 1):
+            shifted = prev[i - 1] << a if a >= 0 else prev[i - 1] >> -a
+            layer.append((layer[-1] | shifted) & windows[i])
+        if not any(layer):
+            break  # k 件で作れる合計がなければ k + 1 件以上も作れない
+        layers.append(layer)
+        if not has(layer[n], target):
+            continue
+        # 辿る枝はすべて解に行き着くので、見つけた解の数に比例した手間で列挙できる
+        stack = [(n, target, k, 0)]
+        while stack:
+            i, rest, j, mask = stack.pop()
+            if i == 0:
+                found.append(mask)
+                if len(found) >= limit:
+                    return found
+                continue
+            a = amounts[i - 1]
+            if has(layers[j][i - 1], rest):
+                stack.append((i - 1, rest, j, mask))
+            if j and has(layers[j - 1][i - 1], rest - a):
+                stack.append((i - 1, rest - a, j - 1, mask | 1 << (i - 1)))
+    return found
+
+
+def find_subsets(amounts, target, limit=MAX_SOLUTIONS):
+    """合計が target になる amounts の添字の組（件数の少ない順に最大 limit 組）。空集合は返さない"""
+    idx = [i for i, a in enumerate(amounts) if a]
+    values = [amounts[i] for i in idx]
+    if not values or target == 0:
+        return []
+    solve = _meet_in_the_middle if len(values) <= MITM_MAX_ITEMS else _dp
+    masks = solve(values, target, limit)
+    combos = sorted({tuple(idx[k] for k in range(len(values)) if m >> k & 1) for m in masks if m},
+                    key=lambda c: (len(c), c))
+    return combos[:limit]
@@ -0,0 +1,138 @@
+"""
+VIEW デプロイハーネス（dry-run によるスキャン量チェック付き）
+
+deploy_view() は VIEW を置き換える前に:
+  1. 新しい VIEW SQL を dry-run（構文・参照エラーをデプロイ前に検出）
+  2. 下流の利用クエリ（P/L・BS・freee 同期・実体化テーブルの再構築など CONSUMER_QUERIES）を
+     現行定義と新定義の両方で dry-run し、スキャン量（bytes processed）を比較
+     新定義側は、対象 VIEW（および対象 VIEW を参照している VIEW）を新 SQL でインライン展開して評価する
+  3. いずれかのクエリのスキャン量が MAX_INCREASE_RATIO を超えて増えたらデプロイを中止
+     （MIN_ALERT_BYTES 未満の増加は誤差として無視。--force で強制デプロイ）
+
+使い方:
+    from view_deploy import deploy_view
+    if not deploy_view(client, 'main-project-477501.accounting.inventory_journal_view', sql,
+                       force='--force' in sys.argv):
+        sys.exit(1)
+"""
+import re
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+BQ_PROJECT = "main-project-477501"
+
+MAX_INCREASE_RATIO = 0.20
+MIN_ALERT_BYTES = 10 * 1024**2
+
+BS_ACCOUNTS = ("'楽天銀行','PayPay銀行','Amazon出品アカウント','未払金',"
+               "'THE直行便','ESPRIME','YP','セールモンスター','事業主借','開業費','商品'")
+
+# 下流の利用クエリ（journal_entries を直接・間接に読むもの）
+CONSUMER_QUERIES = {
+    'P/L（pl_journal_entries 年度別）': f"""
+        SELECT fiscal_year, SUM(pl_contribution) AS net_income
+        FROM `{BQ_PROJECT}.accounting.pl_journal_entries`
+        GROUP BY fiscal_year""",
+    'P/L 検証（BS科目除外）': f"""
+        SELECT fiscal_year,
+          SUM(CASE WHEN entry_side='credit' THEN amount_jpy ELSE -amount_jpy END) AS net_pl
+        FROM `{BQ_PROJECT}.accounting.journal_entries`
+        WHERE account_name NOT IN ({BS_ACCOUNTS})
+        GROUP BY 1""",
+    'BS 残高（科目別）': f"""
+        SELECT fiscal_year, account_name,
+          SUM(CASE WHEN entry_side='debit' THEN amount_jpy ELSE -amount_jpy END) AS balance
+        FROM `{BQ_PROJECT}.accounting.journal_entries`
+        WHERE account_name IN ({BS_ACCOUNTS})
+        GROUP BY 1, 2""",
+    'freee 同期（1年度取得）': f"""
+        SELECT source_table, source_id, journal_date, entry_side, account_name, amount_jpy, description
+        FROM `{BQ_PROJECT}.accounting.journal_entries`
+        WHERE fiscal_year = EXTRACT(YEAR FROM CURRENT_DATE())""",
+    'journal_entries_mat 全件再構築': f"""
+        SELECT * FROM `{BQ_PROJECT}.accounting.journal_entries`""",
+}
+
+TABLE_REF = re.compile(r"`(" + re.escape(BQ_PROJECT) + r"\.[\w-]+\.[\w-]+)`")
+
+
+def dry_run_bytes(client, sql):
+    job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    return client.query(sql, job_config=job_config).total_bytes_processed
+
+
+def inline_view(client, sql, view_id, view_sql, _cache=None):
+    """sql 内の view_id 参照を (view_sql) に置き換える。view_id を参照する中間 VIEW も再帰的に展開する"""
+    cache = {} if _cache is None else _cache
+
+    def expand(ref):
+        if ref == view_id:
+            return f"({view_sql})"
+        if ref not in cache:
+            cache[ref] = None
+            table = client.get_table(ref)
+            if table.table_type == 'VIEW':
+                expanded = inline_view(client, table.view_query, view_id, view_sql, cache)
+                if expanded != table.view_query:
+                    cache[ref] = f"({expanded})"
+        return cache[ref]
+
+    def replace(m):
+        return expand(m.group(1)) or m.group(0)
+
+    return TABLE_REF.sub(replace, sql)
+
+
+def cost_report(client, view_id, view_sql, consumers=None):
+    """[(クエリ名, 現行 bytes, 新定義 bytes)] を返す"""
+    consumers = CONSUMER_QUERIES if consumers is None else consumers
+    cache = {}
+    report = []
+    for name, sql in consumers.items():
+        new_sql = inline_view(client, sql, view_id, view_sql, cache)
+        if new_sql == sql:
+            continue  # 対象 VIEW を参照しないクエリ
+        current = dry_run_bytes(client, sql)
+        new = dry_run_bytes(client, new_sql)
+        report.append((name, current, new))
+    return report
+
+
+def print_report(report, max_increase=MAX_INCREASE_RATIO):
+    """スキャン量の比較を表示し、閾値を超えたクエリ名のリストを返す"""
+    regressions = []
+    print(f"  {'クエリ':<28} {'現行 MB':>10} {'新定義 MB':>10} {'増減':>8}")
+    for name, current, new in report:
+        ratio = (new - current) / current if current else 0.0
+        over = new - current > MIN_ALERT_BYTES and ratio > max_increase
+        mark = '  ✗' if over else ''
+        print(f"  {name:<28} {current / 1024**2:>10,.2f} {new / 1024**2:>10,.2f} {ratio:>+7.0%}{mark}")
+        if over:
+            regressions.append(name)
+    return regressions
+
+
+def deploy_view(client, view_id, view_sql, consumers=None, max_increase=MAX_INCREASE_RATIO, force=False):
+    """dry-run でスキャン量を比較してから VIEW を置き換える。デプロイしたら True"""
+    print(f'=== デプロイ前チェック: {view_id} ===')
+    view_bytes = dry_run_bytes(client, view_sql)
+    print(f'  新定義 dry-run OK: {view_bytes / 1024**2:,.2f} MB')
+
+    try:
+        client.get_table(view_id)
+        exists = True
+    except NotFound:
+        exists = False
+
+    if exists:
+        regressions = print_report(cost_report(client, view_id, view_sql, consumers), max_increase)
+        if regressions and not force:
+            print(f'  ✗ スキャン量が {max_increase:.0%} を超えて増加: {regressions}')
+            print('  デプロイを中止しました（意図した変更なら --force で再実行）')
+            return False
+        if regressions:
+            print('  ⚠ --force 指定のためスキャン量の増加を許容してデプロイ')
+
+    client.query(f"CREATE OR REPLACE VIEW `{view_id}` AS\n{view_sql}").result()
+    print('  VIEW 更新完了')
+    return True
@@ -0,0 +1,290 @@
+"""
+ローカル DuckDB レプリカ（warehouse-local モード）
+
+nocodb・accounting・analytics データセットを DuckDB ファイル（tmp/warehouse_local.duckdb）にスナップショットし、
+監査・what-if 分析を BQ コスト 0・ネットワークなしで実行する。
+
+スナップショット（snapshot）:
+  - テーブル: list_rows（tabledata 読み出し = クエリ課金なし）で Arrow 取得 → DuckDB テーブル
+    前回スナップショット時から last_modified が変わっていないテーブルはスキップ（--full で全件）
+  - 外部テーブル（VIEW が参照する sp_api_external など）: SELECT * で実体化（この分だけクエリ課金あり）
+  - VIEW（journal_entries・inventory_journal_view・settlement_journal_view など）:
+    BQ の VIEW 定義を取得し、sqlglot で BigQuery → DuckDB 方言に変換して DuckDB の VIEW として作成
+    VIEW が参照する他データセットのテーブルも合わせて取り込む
+  - BQ の `main-project-477501.{dataset}.{table}` は DuckDB の "{dataset}"."{table}"（スキーマ = データセット）
+  - タイムゾーンは BigQuery と同じ UTC（DATE(timestamp) などが PC のローカル時刻でずれないよう、接続・カーソルごとに設定）
+
+既存スクリプトからの利用（BQ 方言の SQL をそのまま DuckDB で実行）:
+    from warehouse_local import LocalClient
+    client = LocalClient() if '--local' in sys.argv else get_client()   # bq_client.get_client
+    for row in client.query(sql).result():   # row.column_name でアクセス（bigquery.Row 互換）
+
+実行: uv run --with google-cloud-bigquery --with duckdb --with sqlglot python scripts/warehouse_local.py snapshot [--full]
+      uv run ... python scripts/warehouse_local.py query "SELECT ... FROM `main-project-477501.accounting.journal_entries`"
+      uv run ... python scripts/warehouse_local.py status
+"""
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+import argparse
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import duckdb
+import sqlglot
+from bq_client import get_client, get_storage_client
+from view_deploy import TABLE_REF
+
+BQ_PROJECT = "main-project-477501"
+SNAPSHOT_DATASETS = ('nocodb', 'accounting', 'analytics')
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tmp', 'warehouse_local.duckdb')
+DOWNLOAD_CONCURRENCY = 4
+
+# sqlglot が正しく変換できない BigQuery 関数は DuckDB マクロで置き換える（スナップショット時に DB に作成）
+BQ_FUNCTION_MACROS = {
+    r'\bSAFE\.PARSE_DATE\(': ('bq_safe_parse_date(',
+                               'CREATE OR REPLACE MACRO bq_safe_parse_date(fmt, s) AS CAST(TRY_STRPTIME(s, fmt) AS DATE)'),
+    r'(?<![\w.])PARSE_DATE\(': ('bq_parse_date(',
+                                 'CREATE OR REPLACE MACRO bq_parse_date(fmt, s) AS CAST(STRPTIME(s, fmt) AS DATE)'),
+}
+
+
+def connect(path, read_only=False):
+    """DuckDB 接続（タイムゾーンを BigQuery と同じ UTC にする）"""
+    return use_utc(duckdb.connect(path, read_only=read_only))
+
+
+def use_utc(con):
+    """TimeZone は接続（cursor() で作った接続も）ごとの設定なので、開くたびに UTC にする"""
+    con.execute("SET TimeZone = 'UTC'")
+    return con
+
+
+def local_name(table_id):
+    """main-project-477501.dataset.table → "dataset"."table" """
+    _, dataset, table = table_id.split('.')
+    return f'"{dataset}"."{table}"'
+
+
+def translate(sql):
+    """BigQuery 方言の SQL を DuckDB 方言に変換（テーブル参照はローカルのスキーマ.テーブルに置き換え）"""
+    sql = TABLE_REF.sub(lambda m: '`{}`.`{}`'.format(*m.group(1).split('.')[1:]), sql)
+    for pattern, (replacement, _) in BQ_FUNCTION_MACROS.items():
+        sql = re.sub(pattern, replacement, sql)
+    return ';\n'.join(sqlglot.transpile(sql, read='bigquery', write='duckdb'))
+
+
+class LocalRow:
+    """bigquery.Row 互換（row.col / row['col'] / row[0] / keys() / items() / get()）"""
+
+    def __init__(self, columns, values):
+        self._index = {c: i for i, c in enumerate(columns)}
+        self._values = values
+
+    def __getattr__(self, name):
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        return self._values[key] if isinstance(key, int) else self._values[self._index[key]]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self):
+        return list(self._index)
+
+    def items(self):
+        return [(c, self._values[i]) for c, i in self._index.items()]
+
+    def get(self, key, default=None):
+        return self._values[self._index[key]] if key in self._index else default
+
+
+class LocalQueryJob:
+    total_bytes_processed = 0
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = [LocalRow(columns, r) for r in rows]
+
+    def result(self):
+        return self.rows
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame([list(r) for r in self.rows], columns=self.columns)
+
+
+class LocalClient:
+    """client.query(sql, job_config).result() を DuckDB レプリカで実行する（読み取り専用）"""
+
+    def __init__(self, path=DB_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'{path} がありません。先に warehouse_local.py snapshot を実行してください')
+        self.con = connect(path, read_only=True)
+
+    def query(self, sql, job_config=None):
+        params = {}
+        for p in getattr(job_config, 'query_parameters', None) or []:
+            params[p.name] = p.values if hasattr(p, 'values') else p.value
+        cur = use_utc(self.con.cursor())  # スレッドごとに別カーソル（並列実行する監査チェックから呼ばれる）
+        cur.execute(translate(sql), params or None)
+        columns = [d[0] for d in cur.description]
+        return LocalQueryJob(columns, cur.fetchall())
+
+
+def ensure_meta(con):
+    for _, macro_sql in BQ_FUNCTION_MACROS.values():
+        con.execute(macro_sql)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS _snapshot (
+      table_id VARCHAR PRIMARY KEY,
+      table_type VARCHAR,
+      last_modified TIMESTAMPTZ,
+      num_rows BIGINT,
+      snapshotted_at TIMESTAMPTZ,
+      error VARCHAR
+    )""")
+
+
+def record(con, table_id, table_type, last_modified, num_rows, error=None):
+    con.execute("DELETE FROM _snapshot WHERE table_id = ?", [table_id])
+    con.execute("INSERT INTO _snapshot VALUES (?, ?, ?, ?, ?, ?)",
+                [table_id, table_type, last_modified, num_rows, datetime.now(timezone.utc), error])
+
+
+def list_snapshot_tables(client, datasets):
+    """datasets 内の全テーブル・VIEW と、VIEW が参照する他データセットのテーブル（table_id → Table）"""
+    tables = {}
+    for ds in datasets:
+        for item in client.list_tables(f'{BQ_PROJECT}.{ds}'):
+            table_id = f'{BQ_PROJECT}.{ds}.{item.table_id}'
+            tables[table_id] = client.get_table(table_id)
+    pending = [t for t in tables.values() if t.table_type == 'VIEW']
+    while pending:
+        view = pending.pop()
+        for ref in TABLE_REF.findall(view.view_query):
+            if ref not in tables:
+                tables[ref] = client.get_table(ref)
+                if tables[ref].table_type == 'VIEW':
+                    pending.append(tables[ref])
+    return tables
+
+
+def download(client, table):
+    """テーブル → Arrow（外部テーブルはクエリで実体化）"""
+    table_id = f'{table.project}.{table.dataset_id}.{table.table_id}'
+    storage = get_storage_client()
+    if table.table_type == 'EXTERNAL':
+        return client.query(f"SELECT * FROM `{table_id}`").result().to_arrow(
+            bqstorage_client=storage, create_bqstorage_client=False)
+    return client.list_rows(table).to_arrow(bqstorage_client=storage, create_bqstorage_client=False)
+
+
+def create_views(con, views):
+    """VIEW を DuckDB に作成。依存 VIEW が先に必要なので、進まなくなるまで繰り返す。{table_id: エラー} を返す"""
+    pending = dict(views)
+    errors = {}
+    while pending:
+        progressed = False
+        for table_id, view in list(pending.items()):
+            try:
+                con.execute(f"CREATE OR REPLACE VIEW {local_name(table_id)} AS\n{translate(view.view_query)}")
+            except Exception as e:
+                errors[table_id] = str(e).splitlines()[0]
+                continue
+            errors.pop(table_id, None)
+            del pending[table_id]
+            record(con, table_id, 'VIEW', view.modified, None)
+            progressed = True
+        if not progressed:
+            break
+    for table_id, err in errors.items():
+        record(con, table_id, 'VIEW', pending[table_id].modified, None, err)
+    return errors
+
+
+def snapshot(client, datasets=SNAPSHOT_DATASETS, full=False, path=DB_PATH):
+    con = connect(path)
+    ensure_meta(con)
+    tables = list_snapshot_tables(client, datasets)
+    for ds in sorted({table_id.split('.')[1] for table_id in tables}):
+        con.execute(f'CREATE SCHEMA IF NOT EXISTS "{ds}"')
+
+    snapshotted = {r[0]: r[1] for r in con.execute(
+        "SELECT table_id, last_modified FROM _snapshot WHERE error IS NULL").fetchall()}
+    targets = [t for table_id, t in sorted(tables.items())
+               if t.table_type != 'VIEW'
+               and (full or t.table_type == 'EXTERNAL' or snapshotted.get(table_id) != t.modified)]
+    skipped = sum(1 for t in tables.values() if t.table_type != 'VIEW') - len(targets)
+    print(f'=== スナップショット: テーブル {len(targets)} 件取得 / {skipped} 件変更なし ===')
+
+    # 取得は並列、DuckDB への書き込みは1本のコネクションで順番に
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as pool:
+        futures = [(t, pool.submit(download, client, t)) for t in targets]
+        for t, future in futures:
+            table_id = f'{t.project}.{t.dataset_id}.{t.table_id}'
+            try:
+                arrow_table = future.result()
+            except Exception as e:
+                print(f'  ✗ {table_id}: {e}')
+                record(con, table_id, t.table_type, t.modified, None, str(e).splitlines()[0])
+                continue
+            con.register('_arrow_snapshot', arrow_table)
+            con.execute(f"CREATE OR REPLACE TABLE {local_name(table_id)} AS SELECT * FROM _arrow_snapshot")
+            con.unregister('_arrow_snapshot')
+            record(con, table_id, t.table_type, t.modified, arrow_table.num_rows)
+            print(f'  {table_id.split(".", 1)[1]}: {arrow_table.num_rows:,} 行')
+
+    views = {table_id: t for table_id, t in tables.items() if t.table_type == 'VIEW'}
+    errors = create_views(con, views)
+    print(f'=== VIEW: {len(views) - len(errors)} 件作成 ===')
+    for table_id, err in sorted(errors.items()):
+        print(f'  ✗ {table_id.split(".", 1)[1]}: {err}')
+    con.close()
+    return errors
+
+
+def print_status(path=DB_PATH):
+    con = connect(path, read_only=True)
+    print(f'=== {os.path.normpath(path)} ===')
+    for table_id, table_type, num_rows, snapshotted_at, error in con.execute("""
+        SELECT table_id, table_type, num_rows, snapshotted_at, error FROM _snapshot ORDER BY table_id
+    """).fetchall():
+        status = f'✗ {error}' if error else (f'{num_rows:,} 行' if num_rows is not None else '')
+        print(f'  {table_type:<8} {table_id.split(".", 1)[1]:<50} {snapshotted_at:%Y-%m-%d %H:%M}  {status}')
+    con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BQ → ローカル DuckDB レプリカ')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_snap = sub.add_parser('snapshot', help='BQ からスナップショットを取得')
+    p_snap.add_argument('--full', action='store_true', help='変更のないテーブルも取り直す')
+    p_snap.add_argument('--datasets', nargs='+', default=list(SNAPSHOT_DATASETS))
+    p_query = sub.add_parser('query', help='BQ 方言の SQL をローカルで実行')
+    p_query.add_argument('sql')
+    sub.add_parser('status', help='スナップショットの状態を表示')
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        errors = snapshot(get_client(), args.datasets, full=args.full)
+        if errors:
+            sys.exit(1)
+    elif args.command == 'query':
+        job = LocalClient().query(args.sql)
+        print('\t'.join(job.columns))
+        for row in job.result():
+            print('\t'.join('' if v is None else str(v) for v in row))
+    else:
+        print_status()
+
+
+if __name__ == '__main__':
+    main()
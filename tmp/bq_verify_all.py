@@ -1,9 +1,16 @@
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
-from google.cloud import bigquery
 import csv
 
-client = bigquery.Client(project='main-project-477501')
+if '--local' in sys.argv[1:]:
+    # ローカル DuckDB レプリカで実行（scripts/warehouse_local.py snapshot で作成）
+    sys.path.insert(0, 'scripts')
+    from warehouse_local import LocalClient
+    client = LocalClient()
+else:
+    sys.path.insert(0, 'scripts')
+    from bq_cache import CachedClient
+    client = CachedClient()  # 参照テーブルが変わっていなければ前回の結果を再利用
 
 # === MF FY2023 data ===
 mf_2023 = {}
@@ -0,0 +1,46 @@
+"""bq_cache.unversioned_refs の確認（キャッシュ可能なクエリを未追跡の参照先と誤判定しないか）
+
+実行: python tmp/check_bq_cache_refs.py（BQ には接続しない）
+"""
+import ast
+import sys
+sys.stdout.reconfigure(encoding='utf-8')
+sys.path.insert(0, 'scripts')
+from bq_cache import unversioned_refs
+from journal_sources import build_view_sql
+
+
+def redeploy_view_sql():
+    """tmp/redeploy_inv_view.py の inv_view_sql（デプロイ済み inventory_journal_view の定義）を実行せずに取り出す"""
+    with open('tmp/redeploy_inv_view.py', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'inv_view_sql':
+            return node.value.value
+    raise LookupError('inv_view_sql が見つかりません')
+
+
+with open('tmp/inventory_journal_view_v2.sql', encoding='utf-8') as f:
+    inventory_v2_sql = f.read()
+
+# 期待値: 参照先がすべて完全修飾名・CTE・UNNEST・サブクエリなら空
+cases = {
+    'inventory_journal_view（redeploy_inv_view.py）': (redeploy_view_sql(), []),
+    'inventory_journal_view_v2.sql': (inventory_v2_sql, []),
+    'journal_entries VIEW': (build_view_sql(), []),
+    'CTE の前のコメント行': ("WITH a AS (SELECT 1 AS x FROM `main-project-477501.nocodb.t`),\n"
+                            "-- b は a から作る\nb AS (SELECT x FROM a)\nSELECT * FROM b", []),
+    'TRIM(BOTH FROM)': ("SELECT TRIM(BOTH FROM x.s) FROM `main-project-477501.nocodb.t` x", []),
+    'EXTRACT / SUBSTRING': ("SELECT EXTRACT(YEAR FROM DATE(d)), SUBSTRING(CONCAT(s, 'a') FROM 2) "
+                            "FROM `main-project-477501.nocodb.t`", []),
+    '省略形の参照先': ("SELECT * FROM nocodb.t JOIN `main-project-477501.nocodb.u` USING (id)", ['nocodb.t']),
+    'カンマ区切りの2つ目': ("SELECT * FROM `main-project-477501.nocodb.t` a, other.u b", ['other.u']),
+}
+
+ok = True
+for name, (sql, expected) in cases.items():
+    got = unversioned_refs(sql)
+    mark = '✓' if got == expected else f'✗ 期待 {expected}'
+    ok &= got == expected
+    print(f'  {name}: {got} {mark}')
+sys.exit(0 if ok else 1)
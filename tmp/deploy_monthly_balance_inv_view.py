@@ -12,6 +12,8 @@ COGS = 月初在庫金額 + 当月仕入 - 月末在庫金額
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
 from google.cloud import bigquery
+sys.path.insert(0, 'scripts')
+from view_deploy import deploy_view
 client = bigquery.Client(project='main-project-477501')
 
 INV_VIEW_ID = 'main-project-477501.accounting.inventory_journal_view'
@@ -236,16 +238,9 @@ WHERE mc.year NOT IN (SELECT fiscal_year FROM sanpunpo_net)
   AND mc.cogs_amount > 0
 """
 
-try:
-    client.delete_table(INV_VIEW_ID)
-    print('既存VIEW削除')
-except Exception:
-    pass
-
-v = bigquery.Table(INV_VIEW_ID)
-v.view_query = inv_view_sql
-client.create_table(v)
-print('VIEW作成完了')
+# 下流クエリのスキャン量を dry-run で比較してから置き換える（--force で閾値超過でもデプロイ）
+if not deploy_view(client, INV_VIEW_ID, inv_view_sql, force='--force' in sys.argv[1:]):
+    sys.exit(1)
 
 # 検証
 print('\n=== P/L 検証 ===')
@@ -4,6 +4,8 @@ sys.stdout.reconfigure(encoding='utf-8')
 import sqlite3
 import os
 import re
+sys.path.insert(0, 'scripts')
+from statement_import import import_rows, natural_keys
 
 # PDFからテキスト抽出用
 try:
@@ -47,52 +49,28 @@ pdf_files = sorted([
 
 print(f"対象PDF: {len(pdf_files)}ファイル")
 
-all_records = []
+TABLE = "nc_mtf3___楽天カード個人明細"
+KEY_COLUMNS = {'date': '利用日', 'amount': '利用金額', 'description': '利用店名'}
+
+rows, keys = [], []
 for pdf_file in pdf_files:
     period = get_statement_period(pdf_file)
     pdf_path = os.path.join(PDF_DIR, pdf_file)
     records = parse_rakuten_pdf(pdf_path)
     print(f"  {pdf_file}: {len(records)}件")
-    for r in records:
-        all_records.append((*r, f"PDF_{period}"))
+    # 2025年以降のみ（2024年末のデータがPDFに含まれる場合を除外）
+    file_rows = [{'利用日': date, '利用店名': shop, '利用金額': amount, 'ソース': f"PDF_{period}"}
+                 for date, shop, amount in records if date >= '2025-01-01']
+    rows += file_rows
+    keys += natural_keys(file_rows, KEY_COLUMNS)   # 同日・同店・同額の通し番号はPDFごと
 
-# 2025年以降のみフィルタ（2024年末のデータがPDFに含まれる場合を除外）
-records_2025 = [r for r in all_records if r[0] >= '2025-01-01']
-print(f"\n2025年以降: {len(records_2025)}件")
+print(f"\n2025年以降: {len(rows)}件")
 
-# 重複チェック（同じ日付・店名・金額の組み合わせ）
-# 既存データとの重複は利用日が2024-12-29以前なので問題ないが念のため
+# 取込キー（利用日・利用店名・利用金額 + 通し番号）で既存行はスキップされるので、再実行しても重複しない
 conn = sqlite3.connect(DB_PATH)
 cur = conn.cursor()
-
-# 既にインポート済みの2025年データがあるか確認
-cur.execute("SELECT COUNT(*) FROM nc_mtf3___楽天カード個人明細 WHERE 利用日 >= '2025-01-01'")
-existing_2025 = cur.fetchone()[0]
-if existing_2025 > 0:
-    print(f"\n警告: 既に2025年データが{existing_2025}件存在します。スキップします。")
-    conn.close()
-    sys.exit(0)
-
-# IDとnc_orderの最大値取得
-cur.execute("SELECT MAX(id), MAX(nc_order) FROM nc_mtf3___楽天カード個人明細")
-max_id, max_order = cur.fetchone()
-max_id = max_id or 0
-max_order = max_order or 0
-
-print(f"現在のmax_id={max_id}, max_order={max_order}")
-print(f"挿入件数: {len(records_2025)}")
-
-# INSERT
-for i, (date, shop, amount, source) in enumerate(records_2025):
-    new_id = max_id + 1 + i
-    new_order = max_order + 1 + i
-    cur.execute("""
-        INSERT INTO nc_mtf3___楽天カード個人明細
-        (id, created_at, updated_at, nc_order, 利用日, 利用店名, 利用金額, ソース)
-        VALUES (?, datetime('now'), datetime('now'), ?, ?, ?, ?, ?)
-    """, (new_id, new_order, date, shop, amount, source))
-
-conn.commit()
+inserted_count = import_rows(conn, TABLE, KEY_COLUMNS, rows, keys=keys)
+print(f"新規挿入: {inserted_count}件 / 既存スキップ: {len(rows) - inserted_count}件")
 
 # 検証
 cur.execute("SELECT COUNT(*) FROM nc_mtf3___楽天カード個人明細 WHERE 利用日 >= '2025-01-01'")
@@ -103,7 +81,7 @@ cur.execute("SELECT COUNT(*) FROM nc_mtf3___楽天カード個人明細")
 total = cur.fetchone()[0]
 
 print(f"\n=== 結果 ===")
-print(f"挿入: {inserted}件 ({min_d} ~ {max_d})")
+print(f"2025年以降: {inserted}件 ({min_d} ~ {max_d})")
 print(f"テーブル合計: {total}件")
 
 conn.close()
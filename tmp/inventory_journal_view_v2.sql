@@ -24,12 +24,10 @@ monthly_totals AS (
     mc.year, mc.month,
     SUM(mc.shipment_qty * CAST(sch.standard_cost AS INT64)) AS cogs_amount
   FROM monthly_cogs_by_sku mc
-  JOIN `main-project-477501.nocodb.standard_cost_history` sch
+  JOIN `main-project-477501.analytics.dim_standard_cost` sch
     ON mc.products_id = sch.products_id
-    AND SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_start_date) <= DATE(mc.year, mc.month, 1)
-    AND (SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_end_date) >= LAST_DAY(DATE(mc.year, mc.month, 1))
-         OR sch.effective_end_date IS NULL)
-  WHERE sch.standard_cost IS NOT NULL
+    AND sch.valid_from <= DATE(mc.year, mc.month, 1)
+    AND sch.recorded_to >= LAST_DAY(DATE(mc.year, mc.month, 1))
   GROUP BY 1, 2
 ),
 
@@ -51,12 +49,10 @@ closing_values AS (
     snap.snapshot_year AS fiscal_year,
     SUM(snap.qty * CAST(sch.standard_cost AS INT64)) AS closing_value
   FROM inventory_snapshot snap
-  JOIN `main-project-477501.nocodb.standard_cost_history` sch
+  JOIN `main-project-477501.analytics.dim_standard_cost` sch
     ON snap.products_id = sch.products_id
-    AND SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_start_date) <= DATE(snap.snapshot_year, 12, 31)
-    AND (SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_end_date) >= DATE(snap.snapshot_year, 12, 31)
-         OR sch.effective_end_date IS NULL)
-  WHERE sch.standard_cost IS NOT NULL
+    AND sch.valid_from <= DATE(snap.snapshot_year, 12, 31)
+    AND sch.recorded_to >= DATE(snap.snapshot_year, 12, 31)
   GROUP BY 1
 ),
 
@@ -65,12 +61,10 @@ opening_values AS (
     snap.snapshot_year + 1 AS fiscal_year,
     SUM(snap.qty * CAST(sch.standard_cost AS INT64)) AS opening_value
   FROM inventory_snapshot snap
-  JOIN `main-project-477501.nocodb.standard_cost_history` sch
+  JOIN `main-project-477501.analytics.dim_standard_cost` sch
     ON snap.products_id = sch.products_id
-    AND SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_start_date) <= DATE(snap.snapshot_year + 1, 1, 1)
-    AND (SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_end_date) >= DATE(snap.snapshot_year + 1, 1, 1)
-         OR sch.effective_end_date IS NULL)
-  WHERE sch.standard_cost IS NOT NULL
+    AND sch.valid_from <= DATE(snap.snapshot_year + 1, 1, 1)
+    AND sch.recorded_to >= DATE(snap.snapshot_year + 1, 1, 1)
   GROUP BY 1
 ),
 
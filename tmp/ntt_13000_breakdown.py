@@ -3,8 +3,9 @@
 MF FY2025の3月NTTカード利用7件から、どの組み合わせが13,000円になるか
 """
 import sys
-from itertools import combinations
 sys.stdout.reconfigure(encoding='utf-8')
+sys.path.insert(0, 'scripts')
+from subset_sum import find_subsets
 
 # MF総勘定元帳 FY2025 — 3月のNTTカード利用（未払金セクション）
 march_entries = [
@@ -31,39 +32,33 @@ print(f"  {'4/25 銀行引落し':>41} {bank_payment:>8,}")
 print(f"  {'差額':>41} {diff:>8,}")
 
 print(f"\n{'=' * 80}")
-print(f"13,000円になる取引の組み合わせを全探索")
+print(f"13,000円になる取引の組み合わせを探索（部分和）")
 print("=" * 80)
 
 amounts = [e[2] for e in march_entries]
 found = False
-for r in range(1, len(amounts) + 1):
-    for combo in combinations(range(len(amounts)), r):
-        s = sum(amounts[i] for i in combo)
-        if s == diff:
-            found = True
-            print(f"\n  ✓ {r}件の組み合わせで13,000円:")
-            for i in combo:
-                d, m, a = march_entries[i]
-                print(f"    {d} {m:<30} {a:>8,}")
+for combo in find_subsets(amounts, diff, limit=100):
+    found = True
+    print(f"\n  ✓ {len(combo)}件の組み合わせで13,000円:")
+    for i in combo:
+        d, m, a = march_entries[i]
+        print(f"    {d} {m:<30} {a:>8,}")
 
 if not found:
     print(f"\n  ✗ 13,000円ぴったりになる組み合わせは存在しない")
 
 # 19,784円になる組み合わせも探索
 print(f"\n{'=' * 80}")
-print(f"19,784円（銀行引落し額）になる組み合わせを全探索")
+print(f"19,784円（銀行引落し額）になる組み合わせを探索（部分和）")
 print("=" * 80)
 
 found2 = False
-for r in range(1, len(amounts) + 1):
-    for combo in combinations(range(len(amounts)), r):
-        s = sum(amounts[i] for i in combo)
-        if s == bank_payment:
-            found2 = True
-            print(f"\n  ✓ {r}件の組み合わせで19,784円:")
-            for i in combo:
-                d, m, a = march_entries[i]
-                print(f"    {d} {m:<30} {a:>8,}")
+for combo in find_subsets(amounts, bank_payment, limit=100):
+    found2 = True
+    print(f"\n  ✓ {len(combo)}件の組み合わせで19,784円:")
+    for i in combo:
+        d, m, a = march_entries[i]
+        print(f"    {d} {m:<30} {a:>8,}")
 
 if not found2:
     print(f"\n  ✗ 19,784円ぴったりになる組み合わせも存在しない")
@@ -73,12 +68,9 @@ print(f"\n{'=' * 80}")
 print(f"13,000に最も近い組み合わせ（差が500以内）")
 print("=" * 80)
 close_matches = []
-for r in range(1, len(amounts) + 1):
-    for combo in combinations(range(len(amounts)), r):
-        s = sum(amounts[i] for i in combo)
-        gap = abs(s - diff)
-        if gap <= 500 and gap > 0:
-            close_matches.append((gap, combo, s))
+for s in range(diff - 500, diff + 501):
+    if s != diff:
+        close_matches += [(abs(s - diff), combo, s) for combo in find_subsets(amounts, s, limit=100)]
 close_matches.sort()
 for gap, combo, s in close_matches[:5]:
     items = ", ".join(f"{march_entries[i][1]}({march_entries[i][2]:,})" for i in combo)
@@ -10,6 +10,8 @@ import csv
 import re
 from pathlib import Path
 from collections import defaultdict
+sys.path.insert(0, 'scripts')
+from statement_ingest import iter_records
 
 # ============================================================
 # Part 1: NTT生明細の読み込み
@@ -19,53 +21,13 @@ all_raw_entries = []
 
 for csv_file in sorted(raw_dir.glob("MYLINK_*.csv")):
     billing_month = csv_file.stem.replace("MYLINK_", "")
-
-    content = None
-    for enc in ['utf-8-sig', 'utf-8', 'cp932', 'shift_jis']:
-        try:
-            content = csv_file.read_text(encoding=enc)
-            if '利用' in content or 'カード' in content or '支払' in content:
-                break
-            content = None
-        except:
-            content = None
-
-    if content is None:
-        continue
-
-    lines = content.strip().split('\n')
-    first_line = lines[0].strip().replace('\ufeff', '')
-
-    if first_line.startswith('利用日'):
-        # Simple UTF-8 format
-        reader = csv.reader(lines)
-        next(reader)
-        for row in reader:
-            if len(row) >= 4 and row[0].strip() and row[3].strip():
-                try:
-                    all_raw_entries.append({
-                        'date': row[0].strip(),
-                        'merchant': row[1].strip(),
-                        'amount': int(row[3].strip()),
-                        'billing_month': billing_month,
-                    })
-                except ValueError:
-                    pass
-    else:
-        # Detailed cp932 format
-        for line in lines:
-            parts = line.split(',')
-            if len(parts) >= 4 and re.match(r'^\d{8}$', parts[0].strip()):
-                try:
-                    d = parts[0].strip()
-                    all_raw_entries.append({
-                        'date': f"{d[:4]}-{d[4:6]}-{d[6:8]}",
-                        'merchant': parts[1].strip(),
-                        'amount': int(parts[3].strip()),
-                        'billing_month': billing_month,
-                    })
-                except ValueError:
-                    pass
+    for r in iter_records(csv_file, 'ntt_mylink'):
+        all_raw_entries.append({
+            'date': r['date'].isoformat(),
+            'merchant': r['description'],
+            'amount': r['amount'],
+            'billing_month': billing_month,
+        })
 
 # Sort by date
 all_raw_entries.sort(key=lambda x: x['date'])
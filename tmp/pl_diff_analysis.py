@@ -1,9 +1,10 @@
 """Analyze P/L difference: old vs new architecture"""
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
-from google.cloud import bigquery
+sys.path.insert(0, 'scripts')
+from bq_cache import CachedClient
 
-client = bigquery.Client(project='main-project-477501')
+client = CachedClient()  # 参照テーブルが変わっていなければ前回の結果を再利用
 
 # Check current P/L by fiscal year
 q1 = """
@@ -1,7 +1,14 @@
-"""inventory_journal_view 再デプロイ（商品計上方式）"""
+"""inventory_journal_view 再デプロイ（商品計上方式）
+
+デプロイ前に年度別の差分を表示し、会計結果が変わる場合は中止する
+実行: python tmp/redeploy_inv_view.py [--allow-change] [--force]
+"""
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
 from google.cloud import bigquery
+sys.path.insert(0, 'scripts')
+from view_deploy import deploy_view
+from journal_entries_mat import ensure_dim_standard_cost
 client = bigquery.Client(project='main-project-477501')
 
 INV_VIEW_ID = 'main-project-477501.accounting.inventory_journal_view'
@@ -24,12 +31,10 @@ monthly_totals AS (
   SELECT mc.year, mc.month,
     SUM(mc.shipment_qty * CAST(sch.standard_cost AS INT64)) AS cogs_amount
   FROM monthly_cogs_by_sku mc
-  JOIN `main-project-477501.nocodb.standard_cost_history` sch
+  JOIN `main-project-477501.analytics.dim_standard_cost` sch
     ON mc.products_id = sch.products_id
-    AND SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_start_date) <= DATE(mc.year, mc.month, 1)
-    AND (SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_end_date) >= LAST_DAY(DATE(mc.year, mc.month, 1))
-         OR sch.effective_end_date IS NULL)
-  WHERE sch.standard_cost IS NOT NULL
+    AND sch.valid_from <= DATE(mc.year, mc.month, 1)
+    AND sch.recorded_to >= LAST_DAY(DATE(mc.year, mc.month, 1))
   GROUP BY 1, 2
 ),
 inventory_snapshot AS (
@@ -46,24 +51,20 @@ closing_values AS (
   SELECT snap.snapshot_year AS fiscal_year,
     SUM(snap.qty * CAST(sch.standard_cost AS INT64)) AS closing_value
   FROM inventory_snapshot snap
-  JOIN `main-project-477501.nocodb.standard_cost_history` sch
+  JOIN `main-project-477501.analytics.dim_standard_cost` sch
     ON snap.products_id = sch.products_id
-    AND SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_start_date) <= DATE(snap.snapshot_year, 12, 31)
-    AND (SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_end_date) >= DATE(snap.snapshot_year, 12, 31)
-         OR sch.effective_end_date IS NULL)
-  WHERE sch.standard_cost IS NOT NULL
+    AND sch.valid_from <= DATE(snap.snapshot_year, 12, 31)
+    AND sch.recorded_to >= DATE(snap.snapshot_year, 12, 31)
   GROUP BY 1
 ),
 opening_values AS (
   SELECT snap.snapshot_year + 1 AS fiscal_year,
     SUM(snap.qty * CAST(sch.standard_cost AS INT64)) AS opening_value
   FROM inventory_snapshot snap
-  JOIN `main-project-477501.nocodb.standard_cost_history` sch
+  JOIN `main-project-477501.analytics.dim_standard_cost` sch
     ON snap.products_id = sch.products_id
-    AND SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_start_date) <= DATE(snap.snapshot_year + 1, 1, 1)
-    AND (SAFE.PARSE_DATE('%Y-%m-%d', sch.effective_end_date) >= DATE(snap.snapshot_year + 1, 1, 1)
-         OR sch.effective_end_date IS NULL)
-  WHERE sch.standard_cost IS NOT NULL
+    AND sch.valid_from <= DATE(snap.snapshot_year + 1, 1, 1)
+    AND sch.recorded_to >= DATE(snap.snapshot_year + 1, 1, 1)
   GROUP BY 1
 ),
 -- COGS = purchase_net + opening - closing
@@ -164,16 +165,35 @@ FROM monthly_totals mt
 WHERE mt.year NOT IN (SELECT fiscal_year FROM sanpunpo_net) AND mt.cogs_amount > 0
 """
 
-try:
-    client.delete_table(INV_VIEW_ID)
-    print('既存VIEW削除')
-except Exception:
-    pass
-
-v = bigquery.Table(INV_VIEW_ID)
-v.view_query = inv_view_sql
-client.create_table(v)
-print('VIEW作成完了')
+# 原価は analytics.dim_standard_cost から引くので、NocoDB の標準原価より古ければ先に作り直す
+ensure_dim_standard_cost(client)
+
+# デプロイ済み VIEW と新しい SQL で、年度・科目・貸借別の件数と金額が変わらないことを確認する
+# （確定・申告済みの年度の会計結果を動かさない。意図して変える再デプロイは --allow-change）
+def fy_totals(sql):
+    q = f"""
+    SELECT fiscal_year, account_name, entry_side, COUNT(*) AS cnt, SUM(amount_jpy) AS amount
+    FROM ({sql})
+    GROUP BY 1, 2, 3
+    """
+    return {(r.fiscal_year, r.account_name, r.entry_side): (r.cnt, r.amount) for r in client.query(q).result()}
+
+print('=== 年度別 差分（デプロイ済み VIEW → 新 SQL）===')
+before = fy_totals(f'SELECT * FROM `{INV_VIEW_ID}`')
+after = fy_totals(inv_view_sql)
+changed = sorted(k for k in set(before) | set(after) if before.get(k) != after.get(k))
+for fy in sorted({k[0] for k in set(before) | set(after)}):
+    keys = [k for k in changed if k[0] == fy]
+    print(f'  FY{fy}: ' + ('変化なし ✓' if not keys else f'{len(keys)}件 変化 ✗'))
+    for k in keys:
+        print(f'    {k[1]} {k[2]}: {before.get(k)} → {after.get(k)}')
+if changed and '--allow-change' not in sys.argv[1:]:
+    print('会計結果が変わるためデプロイしません（意図した変更なら --allow-change）')
+    sys.exit(1)
+
+# 下流クエリのスキャン量を dry-run で比較してから置き換える（--force で閾値超過でもデプロイ）
+if not deploy_view(client, INV_VIEW_ID, inv_view_sql, force='--force' in sys.argv[1:]):
+    sys.exit(1)
 
 # P/L 検証
 print('\n=== P/L 検証 ===')
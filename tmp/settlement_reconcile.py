@@ -5,8 +5,9 @@ Amazon出品アカウントの残高推移を時系列で追跡
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
 
-from google.cloud import bigquery
-client = bigquery.Client(project='main-project-477501')
+sys.path.insert(0, 'scripts')
+from bq_cache import CachedClient
+client = CachedClient()  # 参照テーブルが変わっていなければ前回の結果を再利用
 
 print("=" * 100)
 print("【1】Settlement別 精算額一覧（セラセン「支払い」画面と同じデータ）")